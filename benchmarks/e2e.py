@@ -0,0 +1,343 @@
+"""
+End-to-end benchmark: runs `main.run_pipeline` over generated sheets against local
+stand-ins for the Graph/Threads API and GitHub and the in-memory spreadsheet backend
+(SHEETS_BACKEND=memory), and
+reports posts per minute, publish lag and peak RSS per sheet size.
+
+    python benchmarks/e2e.py --rows 10 100 1000
+    python benchmarks/e2e.py --rows 10 100 1000 --save-baseline
+    python benchmarks/e2e.py --rows 10 100 1000 --baseline benchmarks/baseline.json
+
+Every size runs in a fresh process with its own working directory, so state files and
+peak RSS do not carry over between sizes. The fake servers run in this process.
+Processing delays and the pipeline's polling delays are multiplied by --time-scale.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCHMARK_DIR)
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+RESULT_FILE = "result.json"
+
+SHEET_NAME = "Benchmark"
+# Higher is better for posts_per_minute; lower is better for the others
+COMPARED = {
+    "posts_per_minute": 1,
+    "lag_p95_seconds": -1,
+    "peak_rss_mb": -1,
+}
+
+
+def _headers(settings) -> List[str]:
+    return [
+        settings.DATE_COLUMN_NAME,
+        settings.TIME_COLUMN_NAME,
+        settings.STATUS_COLUMN_NAME,
+        settings.TEXT_COLUMN_NAME,
+        settings.IMAGE_URLS_COLUMN_NAME,
+        settings.VIDEO_URLS_COLUMN_NAME,
+        settings.LOCAL_IMAGE_PATH_COLUMN_NAME,
+        settings.HASHTAGS_COLUMN_NAME,
+        settings.HASHTAGS_IN_CAPTION_COLUMN_NAME,
+        settings.POST_ON_INSTAGRAM_COLUMN_NAME,
+        settings.POST_ON_THREADS_COLUMN_NAME,
+        settings.LEASE_COLUMN_NAME,
+        settings.PUBLISH_LAG_COLUMN_NAME,
+    ]
+
+
+def generate_rows(settings, count: int, scheduled_at: datetime, image_dir: str) -> List[Dict]:
+    """
+    Builds `count` due rows cycling through the common post shapes: a single image URL,
+    a three-image carousel, a local image (hosted on GitHub) and a video URL.
+    """
+    from PIL import Image
+
+    rows = []
+    for index in range(count):
+        row = {
+            settings.DATE_COLUMN_NAME: scheduled_at.strftime("%Y-%m-%d"),
+            settings.TIME_COLUMN_NAME: scheduled_at.strftime("%Y-%m-%d %H:%M:%S"),
+            settings.STATUS_COLUMN_NAME: "",
+            settings.TEXT_COLUMN_NAME: f"Benchmark post {index}: some caption text.",
+            settings.HASHTAGS_COLUMN_NAME: "#benchmark,#pipeline" if index % 2 else "",
+            settings.HASHTAGS_IN_CAPTION_COLUMN_NAME: "FALSE",
+            settings.POST_ON_INSTAGRAM_COLUMN_NAME: "TRUE",
+            settings.POST_ON_THREADS_COLUMN_NAME: "TRUE",
+        }
+        kind = index % 4
+        if kind == 0:
+            row[settings.IMAGE_URLS_COLUMN_NAME] = f"https://cdn.example.com/{index}.jpg"
+        elif kind == 1:
+            row[settings.IMAGE_URLS_COLUMN_NAME] = ", ".join(
+                f"https://cdn.example.com/{index}-{item}.jpg" for item in range(3)
+            )
+        elif kind == 2:
+            # Distinct content per row, so the hosted-media cache does not skip the upload
+            path = os.path.join(image_dir, f"{index}.jpg")
+            Image.new("RGB", (320, 240), (index % 256, index // 256 % 256, 128)).save(path)
+            row[settings.LOCAL_IMAGE_PATH_COLUMN_NAME] = path
+        else:
+            row[settings.VIDEO_URLS_COLUMN_NAME] = f"https://cdn.example.com/{index}.mp4"
+        rows.append(row)
+    return rows
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(percent / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_child(options: Dict) -> Dict:
+    """Runs one pipeline pass in this process (started by `run_size`) and measures it."""
+    import logging
+    import resource
+
+    sys.path.insert(0, PROJECT_ROOT)
+    from config import settings
+    from sources import memory_sheets
+
+    if not options["verbose"]:
+        logging.getLogger("ContentPosterLogger").setLevel(logging.WARNING)
+
+    client = memory_sheets.client()
+
+    scheduled_at = datetime.now().replace(microsecond=0)
+    image_dir = os.path.abspath("images")
+    os.makedirs(image_dir, exist_ok=True)
+    rows = generate_rows(settings, options["rows"], scheduled_at, image_dir)
+    worksheet_count = max(1, min(options["worksheets"], len(rows)))
+    tokens: Dict = {SHEET_NAME: {}}
+    worksheets = []
+    for number in range(worksheet_count):
+        name = f"Account {number + 1}"
+        headers = _headers(settings)
+        values = [headers] + [
+            [row.get(header, "") for header in headers] for row in rows[number::worksheet_count]
+        ]
+        client.load({SHEET_NAME: {name: values}})
+        worksheets.append(client.spreadsheets[SHEET_NAME].worksheets_by_title[name])
+        expiry = (datetime.now() + timedelta(days=50)).isoformat()
+        tokens[SHEET_NAME][name] = {
+            platform: {"access_token": f"{platform}-token-{number}", "user_id": str(1000 + number), "expiry_date": expiry}
+            for platform in ["instagram", "threads"]
+        }
+    with open(settings.TOKEN_FILE, "w") as f:
+        json.dump(tokens, f)
+
+    import main
+    import publish_lag
+
+    started = time.perf_counter()
+    main.run_pipeline()
+    elapsed = time.perf_counter() - started
+
+    sheet_requests = {"reads": client.reads, "writes": client.writes, "quota_errors": client.quota_errors}
+    # Reading the outcome is not part of the run
+    client.latency_seconds, client.quota_error_rate, client.requests_per_minute = 0, 0, 0
+    statuses: Dict[str, int] = {}
+    for worksheet in worksheets:
+        for record in worksheet.get_all_records():
+            status = record[settings.STATUS_COLUMN_NAME]
+            statuses[status] = statuses.get(status, 0) + 1
+    lags = sorted(
+        lag
+        for values in publish_lag.lags_by_account(scheduled_at - timedelta(days=1)).values()
+        for lag in values
+    )
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = peak_rss / (1024 * 1024) if sys.platform == "darwin" else peak_rss / 1024
+    return {
+        "rows": len(rows),
+        "worksheets": worksheet_count,
+        "elapsed_seconds": round(elapsed, 2),
+        "posts_published": len(lags),
+        "statuses": statuses,
+        "posts_per_minute": round(len(lags) / elapsed * 60, 1) if elapsed else 0.0,
+        "lag_p50_seconds": round(_percentile(lags, 50), 2),
+        "lag_p95_seconds": round(_percentile(lags, 95), 2),
+        "lag_max_seconds": round(lags[-1], 2) if lags else 0.0,
+        "peak_rss_mb": round(peak_rss_mb, 1),
+        "sheet_requests": sheet_requests,
+    }
+
+
+def _scaled_polling_options(settings, time_scale: float) -> Dict:
+    return {
+        platform: {
+            key: value * time_scale if "delay" in key or key == "video_seconds_per_mb" else value
+            for key, value in options.items()
+        }
+        for platform, options in settings.POLLING_OPTIONS.items()
+    }
+
+
+def run_size(rows: int, args, graph_url: str, github_url: str) -> Dict:
+    """Runs the pipeline over `rows` rows in a child process and returns its measurements."""
+    from config import settings
+
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join([PROJECT_ROOT, BENCHMARK_DIR]),
+        "APP_CLIENT_ID": "benchmark",
+        "APP_CLIENT_SECRET": "benchmark",
+        "FACEBOOK_API_BASE_URL": graph_url,
+        "THREADS_API_BASE_URL": graph_url,
+        "GITHUB_API_BASE_URL": github_url,
+        "GITHUB_USERNAME": "benchmark",
+        "GITHUB_REPO_NAME": "media",
+        "GITHUB_TOKEN": "benchmark",
+        "STAGING_HORIZON_MINUTES": "0",
+        "SHEETS_BACKEND": "memory",
+        "SHEETS_MEMORY_LATENCY_MS": str(args.sheets_delay * args.time_scale * 1000),
+        "SHEETS_MEMORY_QUOTA_ERROR_RATE": str(args.sheets_error_rate),
+        "POLLING_OPTIONS": json.dumps(_scaled_polling_options(settings, args.time_scale)),
+    }
+    if not args.keep_rate_limits:
+        # The fake API has no limits, so pacing would only measure the bucket settings
+        env["RATE_LIMIT_BUCKETS"] = json.dumps(
+            {
+                "app": {"rate_per_minute": 1_000_000, "burst": 100_000},
+                "account": {"rate_per_minute": 1_000_000, "burst": 100_000},
+            }
+        )
+    options = {"rows": rows, "worksheets": args.worksheets, "verbose": args.verbose}
+    with tempfile.TemporaryDirectory(prefix="pipeline-benchmark-") as work_dir:
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", json.dumps(options)],
+            cwd=work_dir,
+            env=env,
+            capture_output=not args.verbose,
+            text=True,
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(
+                f"Benchmark run with {rows} rows failed:\n{completed.stderr or ''}"
+            )
+        with open(os.path.join(work_dir, RESULT_FILE)) as f:
+            return json.load(f)
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Returns a line for every measurement that is worse than the baseline beyond the tolerance."""
+    regressions = []
+    for rows, result in results.items():
+        reference = baseline.get(rows)
+        if not reference:
+            continue
+        for key, direction in COMPARED.items():
+            old, new = reference.get(key), result.get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if change * direction < -tolerance:
+                regressions.append(f"{rows} rows: {key} {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def print_table(results: Dict[str, Dict]):
+    print(
+        f"{'rows':>7} {'elapsed s':>10} {'posts':>7} {'posts/min':>10} "
+        f"{'lag p50 s':>10} {'lag p95 s':>10} {'lag max s':>10} {'peak RSS MB':>12}  statuses"
+    )
+    for result in results.values():
+        print(
+            f"{result['rows']:>7} {result['elapsed_seconds']:>10} {result['posts_published']:>7} "
+            f"{result['posts_per_minute']:>10} {result['lag_p50_seconds']:>10} "
+            f"{result['lag_p95_seconds']:>10} {result['lag_max_seconds']:>10} "
+            f"{result['peak_rss_mb']:>12}  {result['statuses']}"
+        )
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--rows", type=int, nargs="+", default=[10, 100])
+    arg_parser.add_argument("--worksheets", type=int, default=1, help="Accounts the rows are split between.")
+    arg_parser.add_argument("--time-scale", type=float, default=0.1, help="Multiplier for all delays.")
+    arg_parser.add_argument("--image-delay", type=float, default=2.0, help="Image container processing (s).")
+    arg_parser.add_argument("--video-delay", type=float, default=20.0, help="Video container processing (s).")
+    arg_parser.add_argument("--carousel-delay", type=float, default=5.0, help="Carousel container processing (s).")
+    arg_parser.add_argument("--github-delay", type=float, default=0.5, help="GitHub upload latency (s).")
+    arg_parser.add_argument("--sheets-delay", type=float, default=0.3, help="Google Sheets API latency (s).")
+    arg_parser.add_argument("--error-rate", type=float, default=0.0, help="Share of API calls answered with a 500.")
+    arg_parser.add_argument("--container-error-rate", type=float, default=0.0, help="Share of containers ending in ERROR.")
+    arg_parser.add_argument("--sheets-error-rate", type=float, default=0.0, help="Share of Sheets calls over quota.")
+    arg_parser.add_argument("--keep-rate-limits", action="store_true", help="Keep RATE_LIMIT_BUCKETS pacing.")
+    arg_parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    arg_parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline.")
+    arg_parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed change before a regression.")
+    arg_parser.add_argument("--output", help="Also write the results to this JSON file.")
+    arg_parser.add_argument("--verbose", action="store_true", help="Show the pipeline's log output.")
+    arg_parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.child:
+        # Written to a file, since the pipeline's log output also goes to stdout
+        result = run_child(json.loads(args.child))
+        with open(RESULT_FILE, "w") as f:
+            json.dump(result, f)
+        return
+
+    # The parent only reads defaults from the settings, the runs get theirs from the environment
+    os.environ.setdefault("APP_CLIENT_ID", "benchmark")
+    os.environ.setdefault("APP_CLIENT_SECRET", "benchmark")
+    sys.path.insert(0, PROJECT_ROOT)
+    from fake_graph import FakeGraphServer, FakeGraphState
+    from fake_github import FakeGitHubServer, FakeGitHubState
+
+    graph = FakeGraphServer(
+        FakeGraphState(
+            image_delay=args.image_delay * args.time_scale,
+            video_delay=args.video_delay * args.time_scale,
+            carousel_delay=args.carousel_delay * args.time_scale,
+            error_rate=args.error_rate,
+            container_error_rate=args.container_error_rate,
+        )
+    ).start()
+    github = FakeGitHubServer(FakeGitHubState(args.github_delay * args.time_scale)).start()
+    results = {}
+    try:
+        for rows in args.rows:
+            print(f"Running {rows} row(s)...", flush=True)
+            results[str(rows)] = run_size(rows, args, graph.base_url, github.base_url)
+    finally:
+        graph.stop()
+        github.stop()
+
+    print_table(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=4)
+        print(f"Saved the results as the baseline in {args.baseline}.")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions against the baseline:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%}).")
+
+
+if __name__ == "__main__":
+    main()
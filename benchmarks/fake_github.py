@@ -0,0 +1,133 @@
+import base64
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import unquote, urlsplit
+
+# A local stand-in for the parts of the GitHub REST API used for media hosting: the
+# Contents API (create, list and delete files, see helpers.upload_to_github and
+# clean_github_uploads.py) and the raw URLs it hands out. Files are kept in memory.
+
+
+class FakeGitHubState:
+    def __init__(self, upload_delay: float = 0.0):
+        self.upload_delay = upload_delay
+        self.lock = threading.Lock()
+        self.files: Dict[str, bytes] = {}  # "owner/repo/path" -> content
+        self.uploaded_bytes = 0
+
+
+class _GitHubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; with Nagle's algorithm the body would wait
+    # for the client's delayed ACK (~40 ms) on every keep-alive request
+    disable_nagle_algorithm = True
+    state: FakeGitHubState
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body, content_type: str = "application/json"):
+        payload = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _body(self) -> Dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+    def _contents_path(self):
+        # /repos/{owner}/{repo}/contents/{path}
+        segments = unquote(urlsplit(self.path).path).strip("/").split("/")
+        if len(segments) < 4 or segments[0] != "repos" or segments[3] != "contents":
+            return None, None
+        return f"{segments[1]}/{segments[2]}", "/".join(segments[4:])
+
+    def _entry(self, repo: str, path: str, content: bytes) -> Dict:
+        host = self.headers.get("Host")
+        return {
+            "name": path.rsplit("/", 1)[-1],
+            "path": path,
+            "sha": hashlib.sha1(content).hexdigest(),
+            "size": len(content),
+            "type": "file",
+            "download_url": f"http://{host}/raw/{repo}/main/{path}",
+        }
+
+    def do_PUT(self):
+        repo, path = self._contents_path()
+        if repo is None:
+            self._reply(404, {"message": "Not Found"})
+            return
+        content = base64.b64decode(self._body().get("content", ""))
+        if self.state.upload_delay:
+            time.sleep(self.state.upload_delay)
+        with self.state.lock:
+            self.state.files[f"{repo}/{path}"] = content
+            self.state.uploaded_bytes += len(content)
+        self._reply(201, {"content": self._entry(repo, path, content)})
+
+    def do_GET(self):
+        segments = unquote(urlsplit(self.path).path).strip("/").split("/")
+        if segments[0] == "raw":
+            # /raw/{owner}/{repo}/{branch}/{path}
+            key = "/".join(segments[1:3] + segments[4:])
+            content = self.state.files.get(key)
+            if content is None:
+                self._reply(404, {"message": "Not Found"})
+            else:
+                self._reply(200, content, "application/octet-stream")
+            return
+        repo, path = self._contents_path()
+        if repo is None:
+            self._reply(404, {"message": "Not Found"})
+            return
+        prefix = f"{repo}/{path}/"
+        with self.state.lock:
+            entries = [
+                self._entry(repo, key[len(repo) + 1 :], content)
+                for key, content in self.state.files.items()
+                if key.startswith(prefix)
+            ]
+        if not entries:
+            self._reply(404, {"message": "Not Found"})
+        else:
+            self._reply(200, entries)
+
+    def do_DELETE(self):
+        repo, path = self._contents_path()
+        self._body()
+        with self.state.lock:
+            removed = self.state.files.pop(f"{repo}/{path}", None)
+        if removed is None:
+            self._reply(404, {"message": "Not Found"})
+        else:
+            self._reply(200, {"content": None})
+
+
+class FakeGitHubServer:
+    """Runs the fake GitHub API on a free localhost port in a background thread."""
+
+    def __init__(self, state: Optional[FakeGitHubState] = None, port: int = 0):
+        self.state = state or FakeGitHubState()
+        handler = type("GitHubHandler", (_GitHubHandler,), {"state": self.state})
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.server.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/"
+
+    def start(self) -> "FakeGitHubServer":
+        threading.Thread(target=self.server.serve_forever, name="fake-github", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
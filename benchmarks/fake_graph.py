@@ -0,0 +1,193 @@
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+# A local stand-in for the Instagram Graph API and the Threads API, covering the
+# container lifecycle the destinations go through: create (single, carousel item,
+# carousel, reply), poll status, publish, first comment, publishing limit and the
+# recent-posts lookup used for recovery. Containers report IN_PROGRESS until their
+# processing delay has passed. Errors are injected at a configurable rate.
+# Resumable video uploads (local videos sent straight to Instagram) are not emulated.
+
+# Edges that create a container
+CREATE_EDGES = {"media", "threads"}
+PUBLISH_EDGES = {"media_publish", "threads_publish"}
+LIMIT_EDGES = {"content_publishing_limit", "threads_publishing_limit"}
+
+
+class FakeGraphState:
+    """Containers and posts of the fake API, shared by all request handler threads."""
+
+    def __init__(
+        self,
+        image_delay: float = 0.2,
+        video_delay: float = 2.0,
+        carousel_delay: float = 0.5,
+        error_rate: float = 0.0,
+        container_error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.delays = {"IMAGE": image_delay, "VIDEO": video_delay, "CAROUSEL": carousel_delay}
+        self.error_rate = error_rate
+        self.container_error_rate = container_error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.ids = itertools.count(17_000_000_000_000_000)
+        self.containers: Dict[str, Dict] = {}
+        self.posts: Dict[str, Dict] = {}
+        self.requests = 0
+        self.injected_errors = 0
+
+    def next_id(self) -> str:
+        return str(next(self.ids))
+
+    def should_fail(self, rate: float) -> bool:
+        with self.lock:
+            return rate > 0 and self.random.random() < rate
+
+
+class _GraphHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; with Nagle's algorithm the body would wait
+    # for the client's delayed ACK (~40 ms) on every keep-alive request
+    disable_nagle_algorithm = True
+    state: FakeGraphState
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body: Dict):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status: int, code: int, message: str):
+        self._reply(status, {"error": {"message": message, "type": "OAuthException", "code": code}})
+
+    def _params(self) -> Dict[str, str]:
+        parts = urlsplit(self.path)
+        params = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            body = self.rfile.read(length).decode("utf-8")
+            params.update({key: values[0] for key, values in parse_qs(body).items()})
+        return params
+
+    def _segments(self):
+        # Drops the API version, e.g. /v23.0/{user_id}/media -> [user_id, "media"]
+        segments = [segment for segment in urlsplit(self.path).path.split("/") if segment]
+        if segments and segments[0].startswith("v") and segments[0][1:2].isdigit():
+            segments = segments[1:]
+        return segments
+
+    def _handle(self, method: str):
+        state = self.state
+        params = self._params()
+        with state.lock:
+            state.requests += 1
+        if state.should_fail(state.error_rate):
+            with state.lock:
+                state.injected_errors += 1
+            self._error(500, 2, "An unexpected error has occurred. Please retry your request later.")
+            return
+
+        segments = self._segments()
+        if len(segments) == 1 and method == "GET":
+            self._container_status(segments[0])
+        elif len(segments) == 2 and segments[1] in CREATE_EDGES and method == "POST":
+            self._create_container(params)
+        elif len(segments) == 2 and segments[1] in CREATE_EDGES and method == "GET":
+            self._reply(200, {"data": []})  # No recent posts to recover
+        elif len(segments) == 2 and segments[1] in PUBLISH_EDGES and method == "POST":
+            self._publish(params)
+        elif len(segments) == 2 and segments[1] in LIMIT_EDGES:
+            self._reply(
+                200,
+                {"data": [{"quota_usage": 0, "config": {"quota_total": 1_000_000, "quota_duration": 86400}}]},
+            )
+        elif len(segments) == 2 and segments[1] == "comments" and method == "POST":
+            self._reply(200, {"id": state.next_id()})
+        else:
+            self._error(400, 100, f"Unsupported request: {method} {self.path}")
+
+    def _create_container(self, params: Dict[str, str]):
+        state = self.state
+        if "children" in params:
+            media_type = "CAROUSEL"
+        elif params.get("media_type", "IMAGE").upper() in ["VIDEO", "REELS"]:
+            media_type = "VIDEO"
+        elif params.get("media_type", "").upper() == "TEXT":
+            media_type = "TEXT"
+        else:
+            media_type = "IMAGE"
+        failed = state.should_fail(state.container_error_rate)
+        container_id = state.next_id()
+        with state.lock:
+            state.containers[container_id] = {
+                "media_type": media_type,
+                "ready_at": time.monotonic() + state.delays.get(media_type, 0.0),
+                "failed": failed,
+                "published": False,
+            }
+        self._reply(200, {"id": container_id})
+
+    def _status(self, container: Dict) -> str:
+        if time.monotonic() < container["ready_at"]:
+            return "IN_PROGRESS"
+        return "ERROR" if container["failed"] else "FINISHED"
+
+    def _container_status(self, container_id: str):
+        container = self.state.containers.get(container_id)
+        if container is None:
+            self._error(400, 100, f"Unsupported get request. Object with ID '{container_id}' does not exist")
+            return
+        status = self._status(container)
+        self._reply(200, {"id": container_id, "status_code": status, "status": status})
+
+    def _publish(self, params: Dict[str, str]):
+        state = self.state
+        container = state.containers.get(params.get("creation_id", ""))
+        if container is None or self._status(container) != "FINISHED":
+            self._error(400, 9007, "Media ID is not available")
+            return
+        post_id = state.next_id()
+        with state.lock:
+            container["published"] = True
+            state.posts[post_id] = {"container_id": params["creation_id"]}
+        self._reply(200, {"id": post_id})
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+
+class FakeGraphServer:
+    """Runs the fake API on a free localhost port in a background thread."""
+
+    def __init__(self, state: Optional[FakeGraphState] = None, port: int = 0):
+        self.state = state or FakeGraphState()
+        handler = type("GraphHandler", (_GraphHandler,), {"state": self.state})
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.server.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/"
+
+    def start(self) -> "FakeGraphServer":
+        threading.Thread(target=self.server.serve_forever, name="fake-graph", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,314 @@
+"""
+Microbenchmarks for the CPU work done on every row of every run: URL list parsing,
+schedule parsing (TimeValidator), the valid/pending row filters and the caption
+builders of both destinations. They run over synthetic sheets with messy date strings,
+URL lists with mixed separators, blank cells and unparseable values.
+
+    python benchmarks/micro.py
+    python benchmarks/micro.py --rows 1000 10000 100000 1000000
+    python benchmarks/micro.py --only time_validator --rows 100000
+    python benchmarks/micro.py --save-baseline
+    python benchmarks/micro.py --baseline benchmarks/micro_baseline.json
+
+Each benchmark is timed like pytest-benchmark does it: a warm-up call, then rounds until
+both --min-rounds and --min-time are reached, reported as min/max/mean/stddev/median and
+time per row. The results are written as JSON (--output) and compared with the baseline.
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCHMARK_DIR)
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "micro_baseline.json")
+POOL_SIZE = 5000
+
+sys.path.insert(0, PROJECT_ROOT)
+# Settings require these; no API is called here
+os.environ.setdefault("APP_CLIENT_ID", "benchmark")
+os.environ.setdefault("APP_CLIENT_SECRET", "benchmark")
+
+from config import settings  # noqa: E402
+
+# Shapes schedules are typed in by hand; parsed with dayfirst=True and fuzzy=True
+DATE_FORMATS = [
+    "%d/%m/%Y %H:%M",
+    "%Y-%m-%d %H:%M:%S",
+    "%d.%m.%Y %H:%M",
+    "%d-%m-%Y %H:%M",
+    "%d %B %Y, %H:%M",
+    "%b %d, %Y %I:%M %p",
+    "%d/%m/%Y %I:%M%p",
+    "%Y-%m-%dT%H:%M",
+    "%A %d %B %Y %H:%M",
+    "%d/%m/%Y at %H:%M",
+    "%d/%m/%y %H.%M",
+]
+INVALID_DATES = ["TBD", "next week", "??", "32/13/2024 25:61", "n/a"]
+URL_SEPARATORS = [", ", ",", ";", "; ", "\n", " ", " ,\n", "\xa0", ",\t"]
+STATUSES = ["", "", "Pending", " Pending ", "Published", "Failed", "Publishing", "Partial"]
+CHECKBOXES = ["TRUE", "TRUE", "FALSE", " true ", "", "False"]
+WORDS = "launch summer sale new drop behind the scenes team coffee weekend story recap".split()
+
+
+def _messy_date(rng: random.Random, now: datetime) -> str:
+    roll = rng.random()
+    if roll < 0.03:
+        return ""
+    if roll < 0.05:
+        return rng.choice(INVALID_DATES)
+    scheduled_at = now + timedelta(minutes=rng.randint(-30 * 24 * 60, 30 * 24 * 60))
+    text = scheduled_at.strftime(rng.choice(DATE_FORMATS))
+    if rng.random() < 0.2:
+        text = f"  {text} "
+    return text
+
+
+def _url_list(rng: random.Random, extension: str) -> str:
+    count = rng.choice([0, 0, 1, 1, 1, 2, 3, 5, 10])
+    urls = [
+        f"https://cdn.example.com/{rng.randrange(10**9)}/media-{index}.{extension}"
+        for index in range(count)
+    ]
+    text = ""
+    for url in urls:
+        text += (rng.choice(URL_SEPARATORS) if text else "") + url
+    if urls and rng.random() < 0.2:
+        text += rng.choice([",", " ", ";\n"])  # Trailing separator
+    return text
+
+
+def _caption(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(0, 60))]
+    text = " ".join(words).capitalize()
+    return f"{text}\n" if words and rng.random() < 0.3 else text
+
+
+def _hashtags(rng: random.Random) -> str:
+    tags = [f"#{rng.choice(WORDS)}" for _ in range(rng.randint(0, 12))]
+    return rng.choice([", ", " ", ";"]).join(tags)
+
+
+def generate_sheet(rows: int, seed: int = 0) -> List[Dict]:
+    """
+    Builds `rows` records shaped like `get_all_records()`. Cell values are drawn from
+    pools of POOL_SIZE generated values each, so a million rows fit in memory.
+    """
+    rng = random.Random(seed)
+    now = datetime.now()
+    dates = [_messy_date(rng, now) for _ in range(POOL_SIZE)]
+    image_urls = [_url_list(rng, "jpg") for _ in range(POOL_SIZE)]
+    video_urls = [_url_list(rng, "mp4") if rng.random() < 0.3 else "" for _ in range(POOL_SIZE)]
+    captions = [_caption(rng) for _ in range(POOL_SIZE)]
+    hashtags = [_hashtags(rng) for _ in range(POOL_SIZE)]
+
+    sheet = []
+    for index in range(rows):
+        scheduled = rng.choice(dates)
+        sheet.append(
+            {
+                settings.DATE_COLUMN_NAME: scheduled[:10],
+                settings.TIME_COLUMN_NAME: scheduled,
+                settings.STATUS_COLUMN_NAME: rng.choice(STATUSES),
+                settings.TEXT_COLUMN_NAME: rng.choice(captions),
+                settings.IMAGE_URLS_COLUMN_NAME: rng.choice(image_urls),
+                settings.VIDEO_URLS_COLUMN_NAME: rng.choice(video_urls),
+                settings.HASHTAGS_COLUMN_NAME: rng.choice(hashtags),
+                settings.HASHTAGS_IN_CAPTION_COLUMN_NAME: rng.choice(CHECKBOXES),
+                settings.POST_ON_INSTAGRAM_COLUMN_NAME: rng.choice(CHECKBOXES),
+                settings.POST_ON_THREADS_COLUMN_NAME: rng.choice(CHECKBOXES),
+                "row_number": index + 2,
+            }
+        )
+    return sheet
+
+
+# --- Benchmarks: each takes the sheet and returns the call to time ---
+
+
+def bench_parse_and_clean_urls(sheet: List[Dict]) -> Callable:
+    from processors.parse_clean_urls import parse_and_clean_urls
+
+    def run():
+        for row in sheet:
+            parse_and_clean_urls(row[settings.IMAGE_URLS_COLUMN_NAME])
+            parse_and_clean_urls(row[settings.VIDEO_URLS_COLUMN_NAME])
+
+    return run
+
+
+def bench_time_validator(sheet: List[Dict]) -> Callable:
+    from processors.time_validator import TimeValidator
+
+    validator = TimeValidator()
+    return lambda: validator.process(sheet)
+
+
+def bench_row_filters(sheet: List[Dict]) -> Callable:
+    import main
+
+    return lambda: main.filter_pending_posts(main.filter_valid_posts(sheet))
+
+
+def _bench_caption(destination_class, sheet: List[Dict]) -> Callable:
+    # _build_caption needs no token or client, so the constructor is skipped
+    destination = destination_class.__new__(destination_class)
+    text_column = settings.TEXT_COLUMN_NAME
+    hashtags_column = settings.HASHTAGS_COLUMN_NAME
+    include_column = settings.HASHTAGS_IN_CAPTION_COLUMN_NAME
+
+    def run():
+        for row in sheet:
+            destination._build_caption(
+                row[text_column],
+                row[hashtags_column],
+                str(row[include_column]).strip().upper() == "TRUE",
+            )
+
+    return run
+
+
+def bench_instagram_caption(sheet: List[Dict]) -> Callable:
+    from destinations.instagram import InstagramDestination
+
+    return _bench_caption(InstagramDestination, sheet)
+
+
+def bench_threads_caption(sheet: List[Dict]) -> Callable:
+    from destinations.threads import ThreadsDestination
+
+    return _bench_caption(ThreadsDestination, sheet)
+
+
+BENCHMARKS = {
+    "parse_and_clean_urls": bench_parse_and_clean_urls,
+    "time_validator": bench_time_validator,
+    "row_filters": bench_row_filters,
+    "instagram_caption": bench_instagram_caption,
+    "threads_caption": bench_threads_caption,
+}
+
+
+def measure(run: Callable, rows: int, min_rounds: int, min_time: float) -> Dict:
+    """Times `run` after one warm-up call, for at least `min_rounds` rounds and `min_time` seconds."""
+    run()
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < min_rounds or time.perf_counter() - started < min_time:
+        round_started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - round_started)
+    mean = statistics.mean(timings)
+    return {
+        "rounds": len(timings),
+        "min": min(timings),
+        "max": max(timings),
+        "mean": mean,
+        "stddev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "median": statistics.median(timings),
+        "ops": 1 / mean if mean else 0.0,
+        "ns_per_row": mean / rows * 1e9 if rows else 0.0,
+    }
+
+
+def run_benchmarks(names: List[str], sizes: List[int], min_rounds: int, min_time: float) -> List[Dict]:
+    results = []
+    for rows in sizes:
+        sheet = generate_sheet(rows)
+        for name in names:
+            run = BENCHMARKS[name](sheet)
+            gc.collect()
+            stats = measure(run, rows, min_rounds, min_time)
+            results.append({"name": f"{name}[{rows}]", "group": name, "params": {"rows": rows}, "stats": stats})
+            print(
+                f"{name:<22} {rows:>8} rows  mean {stats['mean'] * 1000:>10.2f} ms  "
+                f"min {stats['min'] * 1000:>10.2f} ms  ± {stats['stddev'] * 1000:>8.2f} ms  "
+                f"{stats['ns_per_row']:>9.0f} ns/row  ({stats['rounds']} rounds)",
+                flush=True,
+            )
+        del sheet
+    return results
+
+
+def compare(results: List[Dict], baseline: List[Dict], tolerance: float) -> List[str]:
+    """
+    Returns a line for every benchmark slower than the baseline beyond the tolerance.
+    The fastest round is compared, as it is the least affected by other load on the machine.
+    """
+    reference = {entry["name"]: entry["stats"] for entry in baseline}
+    regressions = []
+    for result in results:
+        old = reference.get(result["name"], {}).get("min")
+        if not old:
+            continue
+        new = result["stats"]["min"]
+        change = (new - old) / old
+        if change > tolerance:
+            regressions.append(
+                f"{result['name']}: min {old * 1000:.2f} ms -> {new * 1000:.2f} ms ({change:+.0%})"
+            )
+    return regressions
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Microbenchmarks of the per-row pipeline work.")
+    arg_parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    arg_parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="Run only these benchmarks.")
+    arg_parser.add_argument("--min-rounds", type=int, default=3)
+    arg_parser.add_argument("--min-time", type=float, default=1.0, help="Minimum seconds per benchmark.")
+    arg_parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    arg_parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline.")
+    arg_parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before a regression.")
+    arg_parser.add_argument("--output", help="Also write the results to this JSON file.")
+    args = arg_parser.parse_args()
+
+    # Skipped rows are logged one by one; that output is not part of what is measured
+    logging.getLogger("processors.time_validator").setLevel(logging.ERROR)
+    logging.getLogger("ContentPosterLogger").setLevel(logging.ERROR)
+
+    results = run_benchmarks(args.only or list(BENCHMARKS), args.rows, args.min_rounds, args.min_time)
+    report = {
+        "machine_info": {
+            "python_version": platform.python_version(),
+            "python_implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "system": platform.system(),
+        },
+        "datetime": datetime.now().isoformat(timespec="seconds"),
+        "benchmarks": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved the results as the baseline in {args.baseline}.")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline.get("benchmarks", []), args.tolerance)
+    if regressions:
+        print("Slower than the baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+import base64
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from logger_setup import log
+
+# Record/replay of HTTP traffic, for running the destinations offline (see tests_cases.py).
+#   record: requests go out as usual and every response is stored in a cassette file.
+#   replay: no request leaves the process; each one is answered from the cassette.
+# Requests are matched on method and URL without secrets (access_token & co.). Requests
+# whose URL differs between runs, such as GitHub uploads to uuid file names, fall back to
+# matching on the URL's path with all segments containing digits treated as equal.
+# Responses for the same request are replayed in recorded order, the last one repeating,
+# so status polls go IN_PROGRESS -> FINISHED as they did when recorded.
+#
+# During replay, time is virtual: time.sleep only advances the clock seen by
+# time.monotonic (by the full delay; `time_scale` > 0 also really sleeps that share of it),
+# so polling delays, pauses, rate limiter waits and the recorded response times take no
+# time, while timeouts based on time.monotonic behave as they did when recorded.
+
+CASSETTE_VERSION = 1
+# Query parameters and JSON response fields that are never written to a cassette
+SECRET_PARAMS = {"access_token", "client_secret", "fb_exchange_token", "code", "token"}
+SECRET_FIELDS = {"access_token", "client_secret", "refresh_token"}
+REDACTED = "REDACTED"
+# Bodies are stored decoded, so their transfer headers no longer apply
+SKIPPED_HEADERS = {"set-cookie", "content-encoding", "content-length", "transfer-encoding"}
+
+
+class CassetteMismatch(Exception):
+    """Raised during replay for a request the cassette has no response for."""
+
+
+def _without_secrets(url: str) -> str:
+    parts = urlsplit(url)
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key not in SECRET_PARAMS
+    )
+    return parts._replace(query=urlencode(query), fragment="").geturl()
+
+
+def _redacted_url(url: str) -> str:
+    parts = urlsplit(url)
+    query = [
+        (key, REDACTED if key in SECRET_PARAMS else value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+    ]
+    return parts._replace(query=urlencode(query)).geturl()
+
+
+def _redacted_json(value):
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if key in SECRET_FIELDS else _redacted_json(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [_redacted_json(item) for item in value]
+    return value
+
+
+def _exact_key(method: str, url: str) -> Tuple[str, str]:
+    return method.upper(), _without_secrets(url)
+
+
+def _shape_key(method: str, url: str) -> Tuple[str, str, str]:
+    parts = urlsplit(url)
+    segments = [
+        "{id}" if any(char.isdigit() for char in segment) else segment
+        for segment in parts.path.split("/")
+    ]
+    return method.upper(), parts.netloc, "/".join(segments)
+
+
+def _encode_body(content: bytes, content_type: str) -> Dict:
+    if "json" in content_type:
+        try:
+            return {"json": _redacted_json(json.loads(content))}
+        except ValueError:
+            pass
+    try:
+        return {"text": content.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"base64": base64.b64encode(content).decode("ascii")}
+
+
+def _decode_body(body: Dict) -> bytes:
+    if "json" in body:
+        return json.dumps(body["json"]).encode("utf-8")
+    if "text" in body:
+        return body["text"].encode("utf-8")
+    return base64.b64decode(body.get("base64", ""))
+
+
+class VirtualClock:
+    """Replaces time.sleep and time.monotonic so that sleeping only advances the clock."""
+
+    def __init__(self, time_scale: float = 0.0):
+        self.time_scale = time_scale
+        self.offset = 0.0
+        self._lock = threading.Lock()
+        self._real_sleep = time.sleep
+        self._real_monotonic = time.monotonic
+
+    def sleep(self, seconds: float):
+        if seconds <= 0:
+            return
+        if self.time_scale > 0:
+            self._real_sleep(seconds * self.time_scale)
+        with self._lock:
+            self.offset += seconds * (1 - self.time_scale)
+
+    def monotonic(self) -> float:
+        return self._real_monotonic() + self.offset
+
+    def install(self):
+        time.sleep = self.sleep
+        time.monotonic = self.monotonic
+
+    def uninstall(self):
+        time.sleep = self._real_sleep
+        time.monotonic = self._real_monotonic
+
+
+class Cassette:
+    """The interactions of one cassette file, recorded or loaded for replay."""
+
+    def __init__(self, path: str, interactions: Optional[List[Dict]] = None):
+        self.path = path
+        self.interactions: List[Dict] = interactions or []
+        self.replayed = 0
+        self._lock = threading.Lock()
+        self._by_exact: Dict[Tuple, List[Dict]] = defaultdict(list)
+        self._by_shape: Dict[Tuple, List[Dict]] = defaultdict(list)
+        for interaction in self.interactions:
+            method, url = interaction["request"]["method"], interaction["request"]["url"]
+            self._by_exact[_exact_key(method, url)].append(interaction)
+            self._by_shape[_shape_key(method, url)].append(interaction)
+        self._used = set()
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No cassette at {path}. Record it first.")
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(path, data.get("interactions", []))
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._lock:
+            data = {
+                "version": CASSETTE_VERSION,
+                "recorded_at": datetime.now().isoformat(timespec="seconds"),
+                "interactions": list(self.interactions),
+            }
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+
+    def record(self, request: requests.PreparedRequest, response: requests.Response, elapsed: float):
+        content_type = response.headers.get("Content-Type", "")
+        interaction = {
+            "request": {"method": request.method, "url": _redacted_url(request.url)},
+            "response": {
+                "status": response.status_code,
+                "reason": response.reason,
+                "headers": {
+                    key: value
+                    for key, value in response.headers.items()
+                    if key.lower() not in SKIPPED_HEADERS
+                },
+                "body": _encode_body(response.content, content_type),
+            },
+            "elapsed": round(elapsed, 3),
+        }
+        with self._lock:
+            self.interactions.append(interaction)
+
+    def _next(self, candidates: List[Dict]) -> Optional[Dict]:
+        for interaction in candidates:
+            if id(interaction) not in self._used:
+                self._used.add(id(interaction))
+                return interaction
+        return None
+
+    def match(self, request: requests.PreparedRequest) -> Dict:
+        """Returns the next recorded interaction for the request; the last one repeats."""
+        candidates = self._by_exact.get(_exact_key(request.method, request.url))
+        if not candidates:
+            candidates = self._by_shape.get(_shape_key(request.method, request.url), [])
+        with self._lock:
+            interaction = self._next(candidates)
+            if interaction is None and candidates:
+                interaction = candidates[-1]
+            if interaction is not None:
+                self.replayed += 1
+        if interaction is None:
+            raise CassetteMismatch(
+                f"{request.method} {_redacted_url(request.url)} is not in {self.path}."
+            )
+        return interaction
+
+
+def _replayed_response(
+    adapter: HTTPAdapter, request: requests.PreparedRequest, interaction: Dict
+) -> requests.Response:
+    recorded = interaction["response"]
+    response = requests.Response()
+    response.status_code = recorded["status"]
+    response.reason = recorded.get("reason")
+    response.headers = CaseInsensitiveDict(recorded.get("headers", {}))
+    response._content = _decode_body(recorded.get("body", {}))
+    response._content_consumed = True
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response.url = request.url
+    response.request = request
+    response.connection = adapter
+    return response
+
+
+@contextmanager
+def cassette(path: str, mode: str = "replay", time_scale: float = 0.0):
+    """
+    Records ("record") or replays ("replay") all HTTP requests sent through `requests`
+    inside the block to/from the cassette at `path`. Any other mode leaves requests alone.
+    Yields the Cassette.
+    """
+    if mode not in ["record", "replay"]:
+        yield None
+        return
+
+    original_send = HTTPAdapter.send
+    clock = None
+    if mode == "record":
+        current = Cassette(path)
+
+        def send(adapter, request, *args, **kwargs):
+            started = time.perf_counter()
+            response = original_send(adapter, request, *args, **kwargs)
+            current.record(request, response, time.perf_counter() - started)
+            return response
+
+    else:
+        current = Cassette.load(path)
+        clock = VirtualClock(time_scale)
+
+        def send(adapter, request, *args, **kwargs):
+            interaction = current.match(request)
+            time.sleep(interaction.get("elapsed", 0))
+            return _replayed_response(adapter, request, interaction)
+
+    HTTPAdapter.send = send
+    if clock:
+        clock.install()
+    try:
+        yield current
+    finally:
+        HTTPAdapter.send = original_send
+        if clock:
+            clock.uninstall()
+        if mode == "record":
+            current.save()
+            log.info(f"Recorded {len(current.interactions)} request(s) to {path}.")
+        else:
+            log.info(
+                f"Replayed {current.replayed} request(s) from {path} "
+                f"({clock.offset:.1f}s of waiting skipped)."
+            )
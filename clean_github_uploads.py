@@ -1,6 +1,8 @@
 import requests
 from config import settings
 from logger_setup import log
+import staging
+from helpers import github_session
 
 
 def clean_github_uploads_folder():
@@ -22,7 +24,7 @@ def clean_github_uploads_folder():
     folder_path = "uploads"
     branch = "main"
 
-    base_api_url = f"https://api.github.com/repos/{owner}/{repo}"
+    base_api_url = f"{settings.GITHUB_API_BASE_URL}repos/{owner}/{repo}"
     headers = {
         "Authorization": f"Bearer {token}",
         "Accept": "application/vnd.github.json",
@@ -33,7 +35,7 @@ def clean_github_uploads_folder():
     contents_url = f"{base_api_url}/contents/{folder_path}"
     try:
         log.info(f"Fetching contents of '{folder_path}' folder...")
-        response = requests.get(contents_url, headers=headers)
+        response = github_session.get(contents_url, headers=headers)
 
         # If the folder is not found (e.g., already empty and deleted), it's not an error.
         if response.status_code == 404:
@@ -70,7 +72,9 @@ def clean_github_uploads_folder():
 
         try:
             log.info(f"Deleting file: {file_path}...")
-            del_response = requests.delete(delete_url, headers=headers, json=payload)
+            del_response = github_session.delete(
+                delete_url, headers=headers, json=payload
+            )
             del_response.raise_for_status()
             log.info(f"Successfully deleted {file_path}.")
         except requests.exceptions.RequestException as e:
@@ -80,6 +84,8 @@ def clean_github_uploads_folder():
             # Continue to the next file even if one fails
             continue
 
+    # Hosted URLs in the staging cache point into the folder we just emptied
+    staging.clear_hosted_media()
     log.info("GitHub uploads folder cleanup complete.")
 
 
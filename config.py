@@ -6,6 +6,7 @@ class Settings(BaseSettings):
     GITHUB_USERNAME: Optional[str] = None
     GITHUB_REPO_NAME: Optional[str] = None
     GITHUB_TOKEN: Optional[str] = None
+    GITHUB_API_BASE_URL: str = "https://api.github.com/"
 
     THREADS_API_VERSION: str = "v1.0"
     THREADS_API_BASE_URL: str = "https://graph.threads.net/"
@@ -19,6 +20,15 @@ class Settings(BaseSettings):
     # Follow a guide on "Google Cloud Service Account" to get this JSON file.
     # Place the file in the same directory as your project.
     GOOGLE_CREDENTIALS_FILE: str = "credentials.json"
+    # "google" uses the Sheets API; "memory" keeps the worksheets in the process (for
+    # tests and load testing), filled from SHEETS_MEMORY_FILE. Every call to the in-memory
+    # sheets waits SHEETS_MEMORY_LATENCY_MS and is answered with a quota error at
+    # SHEETS_MEMORY_QUOTA_ERROR_RATE or above SHEETS_MEMORY_REQUESTS_PER_MINUTE (0: no limit).
+    SHEETS_BACKEND: str = "google"
+    SHEETS_MEMORY_FILE: Optional[str] = None
+    SHEETS_MEMORY_LATENCY_MS: float = 0
+    SHEETS_MEMORY_QUOTA_ERROR_RATE: float = 0
+    SHEETS_MEMORY_REQUESTS_PER_MINUTE: int = 0
 
     # --- Column Header Names ---
     # The names of the columns in your worksheet that contain the data.
@@ -36,6 +46,10 @@ class Settings(BaseSettings):
     POST_ON_THREADS_COLUMN_NAME: str = "Post on Threads"
     LOCAL_IMAGE_PATH_COLUMN_NAME: str = "Local Image Path"
     LOCAL_VIDEO_PATH_COLUMN_NAME: str = "Local Video Path"
+    # Optional: written by the script while a row is locked as "Publishing"
+    LEASE_COLUMN_NAME: str = "Lease Expiry"
+    # Optional: minutes between the scheduled time and the post going live
+    PUBLISH_LAG_COLUMN_NAME: str = "Publish Lag"
 
     # --- Advanced Settings ---
     STATUS_OPTIONS: dict[str, str] = (
@@ -50,9 +64,149 @@ class Settings(BaseSettings):
         }
     )
 
+    # How long a "Publishing" lock is valid. Rows whose lease expired (e.g. because the
+    # worker crashed) are checked against the platform and picked up again.
+    PUBLISH_LEASE_MINUTES: int = 30
+
+    # --- Worker Lock Settings ---
+    # Each worksheet is processed by one worker at a time; other workers skip it.
+    WORKER_LOCK_DIR: str = "locks"
+    WORKER_HEARTBEAT_SECONDS: int = 30
+    WORKER_STALE_SECONDS: int = 600  # A holder without a heartbeat this long is reported as hung
+
+    # --- Multi-node Settings ---
+    # Worksheets are split between all nodes registered in the coordination store.
+    # "sqlite" coordinates the processes of one host, "redis" several hosts.
+    COORDINATION_BACKEND: str = "sqlite"
+    COORDINATION_DB_FILE: str = "coordination.db"
+    COORDINATION_REDIS_URL: str = "redis://localhost:6379/0"
+    COORDINATION_KEY_PREFIX: str = "content-pipeline"
+    NODE_ID: Optional[str] = None  # Defaults to "<hostname>:<id kept in NODE_ID_FILE>"
+    NODE_ID_FILE: str = "node_id"
+    NODE_TTL_SECONDS: int = 90  # A node without a heartbeat this long is considered gone
+    HASH_RING_REPLICAS: int = 64
+
+    # --- Metrics Settings ---
+    # Written after every run in the Prometheus text format. With `main.py --loop`,
+    # the same metrics are also served on http://METRICS_HOST:METRICS_PORT/metrics.
+    METRICS_FILE: str = "metrics.prom"
+    METRICS_HOST: str = "127.0.0.1"
+    METRICS_PORT: int = 9464
+
+    # --- Tracing Settings ---
+    # "jsonl" or "chrome" writes the spans of every run to a new file in TRACE_DIR
+    # (the Chrome format opens in chrome://tracing or ui.perfetto.dev). Empty: off.
+    TRACE_FORMAT: str = ""
+    TRACE_DIR: str = "traces"
+
+    # --- Profiling Settings (`main.py --profile[=cpu|mem]`) ---
+    PROFILE_DIR: str = "profiles"
+    PROFILE_SAMPLE_INTERVAL_MS: float = 5  # Stack sampling interval of the CPU profile
+    PROFILE_TRACEMALLOC_FRAMES: int = 10  # Stack depth kept per allocation
+
+    # --- Logging Settings ---
+    LOG_FORMAT: str = "text"  # "json" writes one JSON object per line
+    LOG_SAMPLE_INTERVAL_SECONDS: float = 30  # Repeated status poll messages are logged this often
+
     TOKEN_FILE: str = "token_storage.json"
+    # "json" keeps tokens in TOKEN_FILE; "sqlite" keeps them in TOKEN_DB_FILE, which is
+    # filled from TOKEN_FILE automatically the first time it is used.
+    TOKEN_BACKEND: str = "json"
+    TOKEN_DB_FILE: str = "token_storage.db"
+    TOKEN_REFRESH_WORKERS: int = 8  # Tokens refreshed in parallel (paced by RATE_LIMIT_BUCKETS)
     MAIN_SCRIPT_RUN_FREQUENCY_MINUTES: int = 1
 
+    # --- Video Encoding Settings ---
+    # The ffmpeg profile is picked from how much time is left before a post is due:
+    # "fast" when due (or almost due), "compact" when there is plenty of lead time.
+    VIDEO_ENCODING_PROFILES: dict[str, dict[str, str]] = {
+        "fast": {"preset": "veryfast", "crf": "23"},
+        "balanced": {"preset": "medium", "crf": "23"},
+        "compact": {"preset": "slow", "crf": "25"},
+    }
+    VIDEO_ENCODING_BALANCED_LEAD_MINUTES: int = 5  # Less lead time than this -> "fast"
+    VIDEO_ENCODING_COMPACT_LEAD_MINUTES: int = 60  # At least this much -> "compact"
+
+    # --- Ahead-of-time Staging Settings ---
+    # Rows due within the horizon get their media converted and hosted early,
+    # so only the publish call is left when they become due. 0 disables staging.
+    STAGING_HORIZON_MINUTES: int = 30
+    STAGING_PRECREATE_CONTAINERS: bool = False  # Also create the Meta containers early
+    STAGING_CONTAINER_TTL_HOURS: float = 23  # Meta containers expire after 24 hours
+    STAGING_FILE: str = "staging_cache.json"
+    # Local videos converted for a direct upload are kept here until the upload finished
+    CONVERTED_VIDEO_DIR: str = "converted_videos"
+
+    # --- Publish Journal Settings ---
+    # Every completed publishing step is recorded per row and platform, so a retry
+    # continues from the last step instead of re-uploading media.
+    JOURNAL_DB_FILE: str = "publish_journal.db"
+    JOURNAL_RETENTION_DAYS: int = 30
+    MEDIA_CACHE_TTL_HOURS: float = 72  # How long a hosted media URL is reused
+
+    # --- Publish Lag Settings ---
+    # Scheduled, lock and publish time of every published post, per platform.
+    # `python publish_lag.py` reports the lag percentiles per account and platform.
+    PUBLISH_LAG_DB_FILE: str = "publish_lag.db"
+    PUBLISH_LAG_TARGET_MINUTES: float = 5  # The report shows the share of posts within it
+
+    # --- Image Optimization Settings ---
+    # Local images are resized, auto-rotated and stripped of metadata before upload.
+    # Instagram only accepts JPEG images, Threads accepts JPEG and PNG.
+    IMAGE_OPTIMIZATION_ENABLED: bool = True
+    IMAGE_MAX_SIZES: dict[str, list[int]] = {  # [max width, max height] per platform
+        "instagram": [1440, 1800],
+        "threads": [1440, 1920],
+    }
+    IMAGE_OUTPUT_FORMATS: dict[str, str] = {"instagram": "JPEG", "threads": "JPEG"}
+    IMAGE_QUALITY: int = 85
+    IMAGE_WORKERS: int = 4
+
+    # --- Instagram Video Upload Settings ---
+    # Local videos are sent straight to Meta with a resumable upload instead of
+    # being hosted on GitHub first. Interrupted uploads resume from the last offset.
+    INSTAGRAM_DIRECT_VIDEO_UPLOAD: bool = True
+    INSTAGRAM_UPLOAD_CHUNK_MB: int = 8  # 0 sends the whole file in one request
+    INSTAGRAM_UPLOAD_MAX_RETRIES: int = 3
+
+    # --- Container Polling Settings ---
+    # "default" applies to every platform; platform entries override single values.
+    # Delays are in seconds. Video polling starts at the larger of video_initial_delay
+    # and size_in_MB * video_seconds_per_mb, then grows by backoff_factor up to max_delay.
+    POLLING_OPTIONS: dict[str, dict[str, float]] = {
+        "default": {
+            "image_initial_delay": 0.5,
+            "video_initial_delay": 3,
+            "video_seconds_per_mb": 0.5,
+            "backoff_factor": 1.6,
+            "max_delay": 20,
+            "timeout": 300,
+            "max_checks": 60,
+            "publish_delay": 0,  # Pause before publishing a finished container
+            "reply_delay": 0,  # Pause before the first comment / hashtag reply
+        },
+        "instagram": {"timeout": 600, "reply_delay": 3},
+        "threads": {"publish_delay": 1},
+    }
+
+    # --- Rate Limit Settings ---
+    # API calls are paced per app ("app") and per account ("account") with token buckets.
+    # Buckets slow down once Meta's usage headers report more than the target percentage.
+    RATE_LIMIT_TARGET_USAGE_PERCENT: int = 80
+    RATE_LIMIT_BUCKETS: dict[str, dict[str, float]] = {
+        "app": {"rate_per_minute": 300, "burst": 30},
+        "account": {"rate_per_minute": 60, "burst": 10},
+    }
+    RATE_LIMIT_MAX_WAIT_SECONDS: int = 30  # Longer waits defer the post to a later run
+    RATE_LIMIT_COOLDOWN_SECONDS: int = 600  # Pause after a rate-limit error without a hint
+    RATE_LIMIT_STATE_FILE: str = "rate_limit_state.json"
+
+    # --- Publishing Quota Settings ---
+    # Instagram and Threads cap how many posts an account may publish per 24 hours.
+    # Due rows beyond the remaining quota stay Pending until the quota frees up.
+    PUBLISHING_QUOTA_CACHE_MINUTES: int = 30  # How long a fetched quota is trusted
+    PUBLISHING_QUOTA_FILE: str = "publishing_quota.json"
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
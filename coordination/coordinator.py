@@ -0,0 +1,145 @@
+import os
+import socket
+import threading
+import uuid
+from typing import Dict, List, Optional
+from interfaces import ICoordinationStore
+from logger_setup import log
+from config import settings
+from publish_journal import content_fingerprint
+from coordination.hash_ring import HashRing
+
+
+def create_store() -> ICoordinationStore:
+    """Creates the coordination store selected by COORDINATION_BACKEND."""
+    backend = settings.COORDINATION_BACKEND.lower()
+    if backend == "redis":
+        from coordination.redis_store import RedisCoordinationStore
+
+        return RedisCoordinationStore(
+            settings.COORDINATION_REDIS_URL, settings.COORDINATION_KEY_PREFIX
+        )
+    if backend == "sqlite":
+        from coordination.sqlite_store import SQLiteCoordinationStore
+
+        return SQLiteCoordinationStore(settings.COORDINATION_DB_FILE)
+    raise ValueError(
+        f"Unknown COORDINATION_BACKEND '{settings.COORDINATION_BACKEND}'. Use 'sqlite' or 'redis'."
+    )
+
+
+def _default_node_id() -> str:
+    """
+    Returns "<hostname>:<uuid>". The uuid is kept in NODE_ID_FILE, so a node keeps its
+    id, and with it its share of the worksheets, across restarts and scheduled runs.
+    """
+    if not os.path.exists(settings.NODE_ID_FILE):
+        temp_path = f"{settings.NODE_ID_FILE}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(uuid.uuid4().hex)
+        try:
+            # Linking fails if another process created the file first; its id wins
+            os.link(temp_path, settings.NODE_ID_FILE)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temp_path)
+    with open(settings.NODE_ID_FILE, "r", encoding="utf-8") as f:
+        return f"{socket.gethostname()}:{f.read().strip()}"
+
+
+class Coordinator:
+    """
+    Splits the worksheets between all running nodes. Nodes register in the coordination
+    store with a heartbeat; each worksheet belongs to the node the consistent hash ring
+    assigns it to, so the assignment rebalances whenever a node joins or its
+    registration expires. Rows are additionally claimed with compare-and-set before
+    they are marked "Publishing", so two nodes never publish the same row while their
+    views of the ring briefly differ.
+    """
+
+    def __init__(self, store: ICoordinationStore, node_id: Optional[str] = None):
+        self.store = store
+        self.node_id = node_id or settings.NODE_ID or _default_node_id()
+        self._nodes: List[str] = []
+        self._ring = HashRing([])
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def join(self):
+        """Registers this node and keeps it registered until `leave()` is called."""
+        self.store.heartbeat(self.node_id, settings.NODE_TTL_SECONDS)
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._heartbeat_loop, name="node-heartbeat", daemon=True
+        )
+        self._thread.start()
+        log.info(f"Node '{self.node_id}' joined the coordination store.")
+
+    def leave(self, stay_registered_seconds: float = 0):
+        """
+        Stops the heartbeat and unregisters this node, so its worksheets move to the other
+        nodes right away. With `stay_registered_seconds`, the node stays registered that
+        long instead, e.g. until the next run of a scheduled process.
+        """
+        self._stop.set()
+        try:
+            if stay_registered_seconds > 0:
+                self.store.heartbeat(self.node_id, stay_registered_seconds)
+            else:
+                self.store.remove_node(self.node_id)
+        except Exception as e:
+            log.warning(f"Could not unregister node '{self.node_id}': {e}")
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(settings.WORKER_HEARTBEAT_SECONDS):
+            try:
+                self.store.heartbeat(self.node_id, settings.NODE_TTL_SECONDS)
+            except Exception as e:
+                log.warning(f"Node heartbeat failed: {e}")
+
+    def _refresh_ring(self):
+        nodes = self.store.live_nodes()
+        if self.node_id not in nodes:
+            # Our registration expired (e.g. the process was suspended), so renew it
+            self.store.heartbeat(self.node_id, settings.NODE_TTL_SECONDS)
+            nodes = sorted(nodes + [self.node_id])
+        if nodes != self._nodes:
+            log.info(f"Active nodes: {nodes}. Rebalancing worksheet assignments.")
+            self._nodes = nodes
+            self._ring = HashRing(nodes, settings.HASH_RING_REPLICAS)
+
+    def owns(self, sheet_name: str, worksheet_name: str) -> bool:
+        """Returns True if the worksheet is assigned to this node."""
+        self._refresh_ring()
+        owner = self._ring.node_for(f"{sheet_name}/{worksheet_name}")
+        if owner != self.node_id:
+            log.info(f"Worksheet '{worksheet_name}' is assigned to node '{owner}'. Skipping.")
+            return False
+        return True
+
+    @staticmethod
+    def _claim_key(sheet_name: str, worksheet_name: str, item: Dict) -> str:
+        # The fingerprint keeps a claim from carrying over to different content in the same row
+        return f"{sheet_name}/{worksheet_name}/{item.get('row_number')}/{content_fingerprint(item)}"
+
+    def claim_rows(self, sheet_name: str, worksheet_name: str, posts: List[Dict]) -> List[Dict]:
+        """Claims the rows for this node and returns the posts that were claimed."""
+        ttl_seconds = settings.PUBLISH_LEASE_MINUTES * 60
+        claimed = []
+        for item in posts:
+            key = self._claim_key(sheet_name, worksheet_name, item)
+            if self.store.claim(key, self.node_id, ttl_seconds):
+                claimed.append(item)
+            else:
+                log.warning(
+                    f"Row {item.get('row_number')} is claimed by another node. Skipping it."
+                )
+        return claimed
+
+    def release_row(self, sheet_name: str, worksheet_name: str, item: Dict):
+        try:
+            self.store.release(self._claim_key(sheet_name, worksheet_name, item), self.node_id)
+        except Exception as e:
+            # The claim expires on its own after PUBLISH_LEASE_MINUTES
+            log.warning(f"Could not release the claim on row {item.get('row_number')}: {e}")
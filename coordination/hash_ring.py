@@ -0,0 +1,30 @@
+import bisect
+import hashlib
+from typing import List, Optional
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.sha1(value.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring. Each node is placed on the ring `replicas` times, so when a
+    node joins or leaves only the keys next to its points move to another node.
+    """
+
+    def __init__(self, nodes: List[str], replicas: int = 64):
+        self.nodes = sorted(nodes)
+        self._points = sorted(
+            (_hash(f"{node}#{index}"), node)
+            for node in self.nodes
+            for index in range(replicas)
+        )
+        self._hashes = [point for point, _ in self._points]
+
+    def node_for(self, key: str) -> Optional[str]:
+        """Returns the node responsible for `key`, or None if the ring is empty."""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._points)
+        return self._points[index][1]
@@ -0,0 +1,69 @@
+import time
+from typing import List
+from interfaces import ICoordinationStore
+
+# Claims are plain keys holding the owner's ID, with the claim TTL as key expiry.
+# Compare-and-set runs as Lua scripts, which Redis executes atomically.
+_CLAIM_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current and current ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+return 1
+"""
+
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisCoordinationStore(ICoordinationStore):
+    """
+    Coordination store for nodes on several hosts. Works with any server that speaks the
+    Redis protocol and supports EVAL. `client` may be any object with the redis-py API
+    (e.g. a local stand-in); otherwise one is created from `url`.
+    """
+
+    def __init__(self, url: str = "", key_prefix: str = "content-pipeline", client=None):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ImportError(
+                    "The 'redis' package is required for COORDINATION_BACKEND=redis. "
+                    "Install it with: pip install -r requirements-redis.txt"
+                )
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self.client = client
+        self.key_prefix = key_prefix
+        self.nodes_key = f"{key_prefix}:nodes"
+
+    def heartbeat(self, node_id: str, ttl_seconds: float):
+        # Nodes live in a sorted set scored by the time their registration expires
+        self.client.zadd(self.nodes_key, {node_id: time.time() + ttl_seconds})
+
+    def remove_node(self, node_id: str):
+        self.client.zrem(self.nodes_key, node_id)
+
+    def live_nodes(self) -> List[str]:
+        self.client.zremrangebyscore(self.nodes_key, "-inf", time.time())
+        nodes = self.client.zrange(self.nodes_key, 0, -1)
+        return sorted(
+            node.decode("utf-8") if isinstance(node, bytes) else node for node in nodes
+        )
+
+    def claim(self, key: str, owner: str, ttl_seconds: float) -> bool:
+        result = self.client.eval(
+            _CLAIM_SCRIPT, 1, f"{self.key_prefix}:claim:{key}", owner, int(ttl_seconds * 1000)
+        )
+        return bool(int(result))
+
+    def release(self, key: str, owner: str) -> bool:
+        result = self.client.eval(
+            _RELEASE_SCRIPT, 1, f"{self.key_prefix}:claim:{key}", owner
+        )
+        return bool(int(result))
@@ -0,0 +1,92 @@
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+from interfaces import ICoordinationStore
+
+
+class SQLiteCoordinationStore(ICoordinationStore):
+    """
+    Coordination store in a local SQLite file. It is shared by all processes on one host;
+    every claim runs in an IMMEDIATE transaction, so the compare-and-set is atomic.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None, check_same_thread=False
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS nodes (node_id TEXT PRIMARY KEY, expires_at REAL NOT NULL)"
+            )
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS claims (
+                    claim_key TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+                """
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS claims_expires_at ON claims (expires_at)"
+            )
+        return self._connection
+
+    def heartbeat(self, node_id: str, ttl_seconds: float):
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO nodes (node_id, expires_at) VALUES (?, ?)",
+                (node_id, time.time() + ttl_seconds),
+            )
+
+    def remove_node(self, node_id: str):
+        with self._lock:
+            self._connect().execute("DELETE FROM nodes WHERE node_id = ?", (node_id,))
+
+    def live_nodes(self) -> List[str]:
+        with self._lock:
+            connection = self._connect()
+            connection.execute("DELETE FROM nodes WHERE expires_at <= ?", (time.time(),))
+            rows = connection.execute("SELECT node_id FROM nodes ORDER BY node_id").fetchall()
+        return [row[0] for row in rows]
+
+    def claim(self, key: str, owner: str, ttl_seconds: float) -> bool:
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                # Claims are kept until they expire; drop those that have, so the table stays small
+                connection.execute("DELETE FROM claims WHERE expires_at <= ?", (now,))
+                row = connection.execute(
+                    "SELECT owner, expires_at FROM claims WHERE claim_key = ?", (key,)
+                ).fetchone()
+                if row and row[0] != owner and row[1] > now:
+                    connection.execute("ROLLBACK")
+                    return False
+                connection.execute(
+                    "INSERT OR REPLACE INTO claims (claim_key, owner, expires_at) VALUES (?, ?, ?)",
+                    (key, owner, now + ttl_seconds),
+                )
+                connection.execute("COMMIT")
+                return True
+            except sqlite3.Error:
+                connection.execute("ROLLBACK")
+                raise
+
+    def release(self, key: str, owner: str) -> bool:
+        with self._lock:
+            deleted = (
+                self._connect()
+                .execute(
+                    "DELETE FROM claims WHERE claim_key = ? AND owner = ?", (key, owner)
+                )
+                .rowcount
+            )
+        return deleted > 0
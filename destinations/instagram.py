@@ -1,30 +1,54 @@
 import os
-import time
-from typing import Dict, Optional, List
+from datetime import datetime
+from typing import Dict, Optional, List, Tuple
 import requests
 from interfaces import IDestination
 from logger_setup import log
+from metrics import timed_stage
+from http_instrumentation import retrying
 from config import settings
 import token_manager
+import staging
+from graph_client import GraphClient, parse_timestamp
+from rate_limiter import RateLimitDeferred
+import publishing_quota
+from publish_journal import PublishJournal
+from polling import PollingPolicy, pause
 from processors.parse_clean_urls import parse_and_clean_urls
 from helpers import upload_to_github
-from processors.video_processor import process_and_upload_video
+from processors.video_processor import (
+    discard_converted_video,
+    prepare_local_video,
+    process_and_upload_video,
+)
+from processors.image_processor import process_and_upload_images
+from processors.time_validator import seconds_until_due
 
 
 class InstagramDestination(IDestination):
     """A destination that posts content to the Instagram Graph API from URLs or local files."""
 
     def __init__(self, sheet_name: str, worksheet_name: str):
-        all_tokens = token_manager.load_tokens()
-        token_data = (
-            all_tokens.get(sheet_name, {}).get(worksheet_name, {}).get("instagram", {})
-        )
+        token_data = token_manager.get_token(sheet_name, worksheet_name, "instagram")
+        self.sheet_name = sheet_name
+        self.worksheet_name = worksheet_name
         self.user_id = token_data.get("user_id")
-        self.access_token = token_data.get("access_token")
+        self.client = GraphClient(
+            "instagram",
+            self.user_id,
+            token_data.get("access_token"),
+            sheet_name,
+            worksheet_name,
+        )
         self.base_url = (
             f"{settings.FACEBOOK_API_BASE_URL}{settings.FACEBOOK_API_VERSION}"
         )
 
+    @property
+    def access_token(self) -> Optional[str]:
+        # Owned by the client, which replaces it if the API rejects it
+        return self.client.access_token
+
     def _format_hashtags(self, hashtags: Optional[str]) -> Optional[str]:
         """Formats a comma-separated string of hashtags into a space-separated list."""
         if not hashtags:
@@ -53,6 +77,7 @@ class InstagramDestination(IDestination):
                 caption_parts.append(formatted_hashtags)
         return "\n\n".join(caption_parts)
 
+    @timed_stage("follow_up")
     def _post_first_comment(self, media_id: str, comment_text: str) -> bool:
         log.info(
             f"Attempting to post hashtags as first comment to media ID: {media_id}"
@@ -61,7 +86,7 @@ class InstagramDestination(IDestination):
         # --- FIX: Use data=payload for form-encoding, not params and json ---
         payload = {"message": comment_text, "access_token": self.access_token}
         try:
-            response = requests.post(endpoint, data=payload)
+            response = self.client.post(endpoint, data=payload)
             response.raise_for_status()
             log.info("✅ Successfully posted hashtags as the first comment.")
             return True
@@ -71,12 +96,13 @@ class InstagramDestination(IDestination):
             )
             return False
 
+    @timed_stage("publish")
     def _publish_container(self, creation_id: str) -> Optional[str]:
         endpoint = f"{self.base_url}/{self.user_id}/media_publish"
         params = {"creation_id": creation_id, "access_token": self.access_token}
         try:
             log.info(f"Publishing container ID: {creation_id}")
-            response = requests.post(endpoint, params=params)
+            response = self.client.post(endpoint, params=params)
             response.raise_for_status()
             post_id = response.json().get("id")
             log.info(f"🚀 Successfully published to Instagram! Post ID: {post_id}")
@@ -87,13 +113,21 @@ class InstagramDestination(IDestination):
             )
             return None
 
-    def _check_container_status(self, creation_id: str) -> Optional[str]:
+    @timed_stage("container_poll")
+    def _check_container_status(
+        self, creation_id: str, media_type: str = "IMAGE", size_bytes: int = 0
+    ) -> Optional[str]:
+        """
+        Polls the container status until it's FINISHED or fails. The delay between checks
+        follows the Instagram polling policy for the given media type and size.
+        """
         fields_to_check = "status_code,status"
-        for _ in range(20):
+        policy = PollingPolicy("instagram", media_type, size_bytes)
+        while True:
             try:
                 status_url = f"{self.base_url}/{creation_id}"
                 params = {"fields": fields_to_check, "access_token": self.access_token}
-                response = requests.get(status_url, params=params)
+                response = self.client.get(status_url, params=params)
                 response.raise_for_status()
                 status_data = response.json()
 
@@ -102,19 +136,24 @@ class InstagramDestination(IDestination):
                 if status == "FINISHED":
                     log.info(f"Container {creation_id} is ready.")
                     return creation_id
-                if status == "ERROR":
+                if status in ["ERROR", "EXPIRED"]:
                     log.error(
                         f"Container {creation_id} failed to process. Details: {status_data}"
                     )
                     return None
-                log.info(f"Container {creation_id} status is '{status}'. Waiting...")
-                time.sleep(5)
+                log.info(
+                    f"Container {creation_id} status is '{status}'. Waiting...",
+                    extra={"sample_key": f"container-status:{creation_id}"},
+                )
             except requests.exceptions.RequestException as e:
                 log.error(f"{e}")
                 return None
+            if not policy.wait(response):
+                break
         log.error(f"Container {creation_id} timed out processing.")
         return None
 
+    @timed_stage("parent_container")
     def _create_carousel_container_id(
         self, media_ids: List[str], caption: str
     ) -> Optional[str]:
@@ -127,10 +166,10 @@ class InstagramDestination(IDestination):
         }
         try:
             log.info(f"Creating carousel container with media IDs: {media_ids}")
-            response = requests.post(endpoint, params=params)
+            response = self.client.post(endpoint, params=params)
             response.raise_for_status()
             creation_id = response.json().get("id")
-            return self._check_container_status(creation_id)
+            return self._check_container_status(creation_id, "CAROUSEL")
         except requests.exceptions.RequestException as e:
             log.error(
                 f"Error creating carousel container: {e.response.text if e.response else e}"
@@ -152,65 +191,186 @@ class InstagramDestination(IDestination):
             log.info(
                 f"Uploading carousel item ({'video' if is_video else 'image'}) from URL: {media_url}"
             )
-            response = requests.post(endpoint, params=params, timeout=300)
+            response = self.client.post(endpoint, params=params, timeout=300)
             response.raise_for_status()
             creation_id = response.json().get("id")
-            return self._check_container_status(creation_id)
+            return self._check_container_status(
+                creation_id, "VIDEO" if is_video else "IMAGE"
+            )
         except requests.exceptions.RequestException as e:
             log.error(f"Error uploading media: {e.response.text if e.response else e}")
             return None
 
+    def _get_uploaded_offset(self, container_id: str) -> Optional[int]:
+        """
+        Asks Meta how many bytes of a resumable upload it has received,
+        so an interrupted upload can continue from there.
+        """
+        try:
+            response = self.client.get(
+                f"{self.base_url}/{container_id}",
+                params={"fields": "video_status", "access_token": self.access_token},
+                timeout=30,
+            )
+            response.raise_for_status()
+            uploading_phase = response.json().get("video_status", {}).get(
+                "uploading_phase", {}
+            )
+            return int(uploading_phase.get("bytes_transferred") or 0)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            log.error(f"Could not get upload progress for container {container_id}: {e}")
+            return None
+
+    def _send_video_data(
+        self,
+        container_id: str,
+        upload_url: str,
+        local_path: str,
+        file_size: int,
+        offset: int,
+    ) -> bool:
+        """
+        Sends a file to the rupload endpoint in chunks, starting at `offset`.
+        After an interruption the last acknowledged offset is fetched and sending resumes from it.
+        """
+        chunk_size = settings.INSTAGRAM_UPLOAD_CHUNK_MB * 1024 * 1024 or file_size
+        retries_left = settings.INSTAGRAM_UPLOAD_MAX_RETRIES
+        resuming = False
+        with open(local_path, "rb") as video_file:
+            while offset < file_size:
+                video_file.seek(offset)
+                chunk = video_file.read(chunk_size)
+                headers = {
+                    "Authorization": f"OAuth {self.access_token}",
+                    "offset": str(offset),
+                    "file_size": str(file_size),
+                }
+                try:
+                    with retrying(resuming):
+                        upload_response = self.client.post(
+                            upload_url, headers=headers, data=chunk, timeout=600
+                        )
+                    upload_response.raise_for_status()
+                    resuming = False
+                    offset += len(chunk)
+                    log.info(
+                        f"Uploaded {offset}/{file_size} bytes for container {container_id}."
+                    )
+                except requests.exceptions.RequestException as e:
+                    log.error(
+                        f"Upload of {local_path} interrupted at offset {offset}: "
+                        f"{e.response.text if e.response else e}"
+                    )
+                    if retries_left <= 0:
+                        return False
+                    retries_left -= 1
+                    resuming = True
+                    acknowledged_offset = self._get_uploaded_offset(container_id)
+                    if acknowledged_offset is not None:
+                        offset = acknowledged_offset
+                    log.info(f"Resuming upload of {local_path} from offset {offset}.")
+        return True
+
+    @timed_stage("video_upload")
     def _upload_video_from_local_file(
-        self, local_path: str, is_carousel_item: bool = False
+        self,
+        local_path: str,
+        is_carousel_item: bool = False,
+        caption: str = "",
+        upload_key: Optional[str] = None,
     ) -> Optional[str]:
-        """Uploads a single video from a local file path and returns its container ID."""
+        """
+        Uploads a single video from a local file path with Meta's resumable upload
+        and returns its container ID. An upload session interrupted in an earlier run
+        is resumed from the last acknowledged offset instead of starting from zero.
+        Sessions are found by `upload_key`, by default the file's content hash.
+        """
         if not os.path.exists(local_path):
             log.error(f"Local file not found at path: {local_path}")
             return None
         file_size = os.path.getsize(local_path)
         log.info(f"Uploading local video file: {local_path} ({file_size} bytes)")
 
-        endpoint = f"{self.base_url}/{self.user_id}/media"
-        params = {"access_token": self.access_token, "upload_type": "resumable"}
-        if is_carousel_item:
-            params["media_type"] = "VIDEO"
-            params["is_carousel_item"] = "true"
-        else:
-            params["media_type"] = "REELS"
+        media_type = "VIDEO" if is_carousel_item else "REELS"
+        session_key = staging.upload_session_key(
+            self.user_id, media_type, upload_key or staging.file_digest(local_path), caption
+        )
+        session = staging.get_upload_session(session_key)
+        container_id = session.get("container_id") if session else None
+        upload_url = session.get("upload_url") if session else None
+        offset = self._get_uploaded_offset(container_id) if container_id else None
 
-        try:
-            response = requests.post(endpoint, params=params)
-            response.raise_for_status()
-            response_data = response.json()
-            container_id, upload_url = response_data.get("id"), response_data.get("uri")
-            if not all([container_id, upload_url]):
+        if offset is None:
+            endpoint = f"{self.base_url}/{self.user_id}/media"
+            params = {
+                "access_token": self.access_token,
+                "upload_type": "resumable",
+                "media_type": media_type,
+            }
+            if is_carousel_item:
+                params["is_carousel_item"] = "true"
+            elif caption:
+                params["caption"] = caption
+
+            try:
+                response = self.client.post(endpoint, params=params)
+                response.raise_for_status()
+                response_data = response.json()
+                container_id, upload_url = response_data.get("id"), response_data.get(
+                    "uri"
+                )
+                if not all([container_id, upload_url]):
+                    log.error(f"Invalid resumable upload response: {response_data}")
+                    return None
+            except requests.exceptions.RequestException as e:
+                log.error(
+                    f"Error creating upload container: {e.response.text if e.response else e}"
+                )
                 return None
-        except requests.exceptions.RequestException as e:
+            offset = 0
+            staging.save_upload_session(
+                session_key, {"container_id": container_id, "upload_url": upload_url}
+            )
+        else:
+            log.info(
+                f"Resuming upload session for container {container_id} at offset {offset}."
+            )
+
+        if not self._send_video_data(
+            container_id, upload_url, local_path, file_size, offset
+        ):
             return None
+        log.info(f"Successfully uploaded file data for container {container_id}.")
+        staging.discard_upload_session(session_key)
+        return self._check_container_status(container_id, media_type, file_size)
 
-        headers = {
-            "Authorization": f"OAuth {self.access_token}",
-            "offset": "0",
-            "file_size": str(file_size),
-        }
+    def _fetch_publishing_limit(self) -> Optional[Tuple[int, int]]:
+        """Returns (quota_usage, quota_total) from the content_publishing_limit endpoint."""
+        endpoint = f"{self.base_url}/{self.user_id}/content_publishing_limit"
+        params = {"fields": "quota_usage,config", "access_token": self.access_token}
         try:
-            with open(local_path, "rb") as video_file:
-                upload_response = requests.post(
-                    upload_url, headers=headers, data=video_file, timeout=600
-                )
-                upload_response.raise_for_status()
-                log.info(
-                    f"Successfully uploaded file data for container {container_id}."
-                )
+            response = self.client.get(endpoint, params=params, timeout=30)
+            response.raise_for_status()
+            return publishing_quota.parse_publishing_limit(response.json())
+        except RateLimitDeferred as e:
+            log.warning(f"Could not fetch publishing limit: {e}")
+            return None
         except requests.exceptions.RequestException as e:
+            log.error(
+                f"Could not fetch publishing limit: {e.response.text if e.response else e}"
+            )
             return None
-        return self._check_container_status(container_id)
 
-    def post(self, content: Dict) -> bool:
+    def get_remaining_quota(self) -> Optional[int]:
+        """Returns how many more posts this account may publish today, or None if unknown."""
         if not all([self.user_id, self.access_token]):
-            return False
+            return None
+        return publishing_quota.get_remaining_quota(
+            self.client.account, self._fetch_publishing_limit
+        )
 
-        # --- 1. Prepare Content ---
+    def _prepare_text(self, content: Dict) -> Tuple[str, Optional[str], bool]:
+        """Returns the caption, the raw hashtags and whether hashtags go into the caption."""
         hashtags = content.get(settings.HASHTAGS_COLUMN_NAME)
         post_hashtags_with_text = (
             str(content.get(settings.HASHTAGS_IN_CAPTION_COLUMN_NAME, ""))
@@ -221,8 +381,15 @@ class InstagramDestination(IDestination):
         caption = self._build_caption(
             content.get(settings.TEXT_COLUMN_NAME), hashtags, post_hashtags_with_text
         )
+        return caption, hashtags, post_hashtags_with_text
 
-        # --- 2. Process Media Sources ---
+    @timed_stage("media_prepare")
+    def _resolve_media(self, content: Dict) -> Optional[List[Tuple[str, str]]]:
+        """
+        Hosts any local files of a row and returns its media as ("image" | "video", public URL)
+        pairs, or ("local_video", path) pairs for videos sent with a direct resumable upload.
+        Returns None if a local file could not be hosted.
+        """
         image_urls = parse_and_clean_urls(
             content.get(settings.IMAGE_URLS_COLUMN_NAME, "")
         )
@@ -236,101 +403,282 @@ class InstagramDestination(IDestination):
             content.get(settings.LOCAL_VIDEO_PATH_COLUMN_NAME, "")
         )
 
-        for path in local_image_paths:
-            github_url = upload_to_github(path)
-            if github_url:
-                image_urls.append(github_url)
-            else:
-                return False
+        hosted_image_urls = process_and_upload_images(local_image_paths, "instagram")
+        if hosted_image_urls is None:
+            return None
+        image_urls.extend(hosted_image_urls)
 
-        # Build a master list of all media to be processed
         all_media = [("image", url) for url in image_urls]
         if local_video_paths:
-            all_media.extend([("local_video", path) for path in local_video_paths])
+            is_carousel = len(image_urls) + len(local_video_paths) > 1
+            for path in local_video_paths:
+                if settings.INSTAGRAM_DIRECT_VIDEO_UPLOAD:
+                    # Sent straight to Meta with a resumable upload when the container is created
+                    all_media.append(("local_video", path))
+                    continue
+                if is_carousel:
+                    # Carousel items must match the 4:5 feed format, so convert if needed
+                    public_url = process_and_upload_video(
+                        local_path=path,
+                        time_budget_seconds=seconds_until_due(content),
+                    )
+                else:
+                    public_url = upload_to_github(path)
+                if not public_url:
+                    return None
+                all_media.append(("video", public_url))
         else:
-            all_media.extend([("video_url", url) for url in video_urls])
+            all_media.extend([("video", url) for url in video_urls])
+        return all_media
+
+    def _upload_local_carousel_video(
+        self, local_path: str, time_budget_seconds: Optional[float]
+    ) -> Optional[str]:
+        """
+        Converts a local video to the feed format if needed and uploads it as a carousel item.
+        The upload session is keyed on the source file and the encoding profile, and the
+        converted file is kept until the upload finished, so a later attempt resumes it.
+        """
+        path_to_upload, profile_name = prepare_local_video(local_path, time_budget_seconds)
+        upload_key = (
+            f"{staging.file_digest(local_path)}:{profile_name}" if profile_name else None
+        )
+        container_id = self._upload_video_from_local_file(
+            path_to_upload, is_carousel_item=True, upload_key=upload_key
+        )
+        if container_id and profile_name:
+            discard_converted_video(path_to_upload)
+        return container_id
+
+    @timed_stage("container_create")
+    def _create_final_container(
+        self, content: Dict, caption: str, journal: PublishJournal
+    ) -> Optional[str]:
+        """
+        Creates the container (single media or carousel) that will be published.
+        Hosted media and finished carousel items recorded by an earlier attempt are reused.
+        """
+        all_media = journal.get(
+            "media_hosted", max_age_hours=settings.MEDIA_CACHE_TTL_HOURS
+        )
+        if all_media is None:
+            all_media = self._resolve_media(content)
+            if all_media is None:
+                log.error("Failed to host one or more local media files.")
+                return None
+            journal.record("media_hosted", all_media)
 
         media_count = len(all_media)
         if media_count == 0:
             log.error("Instagram posts require at least one image or video.")
-            return False
+            return None
 
-        # --- 3. Create Container(s) ---
-        final_container_id = None
         if media_count == 1:
             log.info("Processing as a single media post.")
-            media_type, media_source = all_media[0]
+            media_type, media_url = all_media[0]
+            if media_type == "local_video":
+                return self._upload_video_from_local_file(media_url, caption=caption)
 
             # --- FIX: Corrected API call for single media posts ---
             all_params = {"access_token": self.access_token, "caption": caption}
             if media_type == "image":
-                all_params["image_url"] = media_source
-            else:  # Handles both 'local_video' and 'video_url'
+                all_params["image_url"] = media_url
+            else:
                 all_params["media_type"] = "REELS"
-                if media_type == "local_video":
-                    # For local videos, we need to upload to get a URL first
-                    public_url = upload_to_github(media_source)
-                    if not public_url:
-                        return False
-                    all_params["video_url"] = public_url
-                else:  # video_url
-                    all_params["video_url"] = media_source
+                all_params["video_url"] = media_url
             try:
                 endpoint = f"{self.base_url}/{self.user_id}/media"
-                response = requests.post(endpoint, params=all_params, timeout=300)
+                response = self.client.post(endpoint, params=all_params, timeout=300)
                 response.raise_for_status()
-                final_container_id = self._check_container_status(
-                    response.json().get("id")
+                return self._check_container_status(
+                    response.json().get("id"), all_params.get("media_type", "IMAGE")
                 )
             except requests.exceptions.RequestException as e:
                 log.error(
                     f"Error creating single media container: {e.response.text if e.response else e}"
                 )
-                return False
+                return None
 
-        elif media_count > 1:
-            log.info("Processing as a carousel post.")
-            media_container_ids = []
+        log.info("Processing as a carousel post.")
+        media_container_ids = self._create_child_containers(all_media, content, journal)
+        if media_container_ids is None:
+            return None
+        return self._create_carousel_container_id(media_container_ids, caption)
 
-            for media_type, media_source in all_media:
-                container_id = None
+    @timed_stage("child_containers")
+    def _create_child_containers(
+        self, all_media: List, content: Dict, journal: PublishJournal
+    ) -> Optional[List[str]]:
+        """Creates (or reuses) the container of every carousel item, in order."""
+        child_containers = (
+            journal.get(
+                "child_containers", max_age_hours=settings.STAGING_CONTAINER_TTL_HOURS
+            )
+            or {}
+        )
+        media_container_ids = []
+        for index, (media_type, media_url) in enumerate(all_media):
+            container_id = child_containers.get(str(index))
+            if container_id and self._check_container_status(container_id):
+                log.info(f"Reusing carousel item container {container_id}.")
+            elif media_type == "local_video":
+                container_id = self._upload_local_carousel_video(
+                    media_url, seconds_until_due(content)
+                )
+            else:
+                container_id = self._upload_media_and_get_container_id(
+                    media_url, is_video=media_type == "video"
+                )
+            if not container_id:
+                log.error("Failed to upload one or more media items for the carousel.")
+                return None
+            media_container_ids.append(container_id)
+            child_containers[str(index)] = container_id
+            journal.record("child_containers", child_containers)
+        return media_container_ids
 
-                # --- FIX: Correctly determine if the item is a video ---
-                is_video = media_type in ["local_video", "video_url"]
+    def _get_parent_container(self, journal: PublishJournal) -> Optional[str]:
+        """Returns the container recorded by staging or an earlier attempt, if still usable."""
+        container_id = journal.get(
+            "parent_container", max_age_hours=settings.STAGING_CONTAINER_TTL_HOURS
+        )
+        if not container_id:
+            return None
+        if self._check_container_status(container_id):
+            log.info(f"Using previously created container {container_id}.")
+            return container_id
+        # Expired or failed on Meta's side: drop it and re-stage inline
+        journal.discard("parent_container")
+        return None
 
-                # First, get a public URL for any local files
-                public_url = media_source
-                if media_type == "local_video":
-                    public_url = process_and_upload_video(local_path=public_url)
+    def find_existing_post(self, content: Dict) -> Optional[Dict]:
+        """
+        Looks for a recent post on the account with this row's caption, e.g. one published
+        by a worker that died before recording it. Returns the post (with its "id" and
+        "timestamp") if found.
+        """
+        caption, _, _ = self._prepare_text(content)
+        if not caption:
+            return None  # Posts without a caption cannot be matched reliably
+        endpoint = f"{self.base_url}/{self.user_id}/media"
+        params = {
+            "fields": "id,caption,timestamp",
+            "limit": 25,
+            "access_token": self.access_token,
+        }
+        try:
+            response = self.client.get(endpoint, params=params, timeout=30)
+            response.raise_for_status()
+            recent_posts = response.json().get("data", [])
+        except RateLimitDeferred as e:
+            log.warning(f"Could not check for an existing post: {e}")
+            return None
+        except requests.exceptions.RequestException as e:
+            log.error(
+                f"Could not check for an existing post: {e.response.text if e.response else e}"
+            )
+            return None
+        for recent_post in recent_posts:
+            if (recent_post.get("caption") or "").strip() == caption.strip():
+                return recent_post
+        return None
 
-                # Now upload to Instagram using the public URL
-                container_id = self._upload_media_and_get_container_id(
-                    public_url, is_video=is_video
-                )
-                if container_id:
-                    media_container_ids.append(container_id)
-                else:
-                    break
+    def recover(self, content: Dict):
+        """
+        Prepares a row whose publishing lease expired for another attempt: if the post is
+        already live, it is recorded as published so it is not posted twice.
+        """
+        journal = self._journal(content)
+        if journal.get("published"):
+            return
+        existing_post = self.find_existing_post(content)
+        if existing_post:
+            post_id = existing_post.get("id")
+            log.info(
+                f"Row {content.get('row_number')} is already live on Instagram as {post_id}."
+            )
+            # Record when it went live, not when it was found, for the publish lag
+            journal.record(
+                "published", post_id, parse_timestamp(existing_post.get("timestamp"))
+            )
 
-            if len(media_container_ids) == media_count:
-                final_container_id = self._create_carousel_container_id(
-                    media_container_ids, caption
-                )
-            else:
-                log.error("Failed to upload one or more media items for the carousel.")
+    def published_at(self, content: Dict) -> Optional[datetime]:
+        """Returns when the row went live on Instagram, as recorded in its journal."""
+        return self._journal(content).recorded_at("published")
+
+    def _journal(self, content: Dict) -> PublishJournal:
+        return PublishJournal(self.sheet_name, self.worksheet_name, content, "instagram")
+
+    def stage(self, content: Dict) -> bool:
+        """
+        Prepares a row ahead of its scheduled time: hosts its media, starts the direct
+        uploads of local videos and, if enabled, pre-creates the final container so only
+        the publish call is left when it is due.
+        """
+        if not all([self.user_id, self.access_token]):
+            return False
+        journal = self._journal(content)
+        if journal.get("published") or journal.get(
+            "parent_container", max_age_hours=settings.STAGING_CONTAINER_TTL_HOURS
+        ):
+            return True
+
+        caption, _, _ = self._prepare_text(content)
+        if not settings.STAGING_PRECREATE_CONTAINERS:
+            all_media = self._resolve_media(content)
+            if all_media is None:
                 return False
+            if not any(media_type == "local_video" for media_type, _ in all_media):
+                return True
+            # Direct uploads are the slowest part of a post, so they start now. A single
+            # video's upload creates the post's own container; carousel items get theirs.
+            journal.record("media_hosted", all_media)
+            if len(all_media) > 1:
+                return self._create_child_containers(all_media, content, journal) is not None
+        container_id = self._create_final_container(content, caption, journal)
+        if not container_id:
+            return False
+        journal.record("parent_container", container_id)
+        log.info(f"Staged Instagram container {container_id}.")
+        return True
 
-        # --- 4. Publish Final Container ---
-        if not final_container_id:
-            log.error("Could not create a final container for publishing.")
+    def post(self, content: Dict) -> bool:
+        if not all([self.user_id, self.access_token]):
             return False
-        post_id = self._publish_container(final_container_id)
-        self.post_id = post_id
+
+        # --- 1. Prepare Content ---
+        caption, hashtags, post_hashtags_with_text = self._prepare_text(content)
+        journal = self._journal(content)
+
+        post_id = journal.get("published")
         if post_id:
-            if not post_hashtags_with_text and hashtags:
-                formatted_hashtags = self._format_hashtags(hashtags)
-                if formatted_hashtags:
-                    time.sleep(3)
-                    self._post_first_comment(post_id, formatted_hashtags)
-            return True
-        return False
+            log.info(f"Row was already published to Instagram as {post_id}. Resuming.")
+        else:
+            # --- 2. Use the staged / previous container or create one now ---
+            final_container_id = self._get_parent_container(journal)
+            if not final_container_id:
+                final_container_id = self._create_final_container(
+                    content, caption, journal
+                )
+                if final_container_id:
+                    journal.record("parent_container", final_container_id)
+
+            # --- 3. Publish Final Container ---
+            if not final_container_id:
+                log.error("Could not create a final container for publishing.")
+                return False
+            post_id = self._publish_container(final_container_id)
+            if not post_id:
+                return False
+            journal.record("published", post_id)
+            publishing_quota.record_publish(self.client.account)
+
+        # --- 4. Follow-up Comment ---
+        self.post_id = post_id
+        if not post_hashtags_with_text and hashtags and not journal.get("follow_up"):
+            formatted_hashtags = self._format_hashtags(hashtags)
+            if formatted_hashtags:
+                pause("instagram", "reply_delay")
+                if self._post_first_comment(post_id, formatted_hashtags):
+                    journal.record("follow_up", True)
+        return True
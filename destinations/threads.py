@@ -1,27 +1,44 @@
 import re
-import time
-from typing import Dict, Optional, List
+from datetime import datetime
+from typing import Dict, Optional, List, Tuple
 import requests
 from interfaces import IDestination
 from logger_setup import log
+from metrics import timed_stage
 from config import settings
 import token_manager
+from graph_client import GraphClient, parse_timestamp
+from rate_limiter import RateLimitDeferred
+import publishing_quota
+from publish_journal import PublishJournal
+from polling import PollingPolicy, pause
 from processors.parse_clean_urls import parse_and_clean_urls
 from helpers import upload_to_github
+from processors.image_processor import process_and_upload_images
 
 
 class ThreadsDestination(IDestination):
     """A destination that posts content to Meta's Threads API, supporting single and carousel posts from URLs or local files."""
 
     def __init__(self, sheet_name: str, worksheet_name: str):
-        all_tokens = token_manager.load_tokens()
-        token_data = (
-            all_tokens.get(sheet_name, {}).get(worksheet_name, {}).get("threads", {})
-        )
+        token_data = token_manager.get_token(sheet_name, worksheet_name, "threads")
+        self.sheet_name = sheet_name
+        self.worksheet_name = worksheet_name
         self.user_id = token_data.get("user_id")
-        self.access_token = token_data.get("access_token")
+        self.client = GraphClient(
+            "threads",
+            self.user_id,
+            token_data.get("access_token"),
+            sheet_name,
+            worksheet_name,
+        )
         self.base_url = f"{settings.THREADS_API_BASE_URL}{settings.THREADS_API_VERSION}"
 
+    @property
+    def access_token(self) -> Optional[str]:
+        # Owned by the client, which replaces it if the API rejects it
+        return self.client.access_token
+
     def _build_caption(
         self, text: Optional[str], hashtags: Optional[str], include_hashtags: bool
     ) -> str:
@@ -35,6 +52,7 @@ class ThreadsDestination(IDestination):
                 caption_parts.append(formatted_hashtags)
         return "\n\n".join(caption_parts)
 
+    @timed_stage("follow_up")
     def _post_reply(self, original_post_id: str, reply_text: str) -> bool:
         """Posts a reply to a given Threads post ID using the required two-step process."""
         log.info(f"Attempting to post reply to Thread ID: {original_post_id}")
@@ -50,7 +68,7 @@ class ThreadsDestination(IDestination):
         creation_id = None
         try:
             log.info("Reply Step 1: Creating reply container...")
-            response = requests.post(container_endpoint, params=container_payload)
+            response = self.client.post(container_endpoint, params=container_payload)
             response.raise_for_status()
             creation_id = response.json().get("id")
             if not creation_id:
@@ -67,20 +85,25 @@ class ThreadsDestination(IDestination):
         # --- Step 2: Publish the Reply Container ---
         return self._publish_container(creation_id)
 
-    def _check_container_status(self, creation_id: str) -> Optional[str]:
+    @timed_stage("container_poll")
+    def _check_container_status(
+        self, creation_id: str, media_type: str = "IMAGE", size_bytes: int = 0
+    ) -> Optional[str]:
         """
         Polls the container status endpoint until it's FINISHED or fails.
-        This is crucial for waiting on video processing.
+        This is crucial for waiting on video processing. The delay between checks
+        follows the Threads polling policy for the given media type and size.
         """
         log.info(f"Checking status for container ID: {creation_id}")
-        for _ in range(15):  # Poll for up to 75 seconds (15 * 5s)
+        policy = PollingPolicy("threads", media_type, size_bytes)
+        while True:
             try:
                 status_url = f"{self.base_url}/{creation_id}"
                 params = {
                     "fields": "status",
                     "access_token": self.access_token,
                 }
-                response = requests.get(status_url, params=params, timeout=30)
+                response = self.client.get(status_url, params=params, timeout=30)
                 response.raise_for_status()
                 status_data = response.json()
                 status = status_data.get("status")
@@ -88,15 +111,19 @@ class ThreadsDestination(IDestination):
                 if status == "FINISHED":
                     log.info(f"Container {creation_id} is ready.")
                     return creation_id
-                if status == "ERROR":
+                if status in ["ERROR", "EXPIRED"]:
                     log.error(f"Container {creation_id} failed. Details: {status_data}")
                     return None
 
-                log.info(f"Container {creation_id} status is '{status}'. Waiting...")
-                time.sleep(5)
+                log.info(
+                    f"Container {creation_id} status is '{status}'. Waiting...",
+                    extra={"sample_key": f"container-status:{creation_id}"},
+                )
             except requests.exceptions.RequestException as e:
                 log.error(f"Error checking status for {creation_id}: {e}")
                 return None
+            if not policy.wait(response):
+                break
 
         log.error(f"Container {creation_id} timed out after multiple checks.")
         return None
@@ -114,7 +141,7 @@ class ThreadsDestination(IDestination):
             params.update({"media_type": "IMAGE", "image_url": media_url})
 
         try:
-            response = requests.post(endpoint, params=params, timeout=90)
+            response = self.client.post(endpoint, params=params, timeout=90)
             response.raise_for_status()
             item_id = response.json().get("id")
             if not item_id:
@@ -122,22 +149,23 @@ class ThreadsDestination(IDestination):
                 return None
 
             # Wait for the item to finish processing before returning its ID
-            return self._check_container_status(item_id)
+            return self._check_container_status(item_id, params["media_type"])
         except requests.exceptions.RequestException as e:
             log.error(
                 f"Error creating item container: {e.response.text if e.response else e}"
             )
             return None
 
+    @timed_stage("publish")
     def _publish_container(self, creation_id: str) -> Optional[str]:
         """Publishes a finished container and returns the post ID."""
         log.info(f"Publishing final container ID: {creation_id}")
 
-        time.sleep(1)  # A small delay can prevent rapid-fire API issues.
+        pause("threads", "publish_delay")  # A small delay can prevent rapid-fire API issues.
         endpoint = f"{self.base_url}/{self.user_id}/threads_publish"
         params = {"creation_id": creation_id, "access_token": self.access_token}
         try:
-            response = requests.post(endpoint, params=params, timeout=60)
+            response = self.client.post(endpoint, params=params, timeout=60)
             response.raise_for_status()
             post_id = response.json().get("id")
             if not post_id:
@@ -153,13 +181,33 @@ class ThreadsDestination(IDestination):
             )
             return None
 
-    def post(self, content: Dict) -> bool:
-        """Publishes content to Threads using a two-step create and publish flow."""
+    def _fetch_publishing_limit(self) -> Optional[Tuple[int, int]]:
+        """Returns (quota_usage, quota_total) from the threads_publishing_limit endpoint."""
+        endpoint = f"{self.base_url}/{self.user_id}/threads_publishing_limit"
+        params = {"fields": "quota_usage,config", "access_token": self.access_token}
+        try:
+            response = self.client.get(endpoint, params=params, timeout=30)
+            response.raise_for_status()
+            return publishing_quota.parse_publishing_limit(response.json())
+        except RateLimitDeferred as e:
+            log.warning(f"Could not fetch publishing limit: {e}")
+            return None
+        except requests.exceptions.RequestException as e:
+            log.error(
+                f"Could not fetch publishing limit: {e.response.text if e.response else e}"
+            )
+            return None
+
+    def get_remaining_quota(self) -> Optional[int]:
+        """Returns how many more posts this account may publish today, or None if unknown."""
         if not all([self.user_id, self.access_token]):
-            log.error("Missing user_id or access_token. Cannot post to Threads.")
-            return False
+            return None
+        return publishing_quota.get_remaining_quota(
+            self.client.account, self._fetch_publishing_limit
+        )
 
-        # --- 1. Prepare Content ---
+    def _prepare_text(self, content: Dict) -> Tuple[str, Optional[str], bool]:
+        """Returns the caption, the raw hashtags and whether hashtags go into the caption."""
         text = content.get(settings.TEXT_COLUMN_NAME)
         hashtags = content.get(settings.HASHTAGS_COLUMN_NAME)
         post_hashtags_in_caption = (
@@ -168,15 +216,24 @@ class ThreadsDestination(IDestination):
             .upper()
             == "TRUE"
         )
+        caption = self._build_caption(
+            text, hashtags, include_hashtags=post_hashtags_in_caption
+        )
+        return caption, hashtags, post_hashtags_in_caption
+
+    @timed_stage("media_prepare")
+    def _resolve_media(self, content: Dict) -> Optional[Tuple[List[str], List[str]]]:
+        """
+        Hosts any local files of a row (via GitHub) and returns its public image and video URLs.
+        Returns None if a local file could not be hosted.
+        """
         text_only = (
             str(content.get(settings.THREADS_TEXT_ONLY_COLUMN_NAME, "")).strip().upper()
             == "TRUE"
         )
-        caption = self._build_caption(
-            text, hashtags, include_hashtags=post_hashtags_in_caption
-        )
+        if text_only:
+            return [], []
 
-        # --- 2. Process Media Sources (URLs and Local Files via GitHub) ---
         image_urls = parse_and_clean_urls(
             content.get(settings.IMAGE_URLS_COLUMN_NAME, "")
         )
@@ -187,14 +244,13 @@ class ThreadsDestination(IDestination):
         local_image_paths_raw = content.get(settings.LOCAL_IMAGE_PATH_COLUMN_NAME, "")
         local_image_paths = parse_and_clean_urls(local_image_paths_raw)
 
-        for path in local_image_paths:
-            log.info(f"Uploading local image from path: {path}")
-            github_url = upload_to_github(path)
-            if github_url:
-                image_urls.append(github_url)
-            else:
-                log.error(f"Upload failed for local image: {path}. Halting post.")
-                return False  # Stop immediately if any upload fails
+        if local_image_paths:
+            log.info(f"Uploading local images from paths: {local_image_paths}")
+            hosted_image_urls = process_and_upload_images(local_image_paths, "threads")
+            if hosted_image_urls is None:
+                log.error("Upload failed for one or more local images. Halting post.")
+                return None  # Stop immediately if any upload fails
+            image_urls.extend(hosted_image_urls)
 
         # Handle multiple local video paths
         local_video_paths_raw = content.get(settings.LOCAL_VIDEO_PATH_COLUMN_NAME, "")
@@ -207,15 +263,28 @@ class ThreadsDestination(IDestination):
                 video_urls.append(github_url)
             else:
                 log.error(f"Upload failed for local video: {path}. Halting post.")
-                return False  # Stop immediately if any upload fails
+                return None  # Stop immediately if any upload fails
 
-        if text_only:
-            image_urls, video_urls = [], []
+        return image_urls, video_urls
 
+    @timed_stage("container_create")
+    def _create_final_container(
+        self, content: Dict, caption: str, journal: PublishJournal
+    ) -> Optional[str]:
+        """
+        Creates the container (text, single media or carousel) that will be published.
+        Hosted media and finished carousel items recorded by an earlier attempt are reused.
+        """
+        media = journal.get("media_hosted", max_age_hours=settings.MEDIA_CACHE_TTL_HOURS)
+        if media is None:
+            media = self._resolve_media(content)
+            if media is None:
+                return None
+            journal.record("media_hosted", media)
+        image_urls, video_urls = media
         all_media_urls = image_urls + video_urls
         media_count = len(all_media_urls)
 
-        # --- 3. Create Container(s) based on Media Count ---
         final_container_id = None
         endpoint = f"{self.base_url}/{self.user_id}/threads"
 
@@ -223,14 +292,14 @@ class ThreadsDestination(IDestination):
             if media_count == 0:  # Text-Only Post
                 if not caption:
                     log.error("No text found for text-only post.")
-                    return False
+                    return None
                 log.info("Creating text-only post container...")
                 params = {
                     "media_type": "TEXT",
                     "text": caption,
                     "access_token": self.access_token,
                 }
-                response = requests.post(endpoint, params=params, timeout=90)
+                response = self.client.post(endpoint, params=params, timeout=90)
                 response.raise_for_status()
                 final_container_id = response.json().get("id")
 
@@ -242,56 +311,217 @@ class ThreadsDestination(IDestination):
                     params.update({"media_type": "VIDEO", "video_url": media_url})
                 else:
                     params.update({"media_type": "IMAGE", "image_url": media_url})
-                response = requests.post(endpoint, params=params, timeout=90)
+                response = self.client.post(endpoint, params=params, timeout=90)
                 response.raise_for_status()
                 # final_container_id = response.json().get("id")
                 creation_id = response.json().get("id")
                 if creation_id:
-                    final_container_id = self._check_container_status(creation_id)
+                    final_container_id = self._check_container_status(
+                        creation_id, params["media_type"]
+                    )
 
             elif media_count > 1:  # Carousel Post
                 log.info(f"Creating carousel with {media_count} items...")
-                child_container_ids = []
-                for url in all_media_urls:
-                    item_id = self._create_item_container(
-                        url, is_video=(url in video_urls)
-                    )
-                    if item_id:
-                        child_container_ids.append(item_id)
-                    else:
-                        raise ValueError(
-                            "Failed to create one or more carousel item containers."
-                        )
-
-                log.info("Creating parent carousel container...")
-                params = {
-                    "media_type": "CAROUSEL",
-                    "children": ",".join(child_container_ids),
-                    "text": caption,
-                    "access_token": self.access_token,
-                }
-                response = requests.post(endpoint, params=params, timeout=90)
-                response.raise_for_status()
-                final_container_id = response.json().get("id")
+                child_container_ids = self._create_child_containers(
+                    all_media_urls, video_urls, journal
+                )
+                final_container_id = self._create_parent_container(
+                    child_container_ids, caption
+                )
 
         except (requests.exceptions.RequestException, ValueError) as e:
             log.error(f"Error during container creation phase: {e}")
-            return False
+            return None
 
-        # --- 4. Publish Final Container ---
-        if not final_container_id:
-            log.error("Failed to create a final container for publishing.")
-            return False
-        if final_container_id and media_count > 1:
+        return final_container_id
+
+    @timed_stage("child_containers")
+    def _create_child_containers(
+        self, all_media_urls: List[str], video_urls: List[str], journal: PublishJournal
+    ) -> List[str]:
+        """
+        Creates (or reuses) the container of every carousel item, in order.
+        Raises ValueError if one of them could not be created.
+        """
+        child_containers = (
+            journal.get(
+                "child_containers",
+                max_age_hours=settings.STAGING_CONTAINER_TTL_HOURS,
+            )
+            or {}
+        )
+        child_container_ids = []
+        for index, url in enumerate(all_media_urls):
+            item_id = child_containers.get(str(index))
+            if item_id and self._check_container_status(item_id):
+                log.info(f"Reusing carousel item container {item_id}.")
+            else:
+                item_id = self._create_item_container(url, is_video=(url in video_urls))
+            if not item_id:
+                raise ValueError("Failed to create one or more carousel item containers.")
+            child_container_ids.append(item_id)
+            child_containers[str(index)] = item_id
+            journal.record("child_containers", child_containers)
+        return child_container_ids
+
+    @timed_stage("parent_container")
+    def _create_parent_container(
+        self, child_container_ids: List[str], caption: str
+    ) -> Optional[str]:
+        """Creates the carousel container AND waits for it to be ready."""
+        log.info("Creating parent carousel container...")
+        params = {
+            "media_type": "CAROUSEL",
+            "children": ",".join(child_container_ids),
+            "text": caption,
+            "access_token": self.access_token,
+        }
+        response = self.client.post(
+            f"{self.base_url}/{self.user_id}/threads", params=params, timeout=90
+        )
+        response.raise_for_status()
+        creation_id = response.json().get("id")
+        if not creation_id:
+            return None
+        log.info("Parent carousel container created. Waiting for server-side processing...")
+        return self._check_container_status(creation_id, "CAROUSEL")
+
+    def _get_parent_container(self, journal: PublishJournal) -> Optional[str]:
+        """Returns the container recorded by staging or an earlier attempt, if still usable."""
+        container_id = journal.get(
+            "parent_container", max_age_hours=settings.STAGING_CONTAINER_TTL_HOURS
+        )
+        if not container_id:
+            return None
+        if self._check_container_status(container_id):
+            log.info(f"Using previously created container {container_id}.")
+            return container_id
+        # Expired or failed on Meta's side: drop it and re-stage inline
+        journal.discard("parent_container")
+        return None
+
+    def find_existing_post(self, content: Dict) -> Optional[Dict]:
+        """
+        Looks for a recent post on the account with this row's caption, e.g. one published
+        by a worker that died before recording it. Returns the post (with its "id" and
+        "timestamp") if found.
+        """
+        caption, _, _ = self._prepare_text(content)
+        if not caption:
+            return None  # Posts without a caption cannot be matched reliably
+        endpoint = f"{self.base_url}/{self.user_id}/threads"
+        params = {
+            "fields": "id,text,timestamp",
+            "limit": 25,
+            "access_token": self.access_token,
+        }
+        try:
+            response = self.client.get(endpoint, params=params, timeout=30)
+            response.raise_for_status()
+            recent_posts = response.json().get("data", [])
+        except RateLimitDeferred as e:
+            log.warning(f"Could not check for an existing post: {e}")
+            return None
+        except requests.exceptions.RequestException as e:
+            log.error(
+                f"Could not check for an existing post: {e.response.text if e.response else e}"
+            )
+            return None
+        for recent_post in recent_posts:
+            if (recent_post.get("text") or "").strip() == caption.strip():
+                return recent_post
+        return None
+
+    def recover(self, content: Dict):
+        """
+        Prepares a row whose publishing lease expired for another attempt: if the post is
+        already live, it is recorded as published so it is not posted twice.
+        """
+        journal = self._journal(content)
+        if journal.get("published"):
+            return
+        existing_post = self.find_existing_post(content)
+        if existing_post:
+            post_id = existing_post.get("id")
             log.info(
-                "Parent carousel container created. Waiting 20 seconds for server-side processing..."
+                f"Row {content.get('row_number')} is already live on Threads as {post_id}."
+            )
+            # Record when it went live, not when it was found, for the publish lag
+            journal.record(
+                "published", post_id, parse_timestamp(existing_post.get("timestamp"))
             )
-            time.sleep(20)  # Add a long wait here
 
-        post_id = self._publish_container(final_container_id)
-        if post_id and not post_hashtags_in_caption and hashtags:
+    def published_at(self, content: Dict) -> Optional[datetime]:
+        """Returns when the row went live on Threads, as recorded in its journal."""
+        return self._journal(content).recorded_at("published")
+
+    def _journal(self, content: Dict) -> PublishJournal:
+        return PublishJournal(self.sheet_name, self.worksheet_name, content, "threads")
+
+    def stage(self, content: Dict) -> bool:
+        """
+        Prepares a row ahead of its scheduled time: hosts its media and, if enabled,
+        pre-creates the final container so only the publish call is left when it is due.
+        """
+        if not all([self.user_id, self.access_token]):
+            return False
+        if not settings.STAGING_PRECREATE_CONTAINERS:
+            return self._resolve_media(content) is not None
+        journal = self._journal(content)
+        if journal.get("published") or journal.get(
+            "parent_container", max_age_hours=settings.STAGING_CONTAINER_TTL_HOURS
+        ):
+            return True
+
+        caption, _, _ = self._prepare_text(content)
+        container_id = self._create_final_container(content, caption, journal)
+        if not container_id:
+            return False
+        journal.record("parent_container", container_id)
+        log.info(f"Staged Threads container {container_id}.")
+        return True
+
+    def post(self, content: Dict) -> bool:
+        """Publishes content to Threads using a two-step create and publish flow."""
+        if not all([self.user_id, self.access_token]):
+            log.error("Missing user_id or access_token. Cannot post to Threads.")
+            return False
+
+        # --- 1. Prepare Content ---
+        caption, hashtags, post_hashtags_in_caption = self._prepare_text(content)
+        journal = self._journal(content)
+
+        post_id = journal.get("published")
+        if post_id:
+            log.info(f"Row was already published to Threads as {post_id}. Resuming.")
+        else:
+            # --- 2. Use the staged / previous container or create one now ---
+            final_container_id = self._get_parent_container(journal)
+            if not final_container_id:
+                final_container_id = self._create_final_container(
+                    content, caption, journal
+                )
+                if final_container_id:
+                    journal.record("parent_container", final_container_id)
+
+            # --- 3. Publish Final Container ---
+            if not final_container_id:
+                log.error("Failed to create a final container for publishing.")
+                return False
+
+            post_id = self._publish_container(final_container_id)
+            if not post_id:
+                return False
+            journal.record("published", post_id)
+            publishing_quota.record_publish(self.client.account)
+
+        # --- 4. Hashtag Reply ---
+        if not post_hashtags_in_caption and hashtags and not journal.get("follow_up"):
             reply_hashtags = hashtags
             if reply_hashtags:
-                self._post_reply(post_id, reply_hashtags)
+                pause("threads", "reply_delay")
+                reply_id = self._post_reply(post_id, reply_hashtags)
+                if reply_id:
+                    journal.record("follow_up", reply_id)
 
-        return post_id is not None
+        return True
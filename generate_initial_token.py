@@ -68,6 +68,7 @@ def get_long_lived_token_data(platform: str) -> dict | None:
 def main():
     """Main function to run the interactive token generation flow."""
     all_tokens = token_manager.load_tokens()
+    updates = {}
 
     print("--- Social Media Token Manager ---")
 
@@ -135,11 +136,14 @@ def main():
             "instagram": instagram_data,
             "threads": threads_data,
         }
+        updates[(sheet_name, worksheet_name, "instagram")] = instagram_data
+        updates[(sheet_name, worksheet_name, "threads")] = threads_data
         log.info(f"✅ Successfully configured profile '{worksheet_name}'.")
 
     # --- Step 4: Save All Changes ---
-    if all_tokens:
-        token_manager.save_tokens(all_tokens)
+    # Only the configured profiles are written, so tokens refreshed meanwhile are kept
+    if updates:
+        token_manager.update_tokens(updates)
         log.info("\nAll changes have been saved.")
     else:
         log.info("\nNo changes were made.")
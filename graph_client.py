@@ -0,0 +1,112 @@
+from datetime import datetime
+from typing import Dict, Optional
+import requests
+from logger_setup import log
+from rate_limiter import rate_limiter
+from http_instrumentation import instrument_session, retrying
+
+# One connection pool for every Graph/Threads API call
+session = instrument_session(requests.Session(), "graph")
+
+# Graph API error code for an expired, revoked or otherwise invalid access token
+AUTH_ERROR_CODE = 190
+
+
+def _error_code(response: requests.Response) -> Optional[int]:
+    if response.status_code < 400:
+        return None
+    try:
+        return response.json().get("error", {}).get("code")
+    except (ValueError, AttributeError):
+        return None
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """
+    Converts an API timestamp such as "2024-05-01T10:00:03+0000" to naive local time,
+    the way the journal and the sheet keep times. Returns None if it cannot be parsed.
+    """
+    try:
+        return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S%z").astimezone().replace(tzinfo=None)
+    except (TypeError, ValueError):
+        return None
+
+
+def _replace_token(kwargs: Dict, old_token: str, new_token: str) -> Dict:
+    """Swaps the access token in the params, form data and headers of a request."""
+    kwargs = dict(kwargs)
+    for name in ["params", "data", "headers"]:
+        values = kwargs.get(name)
+        if isinstance(values, dict):
+            kwargs[name] = {
+                key: value.replace(old_token, new_token) if isinstance(value, str) else value
+                for key, value in values.items()
+            }
+    return kwargs
+
+
+class GraphClient:
+    """
+    Sends Graph and Threads API requests on behalf of one account.
+    Every call is paced by the shared rate limiter and its usage headers are recorded.
+
+    If the client knows which worksheet the account belongs to, a request rejected for
+    an invalid token (code 190) refreshes the token once and is retried with it.
+    """
+
+    def __init__(
+        self,
+        platform: str,
+        user_id: str,
+        access_token: Optional[str] = None,
+        sheet_name: Optional[str] = None,
+        worksheet_name: Optional[str] = None,
+    ):
+        self.platform = platform
+        self.account = f"{platform}:{user_id}"
+        self.access_token = access_token
+        self.sheet_name = sheet_name
+        self.worksheet_name = worksheet_name
+
+    def has_budget(self) -> bool:
+        return rate_limiter.has_budget(self.platform, self.account)
+
+    def _send(self, method: str, url: str, **kwargs) -> requests.Response:
+        rate_limiter.acquire(self.platform, self.account)
+        response = session.request(method, url, **kwargs)
+        rate_limiter.record_response(self.platform, self.account, response)
+        return response
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        response = self._send(method, url, **kwargs)
+        if (
+            _error_code(response) != AUTH_ERROR_CODE
+            or not self.access_token
+            or self.sheet_name is None
+        ):
+            return response
+
+        failed_token = self.access_token
+        new_token = self._refresh_access_token(failed_token)
+        if not new_token:
+            return response
+        log.info(f"Retrying {method} request for '{self.account}' with the refreshed token.")
+        with retrying():
+            return self._send(method, url, **_replace_token(kwargs, failed_token, new_token))
+
+    def _refresh_access_token(self, failed_token: str) -> Optional[str]:
+        # Imported here because the refresh itself is sent through a GraphClient
+        from refresh_token import refresh_account_token
+
+        new_token = refresh_account_token(
+            self.sheet_name, self.worksheet_name, self.platform, failed_token
+        )
+        if new_token:
+            self.access_token = new_token
+        return new_token
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
@@ -5,14 +5,22 @@ import uuid
 import base64
 
 from logger_setup import log
+from metrics import timed_stage
 from config import settings
-from token_manager import load_tokens
+import token_manager
+import staging
+from http_instrumentation import instrument_session
 
+# Shared connection pool for GitHub API calls
+github_session = instrument_session(requests.Session(), "github")
 
+
+@timed_stage("github_upload")
 def upload_to_github(local_file_path: str) -> Optional[str]:
     """
     Uploads a local file to a specified GitHub repository using the Contents API
     and returns the raw public URL. This is a simple, one-step process.
+    Files whose content was already uploaded are served from the staging cache.
     """
     if not all(
         [settings.GITHUB_USERNAME, settings.GITHUB_REPO_NAME, settings.GITHUB_TOKEN]
@@ -33,10 +41,16 @@ def upload_to_github(local_file_path: str) -> Optional[str]:
     branch = "main"
 
     file_extension = os.path.splitext(local_file_path)[1]
+    media_key = f"github:{staging.file_digest(local_file_path)}{file_extension}"
+    cached_url = staging.get_hosted_url(media_key)
+    if cached_url:
+        log.info(f"Reusing hosted copy of {local_file_path}: {cached_url}")
+        return cached_url
+
     unique_filename = f"{uuid.uuid4()}{file_extension}"
     repo_file_path = f"uploads/{unique_filename}"
 
-    endpoint = f"https://api.github.com/repos/{owner}/{repo}/contents/{repo_file_path}"
+    endpoint = f"{settings.GITHUB_API_BASE_URL}repos/{owner}/{repo}/contents/{repo_file_path}"
 
     headers = {
         "Authorization": f"Bearer {token}",
@@ -60,7 +74,7 @@ def upload_to_github(local_file_path: str) -> Optional[str]:
         # --- Make the API call ---
         log.info(f"Uploading file to GitHub: {repo_file_path}")
         # Use PUT to create a new file
-        response = requests.put(endpoint, headers=headers, json=payload, timeout=120)
+        response = github_session.put(endpoint, headers=headers, json=payload, timeout=120)
         response.raise_for_status()
 
         # The response contains the URL we need
@@ -69,6 +83,7 @@ def upload_to_github(local_file_path: str) -> Optional[str]:
 
         if download_url:
             log.info(f"GitHub upload successful. Public URL: {download_url}")
+            staging.remember_hosted_url(media_key, download_url)
             return download_url
         else:
             log.error(
@@ -84,19 +99,8 @@ def upload_to_github(local_file_path: str) -> Optional[str]:
 
 
 def get_worksheet_names(sheet_name: str = None) -> list:
-    worksheet_names = []
-
-    tokens = load_tokens()
-    if not sheet_name:
-        worksheets = tokens.values()
-        for worksheet in worksheets:
-            worksheet_names.extend(worksheet.keys())
-    else:
-        worksheets = tokens[sheet_name]
-        worksheet_names = list(worksheets.keys())
-    return worksheet_names
+    return token_manager.get_worksheet_names(sheet_name)
 
 
 def get_sheet_names() -> list:
-    tokens = load_tokens()
-    return list(tokens.keys())
+    return token_manager.get_sheet_names()
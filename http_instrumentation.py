@@ -0,0 +1,173 @@
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, urlsplit
+import requests
+from logger_setup import log
+from config import settings
+import metrics
+import tracing
+
+# A response hook shared by every HTTP session of the pipeline (Graph/Threads API,
+# GitHub and Google Sheets). Requests are grouped by endpoint template, e.g.
+# "GET graph.facebook.com /{user_id}/media" or "GET graph.threads.net /{id}?fields=status",
+# so calls for different accounts and media end up in the same series.
+
+# Graph API edges that hang off an account rather than a media object
+ACCOUNT_EDGES = {
+    "media",
+    "media_publish",
+    "threads",
+    "threads_publish",
+    "content_publishing_limit",
+    "threads_publishing_limit",
+}
+_VERSION = re.compile(r"^v\d+(\.\d+)?$")
+_ID = re.compile(r"^\d+$|^(?=.*\d)[A-Za-z0-9_-]{20,}$")  # Numeric or long opaque IDs
+
+request_duration = metrics.register(
+    metrics.Histogram(
+        "http_request_duration_seconds",
+        "Time until the response headers arrived, per endpoint template.",
+        ["service", "endpoint", "method", "status"],
+        [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60],
+    )
+)
+request_bytes = metrics.register(
+    metrics.Counter(
+        "http_request_bytes_total",
+        "Request body bytes sent, per endpoint template.",
+        ["service", "endpoint", "method"],
+    )
+)
+response_bytes = metrics.register(
+    metrics.Counter(
+        "http_response_bytes_total",
+        "Response body bytes received, per endpoint template.",
+        ["service", "endpoint", "method"],
+    )
+)
+retries_total = metrics.register(
+    metrics.Counter(
+        "http_retries_total",
+        "Requests that repeated an earlier failed request, per endpoint template.",
+        ["service", "endpoint", "method"],
+    )
+)
+
+_lock = threading.Lock()
+_samples: Dict[Tuple[str, str, str], List[float]] = {}
+_retrying = threading.local()
+
+
+def endpoint_template(url: str) -> str:
+    """Reduces a URL to its endpoint, with IDs, versions and names replaced by placeholders."""
+    parts = urlsplit(url)
+    segments = [segment for segment in parts.path.split("/") if segment]
+
+    github_netloc = urlsplit(settings.GITHUB_API_BASE_URL).netloc
+    if parts.netloc == github_netloc and segments[:1] == ["repos"]:
+        # /repos/{owner}/{repo}/contents/{path}
+        template = ["repos", "{owner}", "{repo}"] + segments[3:4]
+        if len(segments) > 4:
+            template.append("{path}")
+        return "/" + "/".join(template)
+
+    if "googleapis.com" in parts.netloc:
+        template = []
+        for index, segment in enumerate(segments):
+            previous = segments[index - 1] if index else ""
+            if previous in ["spreadsheets", "files"]:
+                segment = re.sub(r"^[^:]+", "{id}", segment)
+            elif previous == "values":
+                method = re.search(r":(append|clear)$", segment)
+                segment = "{range}" + (method.group(0) if method else "")
+            template.append(segment)
+        return "/" + "/".join(template)
+
+    template = []
+    for index, segment in enumerate(segments):
+        if _VERSION.match(segment):
+            continue
+        if _ID.match(segment):
+            following = segments[index + 1] if index + 1 < len(segments) else ""
+            segment = "{user_id}" if following in ACCOUNT_EDGES else "{id}"
+        template.append(segment)
+    endpoint = "/" + "/".join(template)
+    fields = parse_qs(parts.query).get("fields")
+    if fields:
+        endpoint += f"?fields={fields[0]}"
+    return endpoint
+
+
+def _body_size(body) -> int:
+    if body is None:
+        return 0
+    if isinstance(body, (bytes, str)):
+        return len(body)
+    return 0  # Streamed bodies (file objects) are not measured
+
+
+@contextmanager
+def retrying(active: bool = True):
+    """Marks the requests sent in this block as retries of a failed request."""
+    previous = getattr(_retrying, "active", False)
+    _retrying.active = active
+    try:
+        yield
+    finally:
+        _retrying.active = previous
+
+
+def _record(service: str, response: requests.Response, *args, **kwargs):
+    request = response.request
+    endpoint = f"{urlsplit(request.url).netloc} {endpoint_template(request.url)}"
+    labels = {"service": service, "endpoint": endpoint, "method": request.method}
+    seconds = response.elapsed.total_seconds()
+    request_duration.observe(seconds, status=str(response.status_code), **labels)
+    request_bytes.inc(_body_size(request.body), **labels)
+    # None of the pipeline's requests are streamed, so the body is read anyway
+    response_bytes.inc(len(response.content or b""), **labels)
+    if getattr(_retrying, "active", False):
+        retries_total.inc(**labels)
+    tracing.add_span(
+        f"{request.method} {endpoint}", seconds, service=service, status=response.status_code
+    )
+    with _lock:
+        _samples.setdefault((service, request.method, endpoint), []).append(seconds)
+
+
+def instrument_session(session: requests.Session, service: str) -> requests.Session:
+    """Records every response of the session under the given service name."""
+    session.hooks.setdefault("response", []).append(
+        lambda response, *args, **kwargs: _record(service, response)
+    )
+    return session
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    index = max(0, min(len(sorted_values) - 1, round(percent / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def log_endpoint_report():
+    """
+    Logs request count and p50/p95/p99 latency per endpoint for the requests since the
+    last report, slowest endpoints (by total time) first.
+    """
+    with _lock:
+        samples = dict(_samples)
+        _samples.clear()
+    if not samples:
+        return
+    rows = sorted(samples.items(), key=lambda item: sum(item[1]), reverse=True)
+    lines = [f"{'calls':>6} {'total s':>8} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7}  endpoint"]
+    for (service, method, endpoint), values in rows:
+        values = sorted(values)
+        lines.append(
+            f"{len(values):>6} {sum(values):>8.2f} {_percentile(values, 50):>7.3f} "
+            f"{_percentile(values, 95):>7.3f} {_percentile(values, 99):>7.3f}  "
+            f"[{service}] {method} {endpoint}"
+        )
+    log.info("HTTP latency per endpoint:\n" + "\n".join(lines))
@@ -25,3 +25,41 @@ class IDestination(ABC):
     @abstractmethod
     def post(self, content: Dict) -> bool:
         pass
+
+    def stage(self, content: Dict) -> bool:
+        """Prepares content ahead of its scheduled time. Optional for destinations."""
+        return True
+
+
+class ICoordinationStore(ABC):
+    """
+    Interface for the shared state that lets several nodes split the worksheets:
+    a registry of live nodes and compare-and-set claims with an expiry.
+    """
+
+    @abstractmethod
+    def heartbeat(self, node_id: str, ttl_seconds: float):
+        """Registers the node, or keeps it registered, for another `ttl_seconds`."""
+        pass
+
+    @abstractmethod
+    def remove_node(self, node_id: str):
+        pass
+
+    @abstractmethod
+    def live_nodes(self) -> List[str]:
+        """Returns the IDs of all nodes whose registration has not expired."""
+        pass
+
+    @abstractmethod
+    def claim(self, key: str, owner: str, ttl_seconds: float) -> bool:
+        """
+        Atomically claims `key` for `owner` if it is unclaimed, expired or already held
+        by `owner` (which renews it). Returns False if another owner holds it.
+        """
+        pass
+
+    @abstractmethod
+    def release(self, key: str, owner: str) -> bool:
+        """Releases `key` only if it is still held by `owner`."""
+        pass
@@ -0,0 +1,90 @@
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from logger_setup import log
+from config import settings
+
+
+class LeaseKeeper:
+    """
+    Keeps the "Publishing" lease of a worksheet's locked rows alive while they are being
+    published. The lease is renewed in the sheet, and the rows' claims in the coordination
+    store, once half of it is used up: between posts, and from a background thread while
+    a single slow post (a long video encode, upload or status poll) is in progress, so its
+    row is not reclaimed as expired while it is still being published. Rows that another
+    node claimed in the meantime are left to that node.
+    """
+
+    def __init__(self, source, coordinator, posts: List[Dict], lease_expiry: datetime):
+        self.source = source
+        self.coordinator = coordinator
+        self.lease_duration = timedelta(minutes=settings.PUBLISH_LEASE_MINUTES)
+        self.lease_expiry = lease_expiry
+        self._queued: List[Dict] = list(posts)
+        self._active: List[Dict] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "LeaseKeeper":
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="lease-keeper", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(settings.WORKER_HEARTBEAT_SECONDS):
+            try:
+                self.renew_if_due()
+            except Exception as e:
+                log.warning(f"Could not renew the publishing lease: {e}")
+
+    def next_post(self) -> Optional[Dict]:
+        """Returns the next row to publish, or None when no row is left."""
+        self.renew_if_due()
+        with self._lock:
+            if not self._queued:
+                return None
+            item = self._queued.pop(0)
+            self._active.append(item)
+            return item
+
+    def release(self, item: Dict):
+        """
+        Stops renewing a row's lease. Called before the row's final status is written,
+        so a renewal running at the same time cannot overwrite that status.
+        """
+        with self._lock:
+            self._active = [active for active in self._active if active is not item]
+            self._queued = [queued for queued in self._queued if queued is not item]
+
+    def renew_if_due(self):
+        with self._lock:
+            if datetime.now() <= self.lease_expiry - self.lease_duration / 2:
+                return
+            posts = self._active + self._queued
+            if not posts:
+                return
+            claimed = self.coordinator.claim_rows(
+                self.source.sheet_name, self.source.worksheet_name, posts
+            )
+            claimed_ids = {id(item) for item in claimed}
+            for item in self._active:
+                if id(item) not in claimed_ids:
+                    log.error(
+                        f"Row {item.get('row_number')} was claimed by another node while "
+                        "it was being published."
+                    )
+            self._queued = [item for item in self._queued if id(item) in claimed_ids]
+            if not claimed:
+                return
+            self.lease_expiry = datetime.now() + self.lease_duration
+            self.source.update_status_batch(
+                [item.get("row_number") for item in claimed],
+                settings.STATUS_OPTIONS["publishing"],
+                self.lease_expiry,
+            )
@@ -1,11 +1,165 @@
+import atexit
+import copy
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, List, Optional
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import sys
 import os
+from config import settings
+
+# Fields added to every record logged inside `log_context(...)`
+CONTEXT_FIELDS = ["sheet", "worksheet", "row", "platform"]
+_log_context: ContextVar[dict] = ContextVar("log_context", default={})
+
+
+@contextmanager
+def log_context(**fields):
+    """Tags every message logged in this block (and in nested calls) with the fields."""
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Copies the current log context onto the record, in the thread that logged it."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _log_context.get()
+        for field in CONTEXT_FIELDS:
+            setattr(record, field, context.get(field))
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Rate-limits repetitive messages such as container status polls. A message logged
+    with extra={"sample_key": ...} is let through at most once per interval per key;
+    the next one that passes reports how many were suppressed in between.
+
+    A key that let nothing through for EXPIRY_INTERVALS intervals (e.g. the container
+    finished processing) is forgotten. If messages were suppressed since its last one,
+    the last of them is handed to `report_expired` with their count, so it is not lost.
+    """
+
+    EXPIRY_INTERVALS = 3
+
+    def __init__(
+        self,
+        interval_seconds: float,
+        report_expired: Optional[Callable[[logging.LogRecord], None]] = None,
+    ):
+        super().__init__()
+        self.interval_seconds = interval_seconds
+        self.report_expired = report_expired
+        self._lock = threading.Lock()
+        self._last_emitted = {}
+        self._suppressed = {}  # key -> (count, last suppressed record)
+        self._next_sweep = float("-inf")
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        now = time.monotonic()
+        expired = self._expire_keys(now)
+        if expired and self.report_expired:
+            for summary in expired:
+                self.report_expired(summary)
+
+        key = getattr(record, "sample_key", None)
+        if key is None or record.levelno >= logging.WARNING:
+            return True
+        with self._lock:
+            if now - self._last_emitted.get(key, float("-inf")) < self.interval_seconds:
+                count, _ = self._suppressed.get(key, (0, None))
+                self._suppressed[key] = (count + 1, record)
+                return False
+            self._last_emitted[key] = now
+            suppressed, _ = self._suppressed.pop(key, (0, None))
+        if suppressed:
+            record.msg = f"{record.getMessage()} ({suppressed} similar message(s) suppressed)"
+            record.args = None
+        return True
+
+    def _expire_keys(self, now: float) -> List[logging.LogRecord]:
+        """Forgets idle keys (at most once per interval) and returns their summaries."""
+        summaries = []
+        with self._lock:
+            if now < self._next_sweep:
+                return summaries
+            self._next_sweep = now + self.interval_seconds
+            expire_before = now - self.EXPIRY_INTERVALS * self.interval_seconds
+            for key, last_emitted in list(self._last_emitted.items()):
+                if last_emitted >= expire_before:
+                    continue
+                del self._last_emitted[key]
+                suppressed, last_record = self._suppressed.pop(key, (0, None))
+                if suppressed:
+                    summary = copy.copy(last_record)
+                    summary.msg = (
+                        f"{last_record.getMessage()} (last of {suppressed} similar "
+                        "message(s) suppressed)"
+                    )
+                    summary.args = None
+                    summaries.append(summary)
+        return summaries
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats each record as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """The classic format, with the log context appended when there is one."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s - %(levelname)s - %(message)s")
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        message = super().formatMessage(record)
+        context = [
+            f"{field}={getattr(record, field)}"
+            for field in CONTEXT_FIELDS
+            if getattr(record, field, None) is not None
+        ]
+        return f"{message} [{' '.join(context)}]" if context else message
+
+
+class _ContextQueueHandler(QueueHandler):
+    """Queues records with their message merged, but keeps the exception for the formatters."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
 
 
 def setup_logger():
-    """Configures a rotating log file for the application."""
+    """
+    Configures a rotating log file for the application.
+    Records are handed to a queue and written by a background thread, so logging never
+    blocks the caller on file I/O or rotation.
+    """
     # Define the log file and rotation settings
     project_root = os.path.dirname(os.path.abspath(__file__))
     log_file = os.path.join(project_root, "app.log")
@@ -20,6 +174,10 @@ def setup_logger():
     # Prevent logs from propagating to the root logger
     logger.propagate = False
 
+    # Add handlers to the logger if they aren't already added
+    if logger.handlers:
+        return logger
+
     # Create a rotating file handler
     handler = RotatingFileHandler(
         log_file,
@@ -29,17 +187,32 @@ def setup_logger():
     )
 
     # Create a formatter and set it for the handler
-    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+    if settings.LOG_FORMAT.lower() == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = TextFormatter()
     handler.setFormatter(formatter)
 
     # Also log to console for immediate feedback
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
 
-    # Add handlers to the logger if they aren't already added
-    if not logger.handlers:
-        logger.addHandler(handler)
-        logger.addHandler(console_handler)
+    # The filters run in the thread that logs: the context is read there, and
+    # sampled-out records never reach the queue
+    queue_handler = _ContextQueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(ContextFilter())
+    # Summaries of expired sample keys skip the filters: their context is already set
+    queue_handler.addFilter(
+        SamplingFilter(settings.LOG_SAMPLE_INTERVAL_SECONDS, queue_handler.emit)
+    )
+    logger.addHandler(queue_handler)
+
+    listener = QueueListener(
+        queue_handler.queue, handler, console_handler, respect_handler_level=True
+    )
+    listener.start()
+    # Write out whatever is still queued when the process exits
+    atexit.register(listener.stop)
 
     return logger
 
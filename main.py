@@ -1,176 +1,564 @@
-import os
-import sys
-from datetime import datetime
+import argparse
+import time
+from typing import Optional
+from datetime import datetime, timedelta
+from dateutil import parser
 from sources.google_sheets import GoogleSheetsSource
-from processors.time_validator import TimeValidator
+from processors.time_validator import TimeValidator, get_scheduled_datetime
+from processors.media_stager import MediaStager
 from destinations.threads import ThreadsDestination
 from destinations.instagram import InstagramDestination
 from config import settings
-from logger_setup import log
+from logger_setup import log, log_context
 from helpers import get_worksheet_names, get_sheet_names
+from rate_limiter import RateLimitDeferred
+import metrics
+import http_instrumentation
+import tracing
+import publish_lag
+import publish_journal
+import profiling
+from worker_lock import WorksheetLock
+from lease_keeper import LeaseKeeper
+from coordination.coordinator import Coordinator, create_store
 
-LOCK_FILE = "pipeline.lock"
 
-
-def run_pipeline():
+def run_pipeline(coordinator: Optional[Coordinator] = None):
     """
-    Executes the full pipeline with script and application-level locking
-    to prevent race conditions and duplicate posts.
+    Executes the full pipeline. Each worksheet is locked for this worker, so several
+    processes can run at once and split the worksheets between them. Without a
+    `coordinator` (a one-shot run), the node joins for this run only.
     """
     log.info("\n--- Starting Content Pipeline Run ---")
-    sheet_names = get_sheet_names()
-    for sheet_name in sheet_names:
-        worksheet_names = get_worksheet_names(sheet_name)
-        for worksheet_name in worksheet_names:
-            # Fetch all posts that are pending
-            source = GoogleSheetsSource(
-                sheet_name=sheet_name, worksheet_name=worksheet_name
+    one_shot = coordinator is None
+    if one_shot:
+        coordinator = Coordinator(create_store())
+        coordinator.join()
+    try:
+        with metrics.timed("run"):
+            upcoming_by_worksheet = []
+            sheet_names = get_sheet_names()
+            for sheet_name in sheet_names:
+                worksheet_names = get_worksheet_names(sheet_name)
+                for worksheet_name in worksheet_names:
+                    upcoming_posts = run_worksheet(sheet_name, worksheet_name, coordinator)
+                    if upcoming_posts:
+                        upcoming_by_worksheet.append(
+                            (sheet_name, worksheet_name, upcoming_posts)
+                        )
+            # Staging waits until every worksheet has published its due posts
+            for sheet_name, worksheet_name, upcoming_posts in upcoming_by_worksheet:
+                stage_worksheet(sheet_name, worksheet_name, upcoming_posts, coordinator)
+    finally:
+        if one_shot:
+            # Stay registered until the next scheduled run, so the other nodes keep
+            # leaving this node's worksheets to it in between
+            coordinator.leave(
+                settings.MAIN_SCRIPT_RUN_FREQUENCY_MINUTES * 60 + settings.NODE_TTL_SECONDS
             )
-            all_data = source.get_data()
-
-            # Filter for VALID posts (your new filter)
-            valid_posts = [
-                post
-                for post in all_data
-                if post.get(settings.DATE_COLUMN_NAME)
-                and post.get(settings.TIME_COLUMN_NAME)
-                and post.get(settings.TEXT_COLUMN_NAME)
-                and (
-                    str(post.get(settings.POST_ON_INSTAGRAM_COLUMN_NAME, ""))
-                    .strip()
-                    .upper()
-                    == "TRUE"
-                    or str(post.get(settings.POST_ON_THREADS_COLUMN_NAME, ""))
-                    .strip()
-                    .upper()
-                    == "TRUE"
+        metrics.write_textfile()
+        http_instrumentation.log_endpoint_report()
+        tracing.export()
+    log.info("--- Pipeline Finished ---")
+
+
+def run_worksheet(sheet_name: str, worksheet_name: str, coordinator: Coordinator) -> list:
+    """
+    Processes a worksheet unless another node or local worker handles it, and returns
+    its posts to stage.
+    """
+    # Worksheets are split between nodes first, then between local processes
+    if not coordinator.owns(sheet_name, worksheet_name):
+        return []
+    with WorksheetLock(sheet_name, worksheet_name) as acquired:
+        if not acquired:
+            return []
+        with log_context(sheet=sheet_name, worksheet=worksheet_name), tracing.span(
+            "worksheet", sheet=sheet_name, worksheet=worksheet_name
+        ):
+            return process_worksheet(sheet_name, worksheet_name, coordinator)
+
+
+def process_worksheet(
+    sheet_name: str, worksheet_name: str, coordinator: Coordinator
+) -> list:
+    """Publishes the due rows of one worksheet and returns the upcoming ones to stage."""
+    # Fetch all posts that are pending
+    source = GoogleSheetsSource(sheet_name=sheet_name, worksheet_name=worksheet_name)
+    all_data = source.get_data()
+
+    with metrics.timed("filter"):
+        valid_posts = filter_valid_posts(all_data)
+        pending_posts = filter_pending_posts(valid_posts)
+
+    log.info(f"Found {len(valid_posts)} valid row(s) with all required data.")
+
+    if not valid_posts:
+        log.info("No valid posts found. Nothing to do.")
+        return []
+
+    # Rows left "Publishing" by a worker that died are retried once their lease expires
+    expired_posts = find_expired_leases(source, valid_posts)
+
+    if not pending_posts and not expired_posts:
+        log.info("No pending posts found. Nothing to do.")
+        return []
+
+    # Initialize destinations
+    threads_dest = ThreadsDestination(
+        sheet_name=sheet_name, worksheet_name=worksheet_name
+    )
+    instagram_dest = InstagramDestination(
+        sheet_name=sheet_name, worksheet_name=worksheet_name
+    )
+
+    # From PENDING posts, filter for those whose time is DUE
+    time_validator = TimeValidator()
+    posts_to_publish = time_validator.process(pending_posts)
+    posts_to_publish.extend(
+        reclaim_expired_leases(expired_posts, threads_dest, instagram_dest)
+    )
+
+    if not posts_to_publish:
+        log.info("No posts are due to be published at this time.")
+    else:
+        publish_posts(
+            source, posts_to_publish, threads_dest, instagram_dest, coordinator
+        )
+
+    # Posts that become due soon are prepared once all worksheets have published
+    return find_upcoming_posts(pending_posts, posts_to_publish)
+
+
+def is_marked(item: dict, column_name: str) -> bool:
+    """Checks whether a checkbox column of a row is ticked."""
+    return str(item.get(column_name, "")).strip().upper() == "TRUE"
+
+
+def filter_valid_posts(all_data: list) -> list:
+    """Returns the rows with a date, a time, a text and at least one platform ticked."""
+    return [
+        post
+        for post in all_data
+        if post.get(settings.DATE_COLUMN_NAME)
+        and post.get(settings.TIME_COLUMN_NAME)
+        and post.get(settings.TEXT_COLUMN_NAME)
+        and (
+            is_marked(post, settings.POST_ON_INSTAGRAM_COLUMN_NAME)
+            or is_marked(post, settings.POST_ON_THREADS_COLUMN_NAME)
+        )
+    ]
+
+
+def filter_pending_posts(valid_posts: list) -> list:
+    """Returns the rows whose status is pending (or empty)."""
+    pending_status = settings.STATUS_OPTIONS.get("pending", "Pending")
+    return [
+        post
+        for post in valid_posts
+        if post.get(settings.STATUS_COLUMN_NAME, "").strip() in [pending_status, ""]
+    ]
+
+
+def find_expired_leases(source: GoogleSheetsSource, valid_posts: list) -> list:
+    """
+    Returns rows locked as "Publishing" whose lease has expired, i.e. the worker that
+    locked them died. Without a lease column in the sheet such rows cannot be recovered.
+    """
+    publishing_status = settings.STATUS_OPTIONS["publishing"]
+    locked_posts = [
+        post
+        for post in valid_posts
+        if str(post.get(settings.STATUS_COLUMN_NAME, "")).strip() == publishing_status
+    ]
+    if not locked_posts:
+        return []
+    if not source.has_lease_column():
+        log.warning(
+            f"{len(locked_posts)} row(s) are locked as '{publishing_status}' but the sheet "
+            f"has no '{settings.LEASE_COLUMN_NAME}' column, so they cannot be recovered."
+        )
+        return []
+
+    now = datetime.now()
+    expired_posts = []
+    for post in locked_posts:
+        lease_value = str(post.get(settings.LEASE_COLUMN_NAME, "")).strip()
+        try:
+            # Rows locked before leases existed have no lease and count as expired
+            lease_expiry = parser.parse(lease_value) if lease_value else None
+        except (ValueError, OverflowError):
+            lease_expiry = None
+        if lease_expiry is None or lease_expiry <= now:
+            expired_posts.append(post)
+
+    if expired_posts:
+        log.warning(
+            f"Reclaiming row(s) {[post.get('row_number') for post in expired_posts]} "
+            "whose publishing lease expired."
+        )
+    return expired_posts
+
+
+def reclaim_expired_leases(
+    expired_posts: list,
+    threads_dest: ThreadsDestination,
+    instagram_dest: InstagramDestination,
+) -> list:
+    """
+    Checks each platform for posts of rows with an expired lease that went live before the
+    worker died, so publishing them again only finishes what is missing.
+    """
+    for item in expired_posts:
+        if is_marked(item, settings.POST_ON_INSTAGRAM_COLUMN_NAME):
+            instagram_dest.recover(item)
+        if is_marked(item, settings.POST_ON_THREADS_COLUMN_NAME):
+            threads_dest.recover(item)
+    return expired_posts
+
+
+def has_rate_limit_budget(
+    item: dict, threads_dest: ThreadsDestination, instagram_dest: InstagramDestination
+) -> bool:
+    """Checks whether every platform a post goes to can take API calls right now."""
+    if (
+        is_marked(item, settings.POST_ON_INSTAGRAM_COLUMN_NAME)
+        and not instagram_dest.client.has_budget()
+    ):
+        return False
+    if (
+        is_marked(item, settings.POST_ON_THREADS_COLUMN_NAME)
+        and not threads_dest.client.has_budget()
+    ):
+        return False
+    return True
+
+
+def apply_publishing_quota(
+    posts_to_publish: list,
+    threads_dest: ThreadsDestination,
+    instagram_dest: InstagramDestination,
+) -> list:
+    """
+    Returns the posts that fit into each account's remaining publishing quota, in row order.
+    The other posts are left Pending, before any media work is done for them.
+    """
+    remaining = {}
+    for column_name, destination in [
+        (settings.POST_ON_INSTAGRAM_COLUMN_NAME, instagram_dest),
+        (settings.POST_ON_THREADS_COLUMN_NAME, threads_dest),
+    ]:
+        if any(is_marked(item, column_name) for item in posts_to_publish):
+            remaining[column_name] = destination.get_remaining_quota()
+
+    allowed_posts, skipped_rows = [], []
+    for item in posts_to_publish:
+        columns = [column for column in remaining if is_marked(item, column)]
+        if any(remaining[column] is not None and remaining[column] <= 0 for column in columns):
+            skipped_rows.append(item.get("row_number"))
+            continue
+        for column in columns:
+            if remaining[column] is not None:
+                remaining[column] -= 1
+        allowed_posts.append(item)
+
+    if skipped_rows:
+        log.warning(
+            f"Skipping row(s) {skipped_rows} for now: the publishing quota is used up."
+        )
+    return allowed_posts
+
+
+def publish_posts(
+    source: GoogleSheetsSource,
+    posts_to_publish: list,
+    threads_dest: ThreadsDestination,
+    instagram_dest: InstagramDestination,
+    coordinator: Coordinator,
+):
+    """Locks the due posts in the sheet, publishes them and records their final status."""
+    # Posts for accounts whose rate limit budget is exhausted stay Pending for a later run
+    deferred_rows = [
+        item.get("row_number")
+        for item in posts_to_publish
+        if not has_rate_limit_budget(item, threads_dest, instagram_dest)
+    ]
+    if deferred_rows:
+        log.warning(
+            f"Deferring row(s) {deferred_rows}: API rate limit budget is exhausted."
+        )
+        posts_to_publish = [
+            item
+            for item in posts_to_publish
+            if item.get("row_number") not in deferred_rows
+        ]
+        if not posts_to_publish:
+            return
+
+    posts_to_publish = apply_publishing_quota(
+        posts_to_publish, threads_dest, instagram_dest
+    )
+    if not posts_to_publish:
+        return
+
+    # Claim the rows across nodes before anything is written to the sheet. Claims are
+    # kept until they expire, so a node working from an older read cannot publish a
+    # row again right after it was finished; they are only released when a row goes
+    # back to Pending.
+    posts_to_publish = coordinator.claim_rows(
+        source.sheet_name, source.worksheet_name, posts_to_publish
+    )
+    if not posts_to_publish:
+        return
+
+    # Now, lock and process the final, correctly filtered list
+    log.info(f"Found {len(posts_to_publish)} post(s) to publish. Locking them now.")
+    row_numbers_to_lock = [item.get("row_number") for item in posts_to_publish]
+    locked_at = datetime.now()
+    lease_expiry = locked_at + timedelta(minutes=settings.PUBLISH_LEASE_MINUTES)
+    with metrics.timed("lock"):
+        source.update_status_batch(
+            row_numbers_to_lock, settings.STATUS_OPTIONS["publishing"], lease_expiry
+        )
+
+    # The lease is renewed while the rows are published, also in the middle of a slow post
+    with LeaseKeeper(source, coordinator, posts_to_publish, lease_expiry) as lease:
+        for item in iter(lease.next_post, None):
+            row_number = item.get("row_number")
+            # Each post gets a lane of its own in the trace
+            with tracing.span(
+                "post",
+                lane=f"{source.worksheet_name} row {row_number}",
+                sheet=source.sheet_name,
+                worksheet=source.worksheet_name,
+                row=row_number,
+            ):
+                publish_post(
+                    source, item, threads_dest, instagram_dest, coordinator, locked_at, lease
                 )
-            ]
 
-            log.info(f"Found {len(valid_posts)} valid row(s) with all required data.")
 
-            if not valid_posts:
-                log.info("No valid posts found. Nothing to do.")
-                continue
+def publish_post(
+    source: GoogleSheetsSource,
+    item: dict,
+    threads_dest: ThreadsDestination,
+    instagram_dest: InstagramDestination,
+    coordinator: Coordinator,
+    locked_at: datetime,
+    lease: Optional[LeaseKeeper] = None,
+):
+    """Publishes one locked post to its platforms and records its final status and lag."""
+    row_number = item.get("row_number")
+
+    def update_status(status: str, lag_minutes: Optional[float] = None) -> bool:
+        # Stop renewing the lease first, so a renewal cannot overwrite the final status
+        if lease:
+            lease.release(item)
+        return source.update_status(row_number, status, lag_minutes)
 
-            # From VALID posts, filter for those with a PENDING status
-            pending_status = settings.STATUS_OPTIONS.get("pending", "Pending")
-            pending_posts = [
-                post
-                for post in valid_posts
-                if post.get(settings.STATUS_COLUMN_NAME, "").strip()
-                in [pending_status, ""]
+    log.info(f"Processing locked post from row {row_number}...")
+    try:
+        post_to_threads = is_marked(item, settings.POST_ON_THREADS_COLUMN_NAME)
+        post_to_instagram = is_marked(item, settings.POST_ON_INSTAGRAM_COLUMN_NAME)
+
+        # Check if this post needs to be published anywhere at all.
+        if not post_to_threads and not post_to_instagram:
+            log.warning(
+                f"Row {row_number} is due but not marked for any platform. "
+                "Reverting status to Pending."
+            )
+            # Revert the lock since no action is being taken
+            update_status(settings.STATUS_OPTIONS["pending"])
+            coordinator.release_row(source.sheet_name, source.worksheet_name, item)
+            return
+
+        threads_success = None
+        instagram_success = None
+
+        if post_to_instagram:
+            with log_context(row=row_number, platform="instagram"):
+                with tracing.span("instagram"):
+                    instagram_success = instagram_dest.post(item)
+        if post_to_threads:
+            with log_context(row=row_number, platform="threads"):
+                with tracing.span("threads"):
+                    threads_success = threads_dest.post(item)
+
+        # Determine the final status
+        is_fully_published = True
+        if post_to_instagram and not instagram_success:
+            is_fully_published = False
+        if post_to_threads and not threads_success:
+            is_fully_published = False
+        record_post_results(
+            [
+                (instagram_dest, post_to_instagram, instagram_success),
+                (threads_dest, post_to_threads, threads_success),
             ]
+        )
 
-            if not pending_posts:
-                log.info("No pending posts found. Nothing to do.")
-                continue
+        lag_minutes = record_publish_lag(
+            source,
+            item,
+            locked_at,
+            [(instagram_dest, instagram_success), (threads_dest, threads_success)],
+        )
 
-            # From PENDING posts, filter for those whose time is DUE
-            time_validator = TimeValidator()
-            posts_to_publish = time_validator.process(pending_posts)
+        # Update the row with its final status
+        final_status = (
+            settings.STATUS_OPTIONS["published"]
+            if is_fully_published
+            else settings.STATUS_OPTIONS["failed"]
+        )
+        if update_status(final_status, lag_minutes) and is_fully_published:
+            # Done: a row set back to Pending later must be published again, not recovered
+            publish_journal.clear_row(source.sheet_name, source.worksheet_name, row_number)
+    except RateLimitDeferred as e:
+        # Safe to retry: the publish journal skips platforms that are already live
+        log.warning(f"Deferring row {row_number} to a later run: {e}")
+        update_status(settings.STATUS_OPTIONS["pending"])
+        coordinator.release_row(source.sheet_name, source.worksheet_name, item)
+    except Exception as e:
+        # If any unexpected error happens, log it and mark the post as failed
+        log.error(
+            f"A critical error occurred while processing row {row_number}: {e}",
+            exc_info=True,
+        )
+        update_status(settings.STATUS_OPTIONS["failed"])
 
-            if not posts_to_publish:
-                log.info("No posts are due to be published at this time.")
-                continue
 
-            # Now, lock and process the final, correctly filtered list
-            log.info(
-                f"Found {len(posts_to_publish)} post(s) to publish. Locking them now."
-            )
-            row_numbers_to_lock = [item.get("row_number") for item in posts_to_publish]
-            source.update_status_batch(
-                row_numbers_to_lock, settings.STATUS_OPTIONS["publishing"]
+def record_post_results(results: list):
+    """Counts each platform's outcome of a post in the metrics."""
+    for destination, requested, success in results:
+        if requested:
+            metrics.posts_total.inc(
+                platform=destination.client.platform,
+                account=destination.client.account,
+                result="published" if success else "failed",
             )
 
-            # Initialize destinations and process each "locked" post
-            threads_dest = ThreadsDestination(
-                sheet_name=sheet_name, worksheet_name=worksheet_name
-            )
-            instagram_dest = InstagramDestination(
-                sheet_name=sheet_name, worksheet_name=worksheet_name
+
+def record_publish_lag(
+    source: GoogleSheetsSource, item: dict, locked_at: datetime, results: list
+) -> Optional[float]:
+    """
+    Records the publish lag of each platform the post went live on.
+    Returns the largest lag in minutes, or None if there is nothing to record.
+    """
+    scheduled_at = get_scheduled_datetime(item)
+    if scheduled_at is None:
+        return None
+    lags = []
+    for destination, success in results:
+        published_at = destination.published_at(item) if success else None
+        if published_at is None:
+            continue
+        lags.append(
+            publish_lag.record(
+                source.sheet_name,
+                source.worksheet_name,
+                item.get("row_number"),
+                destination.client.platform,
+                destination.client.account,
+                scheduled_at,
+                locked_at,
+                published_at,
             )
+        )
+    return max(lags) / 60 if lags else None
 
-            for item in posts_to_publish:
-                row_number = item.get("row_number")
-                log.info(f"Processing locked post from row {row_number}...")
-                try:
-                    post_to_threads = (
-                        str(item.get(settings.POST_ON_THREADS_COLUMN_NAME, ""))
-                        .strip()
-                        .upper()
-                        == "TRUE"
-                    )
-                    post_to_instagram = (
-                        str(item.get(settings.POST_ON_INSTAGRAM_COLUMN_NAME, ""))
-                        .strip()
-                        .upper()
-                        == "TRUE"
-                    )
-
-                    # Check if this post needs to be published anywhere at all.
-                    if not post_to_threads and not post_to_instagram:
-                        log.warning(
-                            f"Row {row_number} is due but not marked for any platform. "
-                            "Reverting status to Pending."
-                        )
-                        # Revert the lock since no action is being taken
-                        source.update_status(
-                            row_number, settings.STATUS_OPTIONS["pending"]
-                        )
-                        continue  # Skip to the next post
-
-                    threads_success = None
-                    instagram_success = None
-
-                    if post_to_instagram:
-                        instagram_success = instagram_dest.post(item)
-                    if post_to_threads:
-                        threads_success = threads_dest.post(item)
-
-                    # Determine the final status
-                    is_fully_published = True
-                    if post_to_instagram and not instagram_success:
-                        is_fully_published = False
-                    if post_to_threads and not threads_success:
-                        is_fully_published = False
-
-                    # Update the row with its final status
-                    final_status = (
-                        settings.STATUS_OPTIONS["published"]
-                        if is_fully_published
-                        else settings.STATUS_OPTIONS["failed"]
-                    )
-                    source.update_status(row_number, final_status)
-                except Exception as e:
-                    # If any unexpected error happens, log it and mark the post as failed
-                    log.error(
-                        f"A critical error occurred while processing row {row_number}: {e}",
-                        exc_info=True,
-                    )
-                    source.update_status(row_number, settings.STATUS_OPTIONS["failed"])
-                    continue  # Move to the next post
-    log.info("--- Pipeline Finished ---")
 
+def find_upcoming_posts(pending_posts: list, posts_to_publish: list) -> list:
+    """Returns the pending posts that are not due yet but fall within the staging horizon."""
+    if settings.STAGING_HORIZON_MINUTES <= 0:
+        return []
 
-if __name__ == "__main__":
-    # SCRIPT-LEVEL LOCK: Prevents the script from running more than once at a time.
-    if os.path.exists(LOCK_FILE):
-        log.warning(
-            f"Lock file '{LOCK_FILE}' exists. Another instance may be running. Exiting."
-        )
-        sys.exit(1)
+    due_rows = {item.get("row_number") for item in posts_to_publish}
+    return [
+        item
+        for item in TimeValidator(
+            lookahead_minutes=settings.STAGING_HORIZON_MINUTES
+        ).process(pending_posts)
+        if item.get("row_number") not in due_rows
+    ]
 
-    try:
-        # Create the lock file to signal the script is running
-        with open(LOCK_FILE, "w") as f:
-            f.write(str(datetime.now()))
 
-        run_pipeline()
+def stage_worksheet(
+    sheet_name: str, worksheet_name: str, upcoming_posts: list, coordinator: Coordinator
+):
+    """
+    Stages a worksheet's upcoming posts, so only publishing is left for them when they
+    become due. The rows are claimed first, so no other node stages them as well.
+    """
+    if not coordinator.owns(sheet_name, worksheet_name):
+        return
+    with WorksheetLock(sheet_name, worksheet_name) as acquired:
+        if not acquired:
+            return
+        with log_context(sheet=sheet_name, worksheet=worksheet_name), tracing.span(
+            "staging", sheet=sheet_name, worksheet=worksheet_name
+        ):
+            upcoming_posts = coordinator.claim_rows(sheet_name, worksheet_name, upcoming_posts)
+            if not upcoming_posts:
+                return
+
+            log.info(
+                f"Staging {len(upcoming_posts)} post(s) due within the next "
+                f"{settings.STAGING_HORIZON_MINUTES} minute(s)."
+            )
+            stager = MediaStager(
+                {
+                    settings.POST_ON_INSTAGRAM_COLUMN_NAME: InstagramDestination(
+                        sheet_name=sheet_name, worksheet_name=worksheet_name
+                    ),
+                    settings.POST_ON_THREADS_COLUMN_NAME: ThreadsDestination(
+                        sheet_name=sheet_name, worksheet_name=worksheet_name
+                    ),
+                }
+            )
+            stager.process(upcoming_posts)
+
 
+def run_forever(profile_mode: Optional[str] = None):
+    """
+    Long-running mode: runs the pipeline every MAIN_SCRIPT_RUN_FREQUENCY_MINUTES and
+    serves the metrics of all runs on /metrics. With `profile_mode`, every run is
+    profiled into files of its own. The node stays registered for the life of the process.
+    """
+    metrics.start_http_server()
+    interval = settings.MAIN_SCRIPT_RUN_FREQUENCY_MINUTES * 60
+    coordinator = Coordinator(create_store())
+    coordinator.join()
+    try:
+        while True:
+            started = time.monotonic()
+            try:
+                with profiling.profile(profile_mode):
+                    run_pipeline(coordinator)
+            except Exception as e:
+                log.error(f"Pipeline run failed: {e}", exc_info=True)
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
     finally:
-        # CRITICAL: Always remove the lock file when the script is done,
-        # even if it crashes.
-        if os.path.exists(LOCK_FILE):
-            os.remove(LOCK_FILE)
-            log.info("Lock file removed.")
+        coordinator.leave()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Publishes due posts from the sheets.")
+    arg_parser.add_argument(
+        "--loop",
+        action="store_true",
+        help="Keep running and publish every MAIN_SCRIPT_RUN_FREQUENCY_MINUTES.",
+    )
+    arg_parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="cpu",
+        choices=profiling.MODES,
+        help="Profile each run: cpu (default) or mem. Files are written to PROFILE_DIR.",
+    )
+    args = arg_parser.parse_args()
+    if args.loop:
+        run_forever(args.profile)
+    else:
+        with profiling.profile(args.profile):
+            run_pipeline()
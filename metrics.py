@@ -0,0 +1,233 @@
+import functools
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from logger_setup import log
+from config import settings
+import tracing
+import profiling
+
+# In-process metrics in the Prometheus text format, without a client library.
+# Stage durations are inclusive: a stage that calls another stage (e.g. container
+# creation polling its container) also contains the inner stage's time.
+
+_lock = threading.Lock()
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric:
+    def __init__(self, name: str, help_text: str, kind: str, label_names: List[str]):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.label_names = label_names
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _format_labels(self, values: LabelValues, extra: str = "") -> str:
+        pairs = [
+            f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, values)
+        ]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter(_Metric):
+    def __init__(self, name: str, help_text: str, label_names: List[str]):
+        super().__init__(name, help_text, "counter", label_names)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.name}{self._format_labels(key)} {value}"
+            for key, value in self.values.items()
+        ]
+
+
+class Gauge(Counter):
+    def __init__(self, name: str, help_text: str, label_names: List[str]):
+        super().__init__(name, help_text, label_names)
+        self.kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with _lock:
+            self.values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    def __init__(
+        self, name: str, help_text: str, label_names: List[str], buckets: List[float]
+    ):
+        super().__init__(name, help_text, "histogram", label_names)
+        self.buckets = sorted(buckets)
+        self.values: Dict[LabelValues, Dict] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with _lock:
+            series = self.values.setdefault(
+                key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            )
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, series in self.values.items():
+            for bound, count in zip(self.buckets, series["counts"]):
+                labels = self._format_labels(key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = self._format_labels(key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {series['count']}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {series['sum']}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {series['count']}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+# --- Registry ---
+
+STAGE_LABELS = ["stage", "platform", "account"]
+DURATION_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600]
+
+stage_duration = Histogram(
+    "pipeline_stage_duration_seconds",
+    "Time spent in each pipeline stage.",
+    STAGE_LABELS,
+    DURATION_BUCKETS,
+)
+stage_calls = Counter(
+    "pipeline_stage_calls_total",
+    "Stage executions by outcome (ok, or error if the stage raised).",
+    STAGE_LABELS + ["outcome"],
+)
+posts_total = Counter(
+    "pipeline_posts_total",
+    "Posts processed per platform and account, by final result.",
+    ["platform", "account", "result"],
+)
+last_run_timestamp = Gauge(
+    "pipeline_last_run_timestamp_seconds",
+    "Unix time at which the last pipeline run finished.",
+    [],
+)
+
+_registry: List[_Metric] = [stage_duration, stage_calls, posts_total, last_run_timestamp]
+
+
+def register(metric: _Metric) -> _Metric:
+    """Adds a metric defined elsewhere to the exported output."""
+    _registry.append(metric)
+    return metric
+
+
+def render() -> str:
+    """Returns all metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        for metric in _registry:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Instrumentation helpers ---
+
+
+@contextmanager
+def timed(stage: str, platform: str = "", account: str = ""):
+    """Records how long the block takes as one execution of `stage`, and traces it."""
+    labels = {"stage": stage, "platform": platform, "account": account}
+    outcome = "error"
+    started = time.perf_counter()
+    try:
+        with tracing.span(stage, platform=platform, account=account):
+            yield
+        outcome = "ok"
+    finally:
+        stage_duration.observe(time.perf_counter() - started, **labels)
+        stage_calls.inc(outcome=outcome, **labels)
+        if profiling.memory_profiling:
+            profiling.stage_finished(stage)
+
+
+def timed_stage(stage: str):
+    """
+    Decorator form of `timed`. On destination methods, the platform and account are
+    taken from the destination's Graph client.
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            client = getattr(args[0], "client", None) if args else None
+            platform = getattr(client, "platform", "")
+            account = getattr(client, "account", "")
+            with timed(stage, platform, account):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# --- Export ---
+
+
+def write_textfile(path: Optional[str] = None):
+    """Writes the metrics atomically, e.g. for the node_exporter textfile collector."""
+    path = path or settings.METRICS_FILE
+    directory = os.path.dirname(os.path.abspath(path))
+    last_run_timestamp.set(time.time())
+    try:
+        with tempfile.NamedTemporaryFile(
+            "w", dir=directory, prefix=".metrics-", suffix=".tmp", delete=False
+        ) as f:
+            f.write(render())
+        os.replace(f.name, path)
+    except OSError as e:
+        log.error(f"Could not write metrics to {path}: {e}")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep scrapes out of app.log
+
+
+def start_http_server(port: Optional[int] = None) -> ThreadingHTTPServer:
+    """Serves /metrics on localhost from a background thread."""
+    port = port or settings.METRICS_PORT
+    server = ThreadingHTTPServer((settings.METRICS_HOST, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    log.info(f"Serving metrics on http://{settings.METRICS_HOST}:{port}/metrics")
+    return server
@@ -0,0 +1,70 @@
+import time
+from typing import Optional
+import requests
+from config import settings
+
+
+def get_polling_options(platform: str) -> dict:
+    """Returns the polling options of a platform, falling back to the "default" entry."""
+    return {
+        **settings.POLLING_OPTIONS.get("default", {}),
+        **settings.POLLING_OPTIONS.get(platform, {}),
+    }
+
+
+class PollingPolicy:
+    """
+    Decides how long to wait between container status checks.
+    Images start with a sub-second delay; videos start with a delay estimated from their
+    size and back off exponentially. A Retry-After header from the server takes precedence.
+    """
+
+    def __init__(self, platform: str, media_type: str = "IMAGE", size_bytes: int = 0):
+        self.options = get_polling_options(platform)
+        self.delay = self.estimate_first_delay(media_type, size_bytes)
+        self.deadline = time.monotonic() + float(self.options["timeout"])
+        self.checks_left = int(self.options["max_checks"])
+
+    def estimate_first_delay(self, media_type: str, size_bytes: int) -> float:
+        """Estimates how long Meta needs before the first status check is worthwhile."""
+        if media_type.upper() not in ["VIDEO", "REELS"]:
+            return float(self.options["image_initial_delay"])
+        size_mb = size_bytes / (1024 * 1024)
+        estimate = max(
+            float(self.options["video_initial_delay"]),
+            size_mb * float(self.options["video_seconds_per_mb"]),
+        )
+        return min(estimate, float(self.options["max_delay"]))
+
+    def _server_hint(self, response: Optional[requests.Response]) -> Optional[float]:
+        if response is None:
+            return None
+        retry_after = response.headers.get("Retry-After")
+        try:
+            return float(retry_after) if retry_after else None
+        except ValueError:
+            return None
+
+    def wait(self, response: Optional[requests.Response] = None) -> bool:
+        """
+        Sleeps before the next status check and backs off the delay.
+        Returns False once the timeout or the maximum number of checks is reached.
+        """
+        self.checks_left -= 1
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0 or self.checks_left <= 0:
+            return False
+        delay = self._server_hint(response) or self.delay
+        time.sleep(min(delay, remaining))
+        self.delay = min(
+            self.delay * float(self.options["backoff_factor"]),
+            float(self.options["max_delay"]),
+        )
+        return True
+
+
+def pause(platform: str, option_name: str):
+    """Sleeps for a fixed, configurable delay such as the pause before a first comment."""
+    delay = float(get_polling_options(platform).get(option_name, 0))
+    if delay > 0:
+        time.sleep(delay)
@@ -0,0 +1,211 @@
+import contextvars
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from PIL import ExifTags, Image, ImageOps, UnidentifiedImageError
+from logger_setup import log
+from metrics import timed_stage
+from config import settings
+from helpers import upload_to_github
+import staging
+
+# File extension used for each output format
+FORMAT_EXTENSIONS = {"JPEG": ".jpg", "WEBP": ".webp", "PNG": ".png"}
+
+# JPEG segments that carry metadata: APP1 (EXIF, GPS, XMP), APP13 (IPTC) and comments
+_JPEG_METADATA_MARKERS = {0xE1, 0xED, 0xFE}
+
+
+def _output_options(platform: str) -> dict:
+    image_format = settings.IMAGE_OUTPUT_FORMATS.get(platform, "JPEG").upper()
+    max_width, max_height = settings.IMAGE_MAX_SIZES.get(platform, [1440, 1800])
+    return {
+        "format": image_format,
+        "extension": FORMAT_EXTENSIONS.get(image_format, ".jpg"),
+        "max_size": (max_width, max_height),
+        "quality": settings.IMAGE_QUALITY,
+    }
+
+
+@timed_stage("image_optimize")
+def optimize_image(input_path: str, output_path: str, platform: str = "instagram") -> bool:
+    """
+    Re-encodes an image for a platform: applies the EXIF orientation, downsizes it to the
+    platform's maximum size and saves it without metadata at the configured quality.
+    """
+    options = _output_options(platform)
+    try:
+        with Image.open(input_path) as original:
+            image = ImageOps.exif_transpose(original)
+            image.thumbnail(options["max_size"], Image.Resampling.LANCZOS)
+
+            if options["format"] == "JPEG" and image.mode != "RGB":
+                # JPEG has no alpha channel, so flatten transparent images onto white
+                background = Image.new("RGB", image.size, (255, 255, 255))
+                if image.mode in ("RGBA", "LA", "P"):
+                    image = image.convert("RGBA")
+                    background.paste(image, mask=image.getchannel("A"))
+                else:
+                    background.paste(image.convert("RGB"))
+                image = background
+
+            # Only the colour profile is kept; EXIF, GPS, XMP etc. are dropped
+            save_kwargs = {"quality": options["quality"], "optimize": True}
+            if original.info.get("icc_profile"):
+                save_kwargs["icc_profile"] = original.info["icc_profile"]
+            if options["format"] == "JPEG":
+                save_kwargs["progressive"] = True
+            image.save(output_path, format=options["format"], **save_kwargs)
+    except (OSError, UnidentifiedImageError, ValueError) as e:
+        log.error(f"Failed to optimize image {input_path}: {e}")
+        return False
+
+    log.info(
+        f"Optimized '{input_path}' for {platform}: {os.path.getsize(input_path)} -> "
+        f"{os.path.getsize(output_path)} bytes."
+    )
+    return True
+
+
+def _strip_jpeg_metadata(data: bytes, orientation: int) -> bytes:
+    """Drops the metadata segments of a JPEG file and keeps everything else byte for byte."""
+    if data[:2] != b"\xff\xd8":
+        raise ValueError("not a JPEG file")
+    segments = []
+    position = 2
+    while position < len(data):
+        if data[position] != 0xFF:
+            raise ValueError(f"corrupt JPEG segment at byte {position}")
+        marker = data[position + 1]
+        if marker == 0xFF:  # Fill byte
+            position += 1
+            continue
+        if marker in (0xDA, 0xD9):  # The image data (or the end) follows
+            segments.append(data[position:])
+            break
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:  # Markers without a length
+            segments.append(data[position : position + 2])
+            position += 2
+            continue
+        end = position + 2 + int.from_bytes(data[position + 2 : position + 4], "big")
+        if marker not in _JPEG_METADATA_MARKERS:
+            segments.append(data[position:end])
+        position = end
+
+    if orientation != 1:
+        # Keep the rotation, so the image is not shown sideways
+        exif = Image.Exif()
+        exif[ExifTags.Base.Orientation] = orientation
+        payload = exif.tobytes()
+        app1 = b"\xff\xe1" + (len(payload) + 2).to_bytes(2, "big") + payload
+        # Right after the JFIF header, if there is one
+        index = 1 if segments and segments[0][:2] == b"\xff\xe0" else 0
+        segments.insert(index, app1)
+    return b"\xff\xd8" + b"".join(segments)
+
+
+def strip_metadata(input_path: str, output_path: str) -> bool:
+    """
+    Copies an image without its metadata (EXIF, GPS, XMP, IPTC, comments). JPEG image data
+    is copied unchanged and only the EXIF orientation is kept; other formats are rotated
+    upright and saved again losslessly.
+    """
+    try:
+        with Image.open(input_path) as original:
+            image_format = original.format
+            if image_format == "JPEG":
+                orientation = original.getexif().get(ExifTags.Base.Orientation, 1)
+                with open(input_path, "rb") as f:
+                    data = _strip_jpeg_metadata(f.read(), orientation)
+                with open(output_path, "wb") as f:
+                    f.write(data)
+                return True
+
+            image = ImageOps.exif_transpose(original)
+            save_kwargs = {"lossless": True} if image_format == "WEBP" else {}
+            if original.info.get("icc_profile"):
+                save_kwargs["icc_profile"] = original.info["icc_profile"]
+            image.save(output_path, format=image_format, **save_kwargs)
+            return True
+    except (OSError, UnidentifiedImageError, ValueError) as e:
+        log.error(f"Failed to strip the metadata of image {input_path}: {e}")
+        return False
+
+
+def _upload_without_metadata(local_path: str) -> Optional[str]:
+    """Uploads a copy of an original image with its metadata removed."""
+    extension = os.path.splitext(local_path)[1]
+    temp_file = tempfile.NamedTemporaryFile(suffix=extension, delete=False)
+    temp_file.close()
+    try:
+        if not strip_metadata(local_path, temp_file.name):
+            return None
+        return upload_to_github(temp_file.name)
+    finally:
+        os.remove(temp_file.name)
+
+
+def process_and_upload_image(local_path: str, platform: str = "instagram") -> Optional[str]:
+    """
+    Optimizes a local image for a platform, uploads it to GitHub and returns the public URL.
+    The uploads are public, so only re-encoded copies without metadata (EXIF, GPS, camera)
+    are uploaded, never the original file.
+    """
+    if not os.path.exists(local_path):
+        log.error(f"Local file not found at path: {local_path}")
+        return None
+    if not settings.IMAGE_OPTIMIZATION_ENABLED:
+        return _upload_without_metadata(local_path)
+
+    options = _output_options(platform)
+    max_width, max_height = options["max_size"]
+    media_key = (
+        f"optimized:{platform}:{staging.file_digest(local_path)}:{options['format']}:"
+        f"{options['quality']}:{max_width}x{max_height}"
+    )
+    cached_url = staging.get_hosted_url(media_key)
+    if cached_url:
+        log.info(f"Reusing optimized copy of {local_path}: {cached_url}")
+        return cached_url
+
+    temp_file = tempfile.NamedTemporaryFile(suffix=options["extension"], delete=False)
+    temp_file.close()  # Close the file so Pillow can write to it
+    try:
+        if not optimize_image(local_path, temp_file.name, platform):
+            return None
+        public_url = upload_to_github(temp_file.name)
+    finally:
+        os.remove(temp_file.name)
+
+    if public_url:
+        staging.remember_hosted_url(media_key, public_url)
+    return public_url
+
+
+def process_and_upload_images(
+    local_paths: List[str], platform: str = "instagram"
+) -> Optional[List[str]]:
+    """
+    Optimizes and uploads several local images in a worker pool.
+    Returns the public URLs in the original order, or None if any image failed.
+    """
+    if not local_paths:
+        return []
+    workers = max(1, min(settings.IMAGE_WORKERS, len(local_paths)))
+    # Each task runs in a copy of the caller's context, so its log context and trace
+    # spans stay attached to the post
+    contexts = [contextvars.copy_context() for _ in local_paths]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        public_urls = list(
+            executor.map(
+                lambda context, path: context.run(
+                    process_and_upload_image, path, platform
+                ),
+                contexts,
+                local_paths,
+            )
+        )
+    if not all(public_urls):
+        return None
+    return public_urls
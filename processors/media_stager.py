@@ -0,0 +1,41 @@
+from typing import Dict, List
+from interfaces import IProcessor, IDestination
+from config import settings
+from logger_setup import log, log_context
+
+
+class MediaStager(IProcessor):
+    """
+    Prepares upcoming posts ahead of their scheduled time (media conversion, hosting and
+    optionally container creation), so only the publish call is left when they become due.
+    Returns the posts that were staged successfully.
+    """
+
+    def __init__(self, destinations: Dict[str, IDestination]):
+        # Maps the "Post on <platform>" column name to the destination that stages it
+        self.destinations = destinations
+
+    def process(self, data: List[Dict]) -> List[Dict]:
+        staged_posts = []
+        for item in data:
+            row_number = item.get("row_number")
+            staged = True
+            for column_name, destination in self.destinations.items():
+                if str(item.get(column_name, "")).strip().upper() != "TRUE":
+                    continue
+                try:
+                    with log_context(row=row_number):
+                        if not destination.stage(item):
+                            staged = False
+                except Exception as e:
+                    # Staging is best-effort: the post is simply prepared at its due time instead
+                    log.error(f"Staging failed for row {row_number}: {e}", exc_info=True)
+                    staged = False
+            if staged:
+                log.info(f"Row {row_number} is staged and ready for publishing.")
+                staged_posts.append(item)
+            else:
+                log.warning(
+                    f"Row {row_number} could not be fully staged. It will be prepared when due."
+                )
+        return staged_posts
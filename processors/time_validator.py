@@ -1,4 +1,5 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Optional
 from dateutil import parser
 import logging
 
@@ -8,12 +9,43 @@ from config import settings
 log = logging.getLogger(__name__)
 
 
+def get_scheduled_datetime(item: dict) -> Optional[datetime]:
+    """
+    Parses the scheduled date/time of a row.
+    Returns None if the field is empty or cannot be parsed.
+    """
+    datetime_str = str(item.get(settings.TIME_COLUMN_NAME, "")).strip()
+    if not datetime_str:
+        return None
+    try:
+        return parser.parse(datetime_str, fuzzy=True, dayfirst=True)
+    except (ValueError, TypeError, OverflowError):
+        return None
+
+
+def seconds_until_due(item: dict, now: Optional[datetime] = None) -> Optional[float]:
+    """
+    Returns how many seconds are left until a row is due (negative when overdue),
+    or None if the row has no parseable schedule.
+    """
+    scheduled_dt = get_scheduled_datetime(item)
+    if scheduled_dt is None:
+        return None
+    return (scheduled_dt - (now or datetime.now())).total_seconds()
+
+
 class TimeValidator(IProcessor):
-    """From a list of posts, returns only those whose scheduled date/time has passed."""
+    """
+    From a list of posts, returns only those whose scheduled date/time has passed.
+    With `lookahead_minutes`, posts due within that many minutes are returned as well.
+    """
+
+    def __init__(self, lookahead_minutes: int = 0):
+        self.lookahead = timedelta(minutes=lookahead_minutes)
 
     def process(self, data: list) -> list:
         log.info("Validating scheduled times...")
-        now = datetime.now()
+        now = datetime.now() + self.lookahead
         posts_due = []
 
         for item in data:
@@ -31,18 +63,16 @@ class TimeValidator(IProcessor):
                     posts_due.append(item)
                     continue
 
-            try:
-                # Parse flexibly any localized date/time string
-                scheduled_dt = parser.parse(datetime_str, fuzzy=True, dayfirst=True)
-
-                # Only add if scheduled time has passed
-                if now >= scheduled_dt:
-                    posts_due.append(item)
-
-            except (ValueError, TypeError) as e:
+            # Parse flexibly any localized date/time string
+            scheduled_dt = get_scheduled_datetime(item)
+            if scheduled_dt is None:
                 log.warning(
-                    f"Skipping item due to invalid or unrecognized date/time format '{datetime_str}': {e}"
+                    f"Skipping item due to invalid or unrecognized date/time format '{datetime_str}'"
                 )
                 continue
 
+            # Only add if scheduled time has passed
+            if now >= scheduled_dt:
+                posts_due.append(item)
+
         return posts_due
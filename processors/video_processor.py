@@ -2,16 +2,20 @@ import json
 import os
 import subprocess
 import tempfile
+import time
 from logger_setup import log
-from typing import Optional
+from metrics import timed_stage
+from config import settings
 from helpers import upload_to_github
-from typing import Optional, Tuple
+import staging
+from typing import Dict, Optional, Tuple
 
 # ==============================================================================
 #  STEP 1: HELPER FUNCTIONS (The code you already have)
 # ==============================================================================
 
 
+@timed_stage("probe")
 def get_video_properties(video_path: str) -> dict:
     """
     Returns a dictionary with video properties like width and height.
@@ -45,19 +49,51 @@ def get_video_properties(video_path: str) -> dict:
         return {}
 
 
-def convert_video_for_instagram(input_path: str, output_path: str) -> bool:
+def select_encoding_profile(
+    time_budget_seconds: Optional[float] = None,
+) -> Tuple[str, dict]:
+    """
+    Picks an ffmpeg encoding profile from the time left before the post is due.
+    Due or overdue posts get the fastest preset; posts with plenty of lead time
+    get a slower preset that produces smaller files. Unknown budgets use "balanced".
+    """
+    profiles = settings.VIDEO_ENCODING_PROFILES
+    if time_budget_seconds is None:
+        name = "balanced"
+    elif time_budget_seconds < settings.VIDEO_ENCODING_BALANCED_LEAD_MINUTES * 60:
+        name = "fast"
+    elif time_budget_seconds >= settings.VIDEO_ENCODING_COMPACT_LEAD_MINUTES * 60:
+        name = "compact"
+    else:
+        name = "balanced"
+    return name, profiles.get(name, {})
+
+
+@timed_stage("ffmpeg")
+def convert_video_for_instagram(
+    input_path: str, output_path: str, time_budget_seconds: Optional[float] = None
+) -> bool:
     """
     Converts a video to be compliant with Instagram's feed post specifications (4:5 aspect ratio).
+    The encoding profile is chosen from the remaining time budget of the post.
     """
+    profile_name, profile = select_encoding_profile(time_budget_seconds)
     log.info(
-        f"Converting '{input_path}' to Instagram-compliant format at '{output_path}'..."
+        f"Converting '{input_path}' to Instagram-compliant format at '{output_path}' "
+        f"using encoding profile '{profile_name}' {profile}..."
     )
+    encoder_options = []
+    if profile.get("preset"):
+        encoder_options.extend(["-preset", str(profile["preset"])])
+    if profile.get("crf"):
+        encoder_options.extend(["-crf", str(profile["crf"])])
     command = [
         "ffmpeg",
         "-i",
         input_path,
         "-c:v",
         "libx264",
+        *encoder_options,
         "-c:a",
         "aac",
         "-pix_fmt",
@@ -69,12 +105,20 @@ def convert_video_for_instagram(input_path: str, output_path: str) -> bool:
         "-y",
         output_path,
     ]
+    started_at = time.monotonic()
     try:
         subprocess.run(command, check=True, capture_output=True, text=True)
-        log.info("Successfully converted video.")
+        elapsed = time.monotonic() - started_at
+        log.info(
+            f"Successfully converted video with profile '{profile_name}' in {elapsed:.2f}s."
+        )
         return True
     except subprocess.CalledProcessError as e:
-        log.error(f"FFmpeg conversion failed. FFmpeg stderr: {e.stderr}")
+        elapsed = time.monotonic() - started_at
+        log.error(
+            f"FFmpeg conversion with profile '{profile_name}' failed after {elapsed:.2f}s. "
+            f"FFmpeg stderr: {e.stderr}"
+        )
         return False
 
 
@@ -84,11 +128,14 @@ def convert_video_for_instagram(input_path: str, output_path: str) -> bool:
 
 
 def process_and_upload_video(
-    local_path: str, platform: str = "instagram"
+    local_path: str,
+    platform: str = "instagram",
+    time_budget_seconds: Optional[float] = None,
 ) -> Optional[str]:
     """
     Validates a local video, converts it if necessary, uploads it to GitHub,
     and returns the public URL. Handles temporary file cleanup.
+    `time_budget_seconds` is the time left until the post is due and drives the encoding profile.
     """
     if not os.path.exists(local_path):
         log.error(f"Input video file not found: {local_path}")
@@ -114,12 +161,21 @@ def process_and_upload_video(
 
     # --- 3. Convert (if needed) and upload ---
     if needs_conversion:
+        # A converted copy of this exact file may already be hosted (e.g. staged ahead of time)
+        media_key = f"converted:{platform}:{staging.file_digest(local_path)}"
+        cached_url = staging.get_hosted_url(media_key)
+        if cached_url:
+            log.info(f"Reusing converted copy of {local_path}: {cached_url}")
+            return cached_url
+
         # Create a temporary file that will be automatically deleted when we're done
         with tempfile.NamedTemporaryFile(suffix=".mp4", delete=True) as temp_file:
             temp_output_path = temp_file.name
 
             # Convert the original video into the temporary file
-            if not convert_video_for_instagram(local_path, temp_output_path):
+            if not convert_video_for_instagram(
+                local_path, temp_output_path, time_budget_seconds
+            ):
                 log.error(f"Failed to convert video {local_path}.")
                 return None
 
@@ -127,22 +183,53 @@ def process_and_upload_video(
             log.info(
                 f"Uploading converted video from temporary path: {temp_output_path}"
             )
-            return upload_to_github(temp_output_path)
+            public_url = upload_to_github(temp_output_path)
+            if public_url:
+                staging.remember_hosted_url(media_key, public_url)
+            return public_url
     else:
         # The original video is already compliant
         log.info(f"Video {local_path} is already compliant. Uploading original.")
         return upload_to_github(local_path)
 
 
+def _converted_videos(digest: str) -> Dict[str, str]:
+    """Returns the finished conversions of a source file, by encoding profile."""
+    converted = {}
+    for profile_name in settings.VIDEO_ENCODING_PROFILES:
+        path = os.path.join(settings.CONVERTED_VIDEO_DIR, f"{digest}-{profile_name}.mp4")
+        if os.path.exists(path):
+            converted[profile_name] = path
+    return converted
+
+
+def _remove_expired_conversions():
+    """Deletes converted videos whose upload can no longer be resumed."""
+    if not os.path.isdir(settings.CONVERTED_VIDEO_DIR):
+        return
+    cutoff = time.time() - settings.STAGING_CONTAINER_TTL_HOURS * 3600
+    for name in os.listdir(settings.CONVERTED_VIDEO_DIR):
+        path = os.path.join(settings.CONVERTED_VIDEO_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
 def prepare_local_video(
     local_path: str,
-) -> Tuple[str, Optional[tempfile._TemporaryFileWrapper]]:
+    time_budget_seconds: Optional[float] = None,
+) -> Tuple[str, Optional[str]]:
     """
-    Checks if a local video is compliant. If not, converts it to a temporary file.
+    Checks if a local video is compliant. If not, converts it into CONVERTED_VIDEO_DIR,
+    where it stays until `discard_converted_video` is called once its upload finished.
+    A conversion left by an earlier attempt is reused, whatever the time budget is now,
+    so an interrupted upload can resume with the same file.
 
     Returns a tuple containing:
-    1. The path to the compliant video file (original or temporary).
-    2. The temporary file object for cleanup (or None if no conversion was needed).
+    1. The path to the compliant video file (original or converted).
+    2. The encoding profile of the converted file (or None if no conversion was needed).
     """
     props = get_video_properties(local_path)
     if not (props and props.get("width") and props.get("height")):
@@ -156,20 +243,40 @@ def prepare_local_video(
         log.info(f"Video {local_path} is already compliant.")
         return local_path, None
 
-    # If not compliant, create a temporary file and convert the video
+    _remove_expired_conversions()
+    digest = staging.file_digest(local_path)
+    converted = _converted_videos(digest)
+    if converted:
+        profile_name, converted_path = next(iter(converted.items()))
+        log.info(f"Reusing converted copy of {local_path} ({profile_name}): {converted_path}")
+        return converted_path, profile_name
+
+    # If not compliant, convert the video next to the other conversions
     log.warning(f"Video {local_path} has non-compliant aspect ratio. Converting...")
+    profile_name, _ = select_encoding_profile(time_budget_seconds)
+    converted_path = os.path.join(settings.CONVERTED_VIDEO_DIR, f"{digest}-{profile_name}.mp4")
+    # ffmpeg writes to a hidden file first, so an interrupted conversion is never reused
+    partial_path = os.path.join(settings.CONVERTED_VIDEO_DIR, f".{digest}-{profile_name}.mp4")
     try:
-        # Create a temp file that persists after being closed
-        temp_file = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False)
-        temp_file.close()  # Close the file so ffmpeg can write to it
-
-        if convert_video_for_instagram(local_path, temp_file.name):
-            return temp_file.name, temp_file
-        else:
-            # Conversion failed, return original and hope for the best
-            os.remove(temp_file.name)  # Clean up failed temp file
-            return local_path, None
+        os.makedirs(settings.CONVERTED_VIDEO_DIR, exist_ok=True)
+        if convert_video_for_instagram(local_path, partial_path, time_budget_seconds):
+            os.replace(partial_path, converted_path)
+            return converted_path, profile_name
+        # Conversion failed, return original and hope for the best
+        if os.path.exists(partial_path):
+            os.remove(partial_path)  # Clean up failed conversion
+        return local_path, None
 
     except Exception as e:
-        log.error(f"Error during temporary file creation/conversion: {e}")
+        log.error(f"Error during video conversion: {e}")
         return local_path, None
+
+
+def discard_converted_video(path: str):
+    """Deletes a converted video once its upload finished."""
+    if os.path.dirname(os.path.abspath(path)) != os.path.abspath(settings.CONVERTED_VIDEO_DIR):
+        return  # Never delete an original
+    try:
+        os.remove(path)
+    except OSError as e:
+        log.warning(f"Could not delete converted video {path}: {e}")
@@ -0,0 +1,146 @@
+import cProfile
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from logger_setup import log
+from config import settings
+
+# Profiling of pipeline runs (`main.py --profile[=cpu|mem]`), one set of files per run:
+#   cpu: cProfile statistics (.pstats, for snakeviz / pstats) and sampled stacks of all
+#        threads in the collapsed format (.collapsed, for flamegraph.pl / speedscope).
+#   mem: a tracemalloc snapshot per stage, taken when the stage ends with more memory in
+#        use than any earlier call of it (.snapshot, for tracemalloc.Snapshot.load),
+#        plus a summary of the top allocation sites per stage (.txt).
+# Without --profile, the only cost is the `memory_profiling` check in `metrics.timed`.
+
+MODES = ["cpu", "mem"]
+TOP_ALLOCATIONS = 10
+
+memory_profiling = False
+_stage_snapshots: Dict[str, Tuple[int, tracemalloc.Snapshot]] = {}
+_snapshot_lock = threading.Lock()
+
+
+def _output_stem(mode: str) -> str:
+    """Returns the path (without extension) shared by all files of one profiled run."""
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    return os.path.join(settings.PROFILE_DIR, f"{mode}-{timestamp}-{os.getpid()}")
+
+
+# --- CPU ---
+
+
+class _StackSampler(threading.Thread):
+    """Samples the stacks of all other threads, counted per collapsed stack."""
+
+    def __init__(self, interval_seconds: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval_seconds = interval_seconds
+        self.stacks: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval_seconds):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    filename = os.path.basename(code.co_filename)
+                    stack.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+@contextmanager
+def _cpu_profile(stem: str):
+    profiler = cProfile.Profile()
+    sampler = _StackSampler(settings.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+    sampler.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        sampler.stop()
+        pstats_path = f"{stem}.pstats"
+        profiler.dump_stats(pstats_path)
+        collapsed_path = f"{stem}.collapsed"
+        with open(collapsed_path, "w", encoding="utf-8") as f:
+            for stack, count in sampler.stacks.items():
+                f.write(f"{stack} {count}\n")
+        log.info(f"CPU profile written to {pstats_path} and {collapsed_path}.")
+
+
+# --- Memory ---
+
+
+def stage_finished(stage: str):
+    """Called by `metrics.timed` after each stage while memory profiling is on."""
+    current, _ = tracemalloc.get_traced_memory()
+    with _snapshot_lock:
+        previous = _stage_snapshots.get(stage)
+        if previous is not None and previous[0] >= current:
+            return
+        _stage_snapshots[stage] = (current, tracemalloc.take_snapshot())
+
+
+def _write_memory_profile(stem: str):
+    summary_path = f"{stem}.txt"
+    with _snapshot_lock:
+        snapshots = dict(_stage_snapshots)
+        _stage_snapshots.clear()
+    with open(summary_path, "w", encoding="utf-8") as f:
+        for stage, (current, snapshot) in sorted(
+            snapshots.items(), key=lambda item: item[1][0], reverse=True
+        ):
+            snapshot.dump(f"{stem}-{stage}.snapshot")
+            f.write(f"== {stage}: {current / 1024 / 1024:.1f} MiB in use ==\n")
+            for statistic in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+                f.write(f"{statistic}\n")
+            f.write("\n")
+    log.info(f"Memory profile of {len(snapshots)} stage(s) written to {summary_path}.")
+
+
+@contextmanager
+def _memory_profile(stem: str):
+    global memory_profiling
+    tracemalloc.start(settings.PROFILE_TRACEMALLOC_FRAMES)
+    memory_profiling = True
+    try:
+        yield
+    finally:
+        memory_profiling = False
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        log.info(f"Peak traced memory: {peak / 1024 / 1024:.1f} MiB.")
+        _write_memory_profile(stem)
+
+
+@contextmanager
+def profile(mode: Optional[str]):
+    """Profiles the block in the given mode ("cpu" or "mem"); does nothing for None."""
+    if mode is None:
+        yield
+        return
+    if mode not in MODES:
+        raise ValueError(f"Unknown profile mode '{mode}'. Use one of {MODES}.")
+    stem = _output_stem(mode)
+    started = time.perf_counter()
+    with _cpu_profile(stem) if mode == "cpu" else _memory_profile(stem):
+        yield
+    log.info(f"Profiled run took {time.perf_counter() - started:.1f}s.")
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from logger_setup import log
+from config import settings
+
+# Steps recorded per row and platform, in the order they happen
+STEPS = ["media_hosted", "child_containers", "parent_container", "published", "follow_up"]
+
+_lock = threading.Lock()
+_connection: Optional[sqlite3.Connection] = None
+
+
+def _connect() -> sqlite3.Connection:
+    global _connection
+    if _connection is None:
+        _connection = sqlite3.connect(settings.JOURNAL_DB_FILE, check_same_thread=False)
+        _connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS journal (
+                sheet_name TEXT NOT NULL,
+                worksheet_name TEXT NOT NULL,
+                row_number INTEGER NOT NULL,
+                platform TEXT NOT NULL,
+                step TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                value TEXT,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (sheet_name, worksheet_name, row_number, platform, step)
+            )
+            """
+        )
+        # Forget rows that were finished or abandoned long ago
+        cutoff = datetime.now() - timedelta(days=settings.JOURNAL_RETENTION_DAYS)
+        _connection.execute(
+            "DELETE FROM journal WHERE updated_at < ?", (cutoff.isoformat(),)
+        )
+        _connection.commit()
+    return _connection
+
+
+def content_fingerprint(content: Dict) -> str:
+    """
+    Fingerprints the columns that end up in a post and its schedule, so recorded progress
+    is discarded as soon as the row's text, hashtags or media are edited or it is rescheduled.
+    """
+    columns = [
+        settings.DATE_COLUMN_NAME,
+        settings.TIME_COLUMN_NAME,
+        settings.TEXT_COLUMN_NAME,
+        settings.HASHTAGS_COLUMN_NAME,
+        settings.HASHTAGS_IN_CAPTION_COLUMN_NAME,
+        settings.THREADS_TEXT_ONLY_COLUMN_NAME,
+        settings.IMAGE_URLS_COLUMN_NAME,
+        settings.VIDEO_URLS_COLUMN_NAME,
+        settings.LOCAL_IMAGE_PATH_COLUMN_NAME,
+        settings.LOCAL_VIDEO_PATH_COLUMN_NAME,
+    ]
+    payload = json.dumps([str(content.get(column, "")) for column in columns])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def clear_row(sheet_name: str, worksheet_name: str, row_number: int):
+    """Forgets every platform's steps for a row that reached its final status."""
+    with _lock:
+        connection = _connect()
+        connection.execute(
+            "DELETE FROM journal WHERE sheet_name = ? AND worksheet_name = ? AND row_number = ?",
+            (sheet_name, worksheet_name, row_number),
+        )
+        connection.commit()
+
+
+class PublishJournal:
+    """
+    Durable record of the publishing steps completed for one row on one platform
+    (hosted media, child containers, parent container, post ID, follow-up comment).
+    A retry reads it to continue from the last completed step instead of starting over.
+    """
+
+    def __init__(self, sheet_name: str, worksheet_name: str, content: Dict, platform: str):
+        self.key = (sheet_name, worksheet_name, content.get("row_number"), platform)
+        self.fingerprint = content_fingerprint(content)
+        self._discard_if_row_changed()
+
+    def _discard_if_row_changed(self):
+        with _lock:
+            connection = _connect()
+            deleted = connection.execute(
+                """
+                DELETE FROM journal WHERE sheet_name = ? AND worksheet_name = ?
+                AND row_number = ? AND platform = ? AND fingerprint != ?
+                """,
+                (*self.key, self.fingerprint),
+            ).rowcount
+            connection.commit()
+        if deleted:
+            log.info(f"Row content changed since the last attempt. Reset journal for {self.key}.")
+
+    def get(self, step: str, max_age_hours: Optional[float] = None) -> Any:
+        """Returns the recorded value of a step, or None if it is missing or too old."""
+        with _lock:
+            row = (
+                _connect()
+                .execute(
+                    """
+                    SELECT value, updated_at FROM journal WHERE sheet_name = ?
+                    AND worksheet_name = ? AND row_number = ? AND platform = ? AND step = ?
+                    """,
+                    (*self.key, step),
+                )
+                .fetchone()
+            )
+        if row is None:
+            return None
+        value, updated_at = row
+        if max_age_hours is not None and datetime.now() - datetime.fromisoformat(
+            updated_at
+        ) > timedelta(hours=max_age_hours):
+            return None
+        return json.loads(value)
+
+    def recorded_at(self, step: str) -> Optional[datetime]:
+        """Returns when a step was completed, or None if it is missing."""
+        with _lock:
+            row = (
+                _connect()
+                .execute(
+                    """
+                    SELECT updated_at FROM journal WHERE sheet_name = ?
+                    AND worksheet_name = ? AND row_number = ? AND platform = ? AND step = ?
+                    """,
+                    (*self.key, step),
+                )
+                .fetchone()
+            )
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def record(self, step: str, value: Any, completed_at: Optional[datetime] = None):
+        """Stores the result of a completed step, completed now unless `completed_at` is given."""
+        with _lock:
+            connection = _connect()
+            connection.execute(
+                """
+                INSERT OR REPLACE INTO journal
+                (sheet_name, worksheet_name, row_number, platform, step, fingerprint, value, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    *self.key,
+                    step,
+                    self.fingerprint,
+                    json.dumps(value),
+                    (completed_at or datetime.now()).isoformat(),
+                ),
+            )
+            connection.commit()
+
+    def discard(self, step: str):
+        """Forgets a step whose result can no longer be used (e.g. an expired container)."""
+        with _lock:
+            connection = _connect()
+            connection.execute(
+                """
+                DELETE FROM journal WHERE sheet_name = ? AND worksheet_name = ?
+                AND row_number = ? AND platform = ? AND step = ?
+                """,
+                (*self.key, step),
+            )
+            connection.commit()
@@ -0,0 +1,169 @@
+import argparse
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from logger_setup import log
+from config import settings
+import metrics
+
+# Publish lag: how long after its scheduled Date/Time a post actually went live. The
+# scheduled, lock and publish time of every published post are kept per platform in
+# PUBLISH_LAG_DB_FILE; `python publish_lag.py --hours 24` reports the lag percentiles
+# per account and platform, e.g. to size the number of workers against a lag target.
+
+_lock = threading.Lock()
+_connection: Optional[sqlite3.Connection] = None
+
+PERCENTILES = [50, 90, 95, 99]
+
+publish_lag_seconds = metrics.register(
+    metrics.Histogram(
+        "pipeline_publish_lag_seconds",
+        "Time between a post's scheduled time and it going live.",
+        ["platform", "account"],
+        [30, 60, 120, 300, 600, 900, 1800, 3600, 7200, 21600],
+    )
+)
+
+
+def _connect() -> sqlite3.Connection:
+    global _connection
+    if _connection is None:
+        _connection = sqlite3.connect(
+            settings.PUBLISH_LAG_DB_FILE, timeout=30, check_same_thread=False
+        )
+        _connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS publish_lag (
+                sheet_name TEXT NOT NULL,
+                worksheet_name TEXT NOT NULL,
+                row_number INTEGER NOT NULL,
+                platform TEXT NOT NULL,
+                account TEXT NOT NULL,
+                scheduled_at TEXT NOT NULL,
+                locked_at TEXT,
+                published_at TEXT NOT NULL,
+                lag_seconds REAL NOT NULL,
+                PRIMARY KEY (sheet_name, worksheet_name, row_number, platform, scheduled_at)
+            )
+            """
+        )
+        _connection.execute(
+            "CREATE INDEX IF NOT EXISTS publish_lag_by_time ON publish_lag (published_at)"
+        )
+        _connection.commit()
+    return _connection
+
+
+def record(
+    sheet_name: str,
+    worksheet_name: str,
+    row_number: int,
+    platform: str,
+    account: str,
+    scheduled_at: datetime,
+    locked_at: Optional[datetime],
+    published_at: datetime,
+) -> float:
+    """Stores the timestamps of a published post and returns its lag in seconds."""
+    # Posts published ahead of time (e.g. a schedule edited afterwards) have no lag
+    lag_seconds = max(0.0, (published_at - scheduled_at).total_seconds())
+    publish_lag_seconds.observe(lag_seconds, platform=platform, account=account)
+    try:
+        with _lock:
+            connection = _connect()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO publish_lag VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        sheet_name,
+                        worksheet_name,
+                        row_number,
+                        platform,
+                        account,
+                        scheduled_at.isoformat(),
+                        locked_at.isoformat() if locked_at else None,
+                        published_at.isoformat(),
+                        lag_seconds,
+                    ),
+                )
+    except sqlite3.Error as e:
+        log.error(f"Could not record the publish lag of row {row_number}: {e}")
+    return lag_seconds
+
+
+def lags_by_account(
+    since: datetime, until: Optional[datetime] = None
+) -> Dict[Tuple[str, str], List[float]]:
+    """Returns the lags (in seconds) of posts published in the window, per (account, platform)."""
+    until = until or datetime.now()
+    with _lock:
+        rows = _connect().execute(
+            """
+            SELECT account, platform, lag_seconds FROM publish_lag
+            WHERE published_at >= ? AND published_at < ?
+            """,
+            (since.isoformat(), until.isoformat()),
+        ).fetchall()
+    lags: Dict[Tuple[str, str], List[float]] = {}
+    for account, platform, lag_seconds in rows:
+        lags.setdefault((account, platform), []).append(lag_seconds)
+    return lags
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    index = max(0, min(len(sorted_values) - 1, round(percent / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def format_report(
+    lags: Dict[Tuple[str, str], List[float]], target_minutes: float
+) -> str:
+    """Formats a table of lag percentiles (in minutes) per account and platform."""
+    header = f"{'account':<24} {'platform':<10} {'posts':>6} " + " ".join(
+        f"{'p' + str(percent):>7}" for percent in PERCENTILES
+    )
+    lines = [header + f" {'max':>7} {'<= ' + str(target_minutes) + ' min':>12}"]
+    for (account, platform), values in sorted(lags.items()):
+        values = sorted(value / 60 for value in values)
+        within_target = sum(1 for value in values if value <= target_minutes) / len(values)
+        lines.append(
+            f"{account:<24} {platform:<10} {len(values):>6} "
+            + " ".join(f"{_percentile(values, percent):>7.1f}" for percent in PERCENTILES)
+            + f" {values[-1]:>7.1f} {within_target:>12.0%}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Reports publish lag percentiles (minutes) per account and platform."
+    )
+    arg_parser.add_argument(
+        "--hours", type=float, default=24, help="Report the last N hours (default: 24)."
+    )
+    arg_parser.add_argument(
+        "--since", help="Start of the window instead of --hours, e.g. 2024-05-01T00:00."
+    )
+    arg_parser.add_argument("--until", help="End of the window (default: now).")
+    arg_parser.add_argument(
+        "--target",
+        type=float,
+        default=settings.PUBLISH_LAG_TARGET_MINUTES,
+        help="Lag target in minutes (default: PUBLISH_LAG_TARGET_MINUTES).",
+    )
+    args = arg_parser.parse_args()
+
+    until = datetime.fromisoformat(args.until) if args.until else datetime.now()
+    since = (
+        datetime.fromisoformat(args.since)
+        if args.since
+        else until - timedelta(hours=args.hours)
+    )
+    lags = lags_by_account(since, until)
+    print(f"Publish lag from {since:%Y-%m-%d %H:%M} to {until:%Y-%m-%d %H:%M} (minutes)")
+    if not lags:
+        print("No posts were published in this window.")
+    else:
+        print(format_report(lags, args.target))
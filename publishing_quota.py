@@ -0,0 +1,113 @@
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+from logger_setup import log
+from config import settings
+from worker_lock import file_lock
+
+# account -> {"quota_usage", "quota_total", "fetched_at", "published_since_fetch"}
+# The file is shared by all workers, so it is re-read under a file lock before every change
+_lock = threading.Lock()
+
+
+@contextmanager
+def _locked():
+    with _lock, file_lock(f"{settings.PUBLISHING_QUOTA_FILE}.lock"):
+        yield
+
+
+def _load() -> Dict:
+    try:
+        with open(settings.PUBLISHING_QUOTA_FILE, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save(quotas: Dict):
+    """Replaces the file atomically, so readers never see a half-written file."""
+    directory = os.path.dirname(os.path.abspath(settings.PUBLISHING_QUOTA_FILE))
+    try:
+        with tempfile.NamedTemporaryFile(
+            "w", dir=directory, prefix=".publishing-quota-", suffix=".tmp", delete=False
+        ) as f:
+            json.dump(quotas, f, indent=4)
+        os.replace(f.name, settings.PUBLISHING_QUOTA_FILE)
+    except OSError as e:
+        log.error(f"Could not write publishing quota cache to file: {e}")
+
+
+def _is_stale(entry: Dict) -> bool:
+    try:
+        fetched_at = datetime.fromisoformat(entry.get("fetched_at", ""))
+    except ValueError:
+        return True
+    max_age = timedelta(minutes=settings.PUBLISHING_QUOTA_CACHE_MINUTES)
+    return datetime.now() - fetched_at > max_age
+
+
+def get_remaining_quota(
+    account: str, fetch_limit: Callable[[], Optional[Tuple[int, int]]]
+) -> Optional[int]:
+    """
+    Returns how many more posts an account may publish in the current 24 h window.
+    `fetch_limit` returns (quota_usage, quota_total) from the platform's publishing limit
+    endpoint and is only called when the cached value is stale or already used up.
+    Returns None if the quota is unknown, in which case nothing should be held back.
+    """
+    with _locked():
+        entry = _load().get(account)
+    # An exhausted cache is re-checked, since older posts drop out of the 24 h window
+    if entry is not None and not _is_stale(entry) and _remaining(entry) > 0:
+        return _remaining(entry)
+
+    # Fetched without holding the lock, so other workers are not kept waiting on the API
+    limit = fetch_limit()
+    if limit is None:
+        return _remaining(entry) if entry else None
+    quota_usage, quota_total = limit
+    entry = {
+        "quota_usage": quota_usage,
+        "quota_total": quota_total,
+        "fetched_at": datetime.now().isoformat(),
+        "published_since_fetch": 0,
+    }
+    with _locked():
+        quotas = _load()
+        quotas[account] = entry
+        _save(quotas)
+    log.info(f"Publishing quota for '{account}': {quota_usage}/{quota_total} used.")
+    return _remaining(entry)
+
+
+def _remaining(entry: Dict) -> int:
+    used = entry.get("quota_usage", 0) + entry.get("published_since_fetch", 0)
+    return entry.get("quota_total", 0) - used
+
+
+def record_publish(account: str):
+    """Counts a successful publish locally until the quota is fetched again."""
+    with _locked():
+        quotas = _load()
+        entry = quotas.get(account)
+        if entry is None:
+            return
+        entry["published_since_fetch"] = entry.get("published_since_fetch", 0) + 1
+        _save(quotas)
+
+
+def parse_publishing_limit(response_data: Dict) -> Optional[Tuple[int, int]]:
+    """
+    Parses a content_publishing_limit / threads_publishing_limit response:
+    {"data": [{"quota_usage": 4, "config": {"quota_total": 100, "quota_duration": 86400}}]}
+    """
+    try:
+        limit = response_data["data"][0]
+        return int(limit.get("quota_usage", 0)), int(limit["config"]["quota_total"])
+    except (KeyError, IndexError, TypeError, ValueError):
+        log.error(f"Unexpected publishing limit response: {response_data}")
+        return None
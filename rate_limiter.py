@@ -0,0 +1,249 @@
+import json
+import threading
+import time
+from typing import Dict, Optional
+import requests
+from logger_setup import log
+from config import settings
+
+# Graph/Threads error codes that mean "slow down" rather than "this request is wrong"
+APP_RATE_LIMIT_CODES = [4]
+ACCOUNT_RATE_LIMIT_CODES = [17, 32, 613, 80001, 80002, 80006]
+
+
+class RateLimitDeferred(Exception):
+    """Raised when an API budget is exhausted and the post should be retried later."""
+
+    def __init__(self, scope: str, retry_after_seconds: float):
+        self.scope = scope
+        self.retry_after_seconds = retry_after_seconds
+        super().__init__(
+            f"Rate limit budget for '{scope}' is exhausted. Retry in {retry_after_seconds:.0f}s."
+        )
+
+
+class TokenBucket:
+    """A token bucket whose refill rate can be lowered when the API reports high usage."""
+
+    def __init__(self, rate_per_minute: float, burst: float):
+        self.base_rate = rate_per_minute / 60.0
+        self.rate = self.base_rate
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    def wait_time(self) -> float:
+        """Returns how many seconds a call would wait for its token, without taking it."""
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def reserve(self) -> float:
+        """Takes one token and returns how many seconds the caller must wait for it."""
+        wait = self.wait_time()
+        self.tokens -= 1
+        return wait
+
+
+class RateLimiter:
+    """
+    Paces Graph/Threads API calls per app and per account. Usage reported by Meta in the
+    X-App-Usage and X-Business-Use-Case-Usage headers slows the matching bucket down as it
+    approaches the target percentage; rate-limit errors block the scope until it recovers.
+    Blocks are persisted so the next run does not start by hitting the same limit.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._state = self._load_state()
+
+    # --- Persistence ---
+
+    def _load_state(self) -> Dict:
+        try:
+            with open(settings.RATE_LIMIT_STATE_FILE, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_state(self):
+        try:
+            with open(settings.RATE_LIMIT_STATE_FILE, "w") as f:
+                json.dump(self._state, f, indent=4)
+        except IOError as e:
+            log.error(f"Could not write rate limit state to file: {e}")
+
+    # --- Scopes ---
+
+    def _bucket(self, scope: str) -> TokenBucket:
+        if scope not in self._buckets:
+            kind = scope.split(":", 1)[0]
+            options = settings.RATE_LIMIT_BUCKETS.get(kind, {})
+            self._buckets[scope] = TokenBucket(
+                options.get("rate_per_minute", 60), options.get("burst", 10)
+            )
+            # Carry over the usage last reported for this scope
+            usage = self._state.get(scope, {}).get("usage")
+            if usage is not None:
+                self._apply_usage(scope, usage)
+        return self._buckets[scope]
+
+    def _blocked_for(self, scope: str) -> float:
+        blocked_until = self._state.get(scope, {}).get("blocked_until", 0)
+        return max(0.0, blocked_until - time.time())
+
+    def _block(self, scope: str, seconds: float, reason: str):
+        self._state.setdefault(scope, {})["blocked_until"] = time.time() + seconds
+        self._save_state()
+        log.warning(f"Rate limit reached for '{scope}' ({reason}). Pausing it for {seconds:.0f}s.")
+
+    def _apply_usage(self, scope: str, usage: float):
+        """Scales a bucket's rate down linearly between the target usage and 100%."""
+        bucket = self._buckets[scope]
+        target = settings.RATE_LIMIT_TARGET_USAGE_PERCENT
+        if usage <= target:
+            factor = 1.0
+        else:
+            factor = max(0.05, (100 - usage) / max(1, 100 - target))
+        bucket.rate = bucket.base_rate * factor
+
+    # --- Public API ---
+
+    def has_budget(self, platform: str, account: str) -> bool:
+        """Checks, without waiting, whether calls for this account can be made right now."""
+        with self._lock:
+            return all(
+                self._blocked_for(scope) <= settings.RATE_LIMIT_MAX_WAIT_SECONDS
+                for scope in [f"app:{platform}", f"account:{account}"]
+            )
+
+    def acquire(self, platform: str, account: str):
+        """
+        Waits until both the app and the account bucket allow another call.
+        Raises RateLimitDeferred if that would take longer than RATE_LIMIT_MAX_WAIT_SECONDS.
+        """
+        with self._lock:
+            # Check every scope before taking tokens, so a deferred call does not use any up
+            waits = {}
+            for scope in [f"app:{platform}", f"account:{account}"]:
+                blocked_for = self._blocked_for(scope)
+                if blocked_for > settings.RATE_LIMIT_MAX_WAIT_SECONDS:
+                    raise RateLimitDeferred(scope, blocked_for)
+                waits[scope] = max(blocked_for, self._bucket(scope).wait_time())
+            scope, wait = max(waits.items(), key=lambda entry: entry[1])
+            if wait > settings.RATE_LIMIT_MAX_WAIT_SECONDS:
+                raise RateLimitDeferred(scope, wait)
+            for scope in waits:
+                self._bucket(scope).reserve()
+        if wait > 0:
+            log.info(
+                f"Pacing API calls for '{account}': waiting {wait:.1f}s.",
+                extra={"sample_key": f"pacing:{account}"},
+            )
+            time.sleep(wait)
+
+    def record_response(self, platform: str, account: str, response: requests.Response):
+        """
+        Reads Meta's usage headers and rate-limit errors from a response.
+        Raises RateLimitDeferred if the response itself was rejected for rate limiting.
+        """
+        app_scope, account_scope = f"app:{platform}", f"account:{account}"
+        with self._lock:
+            app_usage = _parse_app_usage(response.headers.get("X-App-Usage"))
+            if app_usage is not None:
+                self._record_usage(app_scope, app_usage)
+
+            account_usage, regain_minutes = _parse_business_usage(
+                response.headers.get("X-Business-Use-Case-Usage")
+            )
+            if account_usage is not None:
+                self._record_usage(account_scope, account_usage)
+            if regain_minutes:
+                self._block(account_scope, regain_minutes * 60, "usage header")
+
+            # Imported here because graph_client imports this module
+            from graph_client import _error_code
+
+            error_code = _error_code(response)
+            if response.status_code == 429 or error_code in ACCOUNT_RATE_LIMIT_CODES:
+                scope = account_scope
+            elif error_code in APP_RATE_LIMIT_CODES:
+                scope = app_scope
+            else:
+                return
+            if self._blocked_for(scope) <= 0:
+                retry_after = response.headers.get("Retry-After")
+                cooldown = (
+                    float(retry_after)
+                    if retry_after and retry_after.isdigit()
+                    else settings.RATE_LIMIT_COOLDOWN_SECONDS
+                )
+                self._block(scope, cooldown, f"error code {error_code or 429}")
+            blocked_for = self._blocked_for(scope)
+        raise RateLimitDeferred(scope, blocked_for)
+
+    def _record_usage(self, scope: str, usage: float):
+        self._bucket(scope)
+        self._apply_usage(scope, usage)
+        previous = self._state.get(scope, {}).get("usage")
+        self._state.setdefault(scope, {})["usage"] = usage
+        target = settings.RATE_LIMIT_TARGET_USAGE_PERCENT
+        if usage > target:
+            log.warning(f"API usage for '{scope}' is at {usage:.0f}% (target {target}%).")
+        # Only persist when the scope crosses the target, to avoid a write per request
+        if previous is None or (previous > target) != (usage > target):
+            self._save_state()
+
+
+def _parse_app_usage(header: Optional[str]) -> Optional[float]:
+    """X-App-Usage: {"call_count": 28, "total_time": 25, "total_cputime": 25}"""
+    if not header:
+        return None
+    try:
+        usage = json.loads(header)
+        return float(
+            max(usage.get(key, 0) for key in ["call_count", "total_time", "total_cputime"])
+        )
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def _parse_business_usage(header: Optional[str]):
+    """
+    X-Business-Use-Case-Usage: {"<id>": [{"type": ..., "call_count": 28, "total_time": 25,
+    "total_cputime": 25, "estimated_time_to_regain_access": 0}]}
+    Returns the highest usage percentage and the longest regain time in minutes.
+    """
+    if not header:
+        return None, 0
+    try:
+        usage_by_id = json.loads(header)
+        entries = [entry for entries in usage_by_id.values() for entry in entries]
+        usage = max(
+            (
+                float(entry.get(key, 0))
+                for entry in entries
+                for key in ["call_count", "total_time", "total_cputime"]
+            ),
+            default=None,
+        )
+        regain_minutes = max(
+            (float(entry.get("estimated_time_to_regain_access", 0)) for entry in entries),
+            default=0,
+        )
+        return usage, regain_minutes
+    except (ValueError, TypeError, AttributeError):
+        return None, 0
+
+
+# A single limiter shared by every destination in this process
+rate_limiter = RateLimiter()
@@ -1,107 +1,163 @@
+import os
+import re
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from typing import Dict, Optional, Set, Tuple
 import token_manager
 from config import settings
 from logger_setup import log
+from graph_client import GraphClient
+from rate_limiter import RateLimitDeferred
+from worker_lock import file_lock
+
+
+def refresh_single_token(platform: str, token_data: dict) -> Optional[dict]:
+    """
+    Exchanges one access token for a new long-lived token.
+    Returns the new token data, or None if the token could not be refreshed.
+    """
+    access_token = token_data.get("access_token")
+    user_id = token_data.get("user_id")
+
+    if not all([access_token, user_id]):
+        log.error(f"Token data for {platform} is incomplete. Cannot refresh.")
+        return None
+
+    log.warning(f"{platform.upper()} token is expiring soon. Attempting to refresh...")
+
+    # --- Set API parameters based on the platform ---
+    if platform == "instagram":
+        # Instagram uses the Graph API and 'ig_refresh_token'
+        refresh_url = f"{settings.FACEBOOK_API_BASE_URL}{settings.FACEBOOK_API_VERSION}/oauth/access_token"
+
+        payload = {
+            "grant_type": "fb_exchange_token",
+            "client_id": settings.APP_CLIENT_ID,
+            "client_secret": settings.APP_CLIENT_SECRET,
+            "fb_exchange_token": access_token,
+        }
+    elif platform == "threads":
+        # Threads has its own endpoint and 'th_refresh_token'
+        refresh_url = f"{settings.THREADS_API_BASE_URL}{settings.THREADS_API_VERSION}/refresh_access_token"
+        payload = {
+            "grant_type": "th_refresh_token",
+            "access_token": access_token,
+        }
+    else:
+        log.error(f"Unknown platform for token refresh: {platform}")
+        return None
+
+    # --- Make the API call to refresh the token ---
+    # Calls are paced per platform by the shared rate limiter, since many refreshes run at once
+    try:
+        response = GraphClient(platform, user_id).get(refresh_url, params=payload, timeout=30)
+        response.raise_for_status()
+        new_token_data = response.json()
+    except RateLimitDeferred as e:
+        log.warning(f"Skipping {platform} token refresh for now: {e}")
+        return None
+    except requests.exceptions.RequestException as e:
+        log.error(
+            f"Failed to refresh {platform} token. API Error: {e.response.text if e.response else e}"
+        )
+        return None
+
+    new_token = new_token_data.get("access_token")
+    expires_in = new_token_data.get("expires_in")
+
+    if not new_token or not expires_in:
+        log.error(f"Refresh response for {platform} was invalid: {new_token_data}")
+        return None
+    return {
+        "access_token": new_token,
+        "user_id": user_id,
+        "expiry_date": token_manager.calculate_expiry_date(expires_in),
+    }
+
+
+# One lock per account, so concurrent auth failures trigger a single refresh. The thread
+# lock covers this process, the lock file in WORKER_LOCK_DIR the other processes.
+_account_locks: Dict[Tuple[str, str, str], threading.Lock] = {}
+_account_locks_guard = threading.Lock()
+_failed_tokens: Set[str] = set()
+
+
+def _account_lock_path(key: Tuple[str, str, str]) -> str:
+    name = re.sub(r"[^A-Za-z0-9_.-]+", "_", "__".join(key))
+    return os.path.join(settings.WORKER_LOCK_DIR, f"token-refresh__{name}.lock")
+
+
+def refresh_account_token(
+    sheet_name: str, worksheet_name: str, platform: str, failed_token: str
+) -> Optional[str]:
+    """
+    Replaces an access token that the API rejected. However many requests (in this or
+    other processes) fail with the same token, only the first one refreshes it; the
+    others wait and get the result. Returns the new access token, or None if it could
+    not be refreshed.
+    """
+    key = (sheet_name, worksheet_name, platform)
+    with _account_locks_guard:
+        lock = _account_locks.setdefault(key, threading.Lock())
+
+    # The token is re-read, refreshed and saved under the account's lock file
+    with lock, file_lock(_account_lock_path(key)):
+        token_data = token_manager.get_token(*key)
+        current_token = token_data.get("access_token")
+        if current_token and current_token != failed_token:
+            # Already refreshed by another request (or another process)
+            return current_token
+        if failed_token in _failed_tokens:
+            return None
+
+        log.warning(
+            f"{platform.upper()} token of '{sheet_name}' / '{worksheet_name}' was rejected. "
+            "Attempting to refresh it..."
+        )
+        refreshed_token_data = refresh_single_token(platform, token_data)
+        if not refreshed_token_data:
+            # Do not retry for every other post of this account
+            _failed_tokens.add(failed_token)
+            return None
+        token_manager.update_tokens({key: refreshed_token_data})
+        return refreshed_token_data["access_token"]
 
 
 def refresh_platform_token():
     """
-    Checks if a platform's access token is expiring soon and refreshes it if necessary.
-    Handles differences between Instagram and Threads APIs.
+    Refreshes every access token that expires within the next 7 days, up to
+    TOKEN_REFRESH_WORKERS at a time.
+    Only the refreshed tokens are written back; all other tokens are left untouched.
     """
     log.info(f"--- Starting Token Refresh Check ---")
 
-    all_tokens = token_manager.load_tokens()
-    refreshed_tokens = {}
-    for sheet_name, sheet_data in all_tokens.items():
-        refreshed_worksheets_data = {}
-
-        for worksheet_name, worksheet_data in sheet_data.items():
-            refreshed_platform_tokens = {}
-            for platform, token_data in worksheet_data.items():
-                access_token = token_data.get("access_token")
-                expiry_date_str = token_data.get("expiry_date")
-                user_id = token_data.get("user_id")
-
-                if not all([access_token, expiry_date_str, user_id]):
-                    log.error(
-                        f"Token data for {platform} is incomplete. Cannot refresh."
-                    )
-                    refreshed_platform_tokens.setdefault(platform, token_data)
-                    continue
-
-                # Check if the token expires within the next 7 days
-                expiry_date = datetime.fromisoformat(expiry_date_str)
-                if expiry_date > (datetime.now() + timedelta(days=7)):
-                    log.info(
-                        f"{platform.upper()} token is not expiring soon (expires on {expiry_date.strftime('%Y-%m-%d')}). No refresh needed."
-                    )
-                    refreshed_platform_tokens.setdefault(platform, token_data)
-                    continue
-
-                log.warning(
-                    f"{platform.upper()} token is expiring soon. Attempting to refresh..."
-                )
-
-                # --- Set API parameters based on the platform ---
-                if platform == "instagram":
-                    # Instagram uses the Graph API and 'ig_refresh_token'
-                    refresh_url = f"{settings.FACEBOOK_API_BASE_URL}{settings.FACEBOOK_API_VERSION}/oauth/access_token"
-
-                    payload = {
-                        "grant_type": "fb_exchange_token",
-                        "client_id": settings.APP_CLIENT_ID,
-                        "client_secret": settings.APP_CLIENT_SECRET,
-                        "fb_exchange_token": access_token,
-                    }
-                elif platform == "threads":
-                    # Threads has its own endpoint and 'th_refresh_token'
-                    refresh_url = f"{settings.THREADS_API_BASE_URL}{settings.THREADS_API_VERSION}/refresh_access_token"
-                    payload = {
-                        "grant_type": "th_refresh_token",
-                        "access_token": access_token,
-                    }
-                else:
-                    log.error(f"Unknown platform for token refresh: {platform}")
-                    refreshed_platform_tokens.setdefault(platform, token_data)
-                    continue
-
-                # --- Make the API call to refresh the token ---
-                try:
-                    response = requests.get(refresh_url, params=payload)
-                    response.raise_for_status()
-                    new_token_data = response.json()
-
-                    new_token = new_token_data.get("access_token")
-                    expires_in = new_token_data.get("expires_in")
-
-                    if not new_token or not expires_in:
-                        log.error(
-                            f"Refresh response for {platform} was invalid: {new_token_data}"
-                        )
-                        refreshed_platform_tokens.setdefault(platform, token_data)
-                        continue
-                    expires_at = token_manager.calculate_expiry_date(expires_in)
-                    refreshed_token_data = {
-                        "access_token": new_token,
-                        "user_id": user_id,
-                        "expiry_date": expires_at,
-                    }
-                    refreshed_platform_tokens.setdefault(platform, refreshed_token_data)
-
-                except requests.exceptions.RequestException as e:
-                    log.error(
-                        f"Failed to refresh {platform} token. API Error: {e.response.text if e.response else e}"
-                    )
-            refreshed_worksheets_data.setdefault(
-                worksheet_name, refreshed_platform_tokens
-            )
-
-        # Save the refreshed token using the updated token_manager
-        refreshed_tokens.setdefault(sheet_name, refreshed_worksheets_data)
-    token_manager.save_tokens(refreshed_tokens)
-    log.info(f"✅ Tokens has been successfully refreshed and saved.")
+    expiring_tokens = token_manager.get_expiring_tokens(datetime.now() + timedelta(days=7))
+    if not expiring_tokens:
+        log.info("No tokens are expiring soon. No refresh needed.")
+        return
+    log.info(f"Found {len(expiring_tokens)} token(s) expiring within 7 days.")
+
+    def refresh(expiring_token):
+        (sheet_name, worksheet_name, platform), token_data = expiring_token
+        log.info(f"Refreshing {platform} token of '{sheet_name}' / '{worksheet_name}'.")
+        return refresh_single_token(platform, token_data)
+
+    # Refresh concurrently, then write all results back in one save
+    workers = max(1, settings.TOKEN_REFRESH_WORKERS)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(refresh, expiring_tokens))
+
+    refreshed_tokens = {
+        key: refreshed_token_data
+        for (key, _), refreshed_token_data in zip(expiring_tokens, results)
+        if refreshed_token_data
+    }
+    token_manager.update_tokens(refreshed_tokens)
+    log.info(
+        f"✅ Refreshed {len(refreshed_tokens)} of {len(expiring_tokens)} expiring token(s)."
+    )
 
 
 if __name__ == "__main__":
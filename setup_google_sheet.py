@@ -31,6 +31,8 @@ def setup_sheet_headers():
         settings.LOCAL_VIDEO_PATH_COLUMN_NAME,
         settings.IMAGE_URLS_COLUMN_NAME,
         settings.VIDEO_URLS_COLUMN_NAME,
+        settings.LEASE_COLUMN_NAME,
+        settings.PUBLISH_LAG_COLUMN_NAME,
     ]
 
     # --- 1. Define columns for specific formatting ---
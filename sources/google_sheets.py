@@ -1,20 +1,37 @@
-from typing import List, Dict
+from datetime import datetime
+from typing import List, Dict, Optional
 import gspread
 from interfaces import IDataSource
 from config import settings
 from logger_setup import log
+from metrics import timed_stage
+from http_instrumentation import instrument_session
+
+
+def open_client():
+    """Creates the spreadsheet client selected by SHEETS_BACKEND."""
+    backend = settings.SHEETS_BACKEND.lower()
+    if backend == "memory":
+        from sources import memory_sheets
+
+        return memory_sheets.client()
+    if backend == "google":
+        client = gspread.service_account(filename=settings.GOOGLE_CREDENTIALS_FILE)
+        instrument_session(client.http_client.session, "sheets")
+        return client
+    raise ValueError(
+        f"Unknown SHEETS_BACKEND '{settings.SHEETS_BACKEND}'. Use 'google' or 'memory'."
+    )
 
 
 class GoogleSheetsSource(IDataSource):
     """Fetches data from a specified Google Sheet and can update it."""
 
     def __init__(self, sheet_name: str, worksheet_name: str):
+        self.sheet_name = sheet_name
+        self.worksheet_name = worksheet_name
         try:
-            self.client = gspread.service_account(
-                filename=settings.GOOGLE_CREDENTIALS_FILE
-            )
-            self.sheet_name = sheet_name
-
+            self.client = open_client()
             self.sheet = self.client.open(sheet_name).worksheet(worksheet_name)
 
             # Get the column headers to find the status column number efficiently later
@@ -25,6 +42,7 @@ class GoogleSheetsSource(IDataSource):
             self.sheet = None
             self.headers = []
 
+    @timed_stage("sheet_fetch")
     def get_data(self) -> List[Dict]:
         """Gets all rows and adds a 'row_number' to each for later updates."""
         if not self.sheet:
@@ -41,15 +59,56 @@ class GoogleSheetsSource(IDataSource):
 
         return records
 
-    def update_status(self, row_number: int, status_text: str) -> bool:
-        """Finds the 'status' column and updates the cell for a given row."""
+    def _status_cells(
+        self,
+        row_number: int,
+        status: str,
+        lease_expiry: Optional[datetime],
+        publish_lag_minutes: Optional[float] = None,
+    ) -> List[gspread.Cell]:
+        """
+        Builds the cells for a status update. If the sheet has a lease column, the lease is
+        written alongside the status (or cleared when no lease is given). The publish lag
+        is written likewise, if given and the sheet has a column for it.
+        Raises ValueError if the status column is missing.
+        """
+        status_col_index = self.headers.index(settings.STATUS_COLUMN_NAME) + 1
+        cells = [gspread.Cell(row=row_number, col=status_col_index, value=status)]
+        if settings.LEASE_COLUMN_NAME in self.headers:
+            lease_col_index = self.headers.index(settings.LEASE_COLUMN_NAME) + 1
+            lease_value = lease_expiry.isoformat(timespec="seconds") if lease_expiry else ""
+            cells.append(gspread.Cell(row=row_number, col=lease_col_index, value=lease_value))
+        if publish_lag_minutes is not None and settings.PUBLISH_LAG_COLUMN_NAME in self.headers:
+            lag_col_index = self.headers.index(settings.PUBLISH_LAG_COLUMN_NAME) + 1
+            cells.append(
+                gspread.Cell(
+                    row=row_number, col=lag_col_index, value=round(publish_lag_minutes, 1)
+                )
+            )
+        return cells
+
+    def has_lease_column(self) -> bool:
+        return settings.LEASE_COLUMN_NAME in self.headers
+
+    @timed_stage("sheet_update")
+    def update_status(
+        self,
+        row_number: int,
+        status_text: str,
+        publish_lag_minutes: Optional[float] = None,
+    ) -> bool:
+        """
+        Finds the 'status' column and updates the cell for a given row, releasing its lease.
+        The publish lag, if given, is written in the same call.
+        """
         if not self.sheet:
             return False
 
         try:
-            # Find which column number corresponds to the status header
-            status_col_index = self.headers.index(settings.STATUS_COLUMN_NAME) + 1
-            self.sheet.update_cell(row_number, status_col_index, status_text)
+            # Leaving "Publishing" always releases the lease
+            self.sheet.update_cells(
+                self._status_cells(row_number, status_text, None, publish_lag_minutes)
+            )
             log.info(f"Updated row {row_number} status to '{status_text}'.")
             return True
         except ValueError:
@@ -61,9 +120,13 @@ class GoogleSheetsSource(IDataSource):
             log.error(f"ERROR: Could not update sheet. Details: {e}")
             return False
 
-    def update_status_batch(self, row_numbers: list, status: str) -> bool:
+    @timed_stage("sheet_update")
+    def update_status_batch(
+        self, row_numbers: list, status: str, lease_expiry: Optional[datetime] = None
+    ) -> bool:
         """
         Updates the status for a list of rows in a single API call.
+        With `lease_expiry`, the rows are locked until that time (see PUBLISH_LEASE_MINUTES).
         """
         if not self.sheet or not row_numbers:
             return False
@@ -71,13 +134,10 @@ class GoogleSheetsSource(IDataSource):
         try:
             # IMPROVEMENT: Use the pre-fetched headers to find the column index
             # This avoids making an extra API call every time.
-            status_col_index = self.headers.index(settings.STATUS_COLUMN_NAME) + 1
-
             # Prepare a list of cells to update
             cells_to_update = []
             for row_num in row_numbers:
-                cell = gspread.Cell(row=row_num, col=status_col_index, value=status)
-                cells_to_update.append(cell)
+                cells_to_update.extend(self._status_cells(row_num, status, lease_expiry))
 
             # Update all cells in one batch request
             # FIX: Use the correct 'self.sheet' attribute
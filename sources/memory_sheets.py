@@ -0,0 +1,273 @@
+import json
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional
+import gspread
+import requests
+from gspread.utils import a1_range_to_grid_range, fill_gaps, numericise_all, to_records
+from gspread.worksheet import ValueRange
+from config import settings
+from logger_setup import log
+
+# In-process stand-in for the gspread client, spreadsheet and worksheet objects that
+# GoogleSheetsSource uses (SHEETS_BACKEND=memory). Cell values are kept as strings like
+# the API returns them, and every worksheet call counts as one API request: it waits
+# SHEETS_MEMORY_LATENCY_MS and fails with the API's 429 "quota exceeded" error at
+# SHEETS_MEMORY_QUOTA_ERROR_RATE or above SHEETS_MEMORY_REQUESTS_PER_MINUTE.
+# All sources in the process share one client, filled from SHEETS_MEMORY_FILE
+# ({"sheet": {"worksheet": [[headers...], [row...], ...]}}) or with `client().load(...)`.
+
+_client: Optional["MemoryClient"] = None
+_client_lock = threading.Lock()
+
+
+def _quota_error(message: str) -> gspread.exceptions.APIError:
+    """Builds the error gspread raises for a 429 response."""
+    response = requests.Response()
+    response.status_code = 429
+    response.headers["Content-Type"] = "application/json"
+    response._content = json.dumps(
+        {"error": {"code": 429, "message": message, "status": "RESOURCE_EXHAUSTED"}}
+    ).encode("utf-8")
+    return gspread.exceptions.APIError(response)
+
+
+def _cell_text(value: Any) -> str:
+    return "" if value is None else str(value)
+
+
+class MemoryClient:
+    """Holds the spreadsheets and applies latency and quota limits to every API call."""
+
+    def __init__(
+        self,
+        latency_seconds: float = 0.0,
+        quota_error_rate: float = 0.0,
+        requests_per_minute: int = 0,
+        seed: Optional[int] = None,
+    ):
+        self.latency_seconds = latency_seconds
+        self.quota_error_rate = quota_error_rate
+        self.requests_per_minute = requests_per_minute
+        self.spreadsheets: Dict[str, "MemorySpreadsheet"] = {}
+        self.reads = 0
+        self.writes = 0
+        self.quota_errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._recent_requests: deque = deque()
+
+    def request(self, kind: str):
+        """Accounts for one API call ("read" or "write"); raises APIError when over quota."""
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        now = time.monotonic()
+        with self._lock:
+            over_quota = self.quota_error_rate > 0 and self._random.random() < self.quota_error_rate
+            if self.requests_per_minute:
+                while self._recent_requests and self._recent_requests[0] <= now - 60:
+                    self._recent_requests.popleft()
+                if len(self._recent_requests) >= self.requests_per_minute:
+                    over_quota = True
+                else:
+                    self._recent_requests.append(now)
+            if over_quota:
+                self.quota_errors += 1
+            elif kind == "read":
+                self.reads += 1
+            else:
+                self.writes += 1
+        if over_quota:
+            metric = "Read requests" if kind == "read" else "Write requests"
+            raise _quota_error(
+                f"Quota exceeded for quota metric '{metric}' and limit "
+                f"'{metric} per minute per user' of service 'sheets.googleapis.com'."
+            )
+
+    def create(self, title: str) -> "MemorySpreadsheet":
+        with self._lock:
+            spreadsheet = self.spreadsheets.setdefault(title, MemorySpreadsheet(self, title))
+        return spreadsheet
+
+    def open(self, title: str) -> "MemorySpreadsheet":
+        self.request("read")
+        if title not in self.spreadsheets:
+            raise gspread.exceptions.SpreadsheetNotFound(title)
+        return self.spreadsheets[title]
+
+    def load(self, data: Dict[str, Dict[str, List[List[Any]]]]):
+        """Adds (or replaces) worksheets from {"sheet": {"worksheet": [[headers...], [row...]]}}."""
+        for sheet_name, worksheets in data.items():
+            spreadsheet = self.create(sheet_name)
+            for worksheet_name, values in worksheets.items():
+                spreadsheet.worksheets_by_title[worksheet_name] = MemoryWorksheet(
+                    self, worksheet_name, values
+                )
+
+
+class MemorySpreadsheet:
+    def __init__(self, client: MemoryClient, title: str):
+        self.client = client
+        self.title = title
+        self.worksheets_by_title: Dict[str, "MemoryWorksheet"] = {}
+
+    def worksheet(self, title: str) -> "MemoryWorksheet":
+        self.client.request("read")
+        if title not in self.worksheets_by_title:
+            raise gspread.exceptions.WorksheetNotFound(title)
+        return self.worksheets_by_title[title]
+
+    def worksheets(self) -> List["MemoryWorksheet"]:
+        self.client.request("read")
+        return list(self.worksheets_by_title.values())
+
+    def add_worksheet(self, title: str, rows: int = 1000, cols: int = 26) -> "MemoryWorksheet":
+        self.client.request("write")
+        worksheet = MemoryWorksheet(self.client, title, [])
+        self.worksheets_by_title[title] = worksheet
+        return worksheet
+
+
+class MemoryWorksheet:
+    """A worksheet kept as a list of rows of strings, with the gspread methods the pipeline uses."""
+
+    def __init__(self, client: MemoryClient, title: str, values: List[List[Any]]):
+        self.client = client
+        self.title = title
+        self._values: List[List[str]] = [[_cell_text(value) for value in row] for row in values]
+        self._lock = threading.Lock()
+
+    def _read(self, start_row: int, end_row: int, start_col: int, end_col: int) -> List[List[str]]:
+        """Returns a copy of the 0-based, end-exclusive block, without trailing blank rows and cells."""
+        with self._lock:
+            rows = [list(row[start_col:end_col]) for row in self._values[start_row:end_row]]
+        for row in rows:
+            while row and row[-1] == "":
+                row.pop()
+        while rows and not rows[-1]:
+            rows.pop()
+        return rows
+
+    def _range(self, range_name: Optional[str]) -> List[List[str]]:
+        if not range_name:
+            return self._read(0, len(self._values), 0, self._width())
+        grid = a1_range_to_grid_range(range_name.split("!")[-1])
+        return self._read(
+            grid.get("startRowIndex", 0),
+            grid.get("endRowIndex", len(self._values)),
+            grid.get("startColumnIndex", 0),
+            grid.get("endColumnIndex", self._width()),
+        )
+
+    def _width(self) -> int:
+        with self._lock:
+            return max((len(row) for row in self._values), default=0)
+
+    def _write(self, row: int, col: int, value: Any):
+        """Sets a 1-based cell, growing the grid as needed. Caller holds the lock."""
+        while len(self._values) < row:
+            self._values.append([])
+        cells = self._values[row - 1]
+        if len(cells) < col:
+            cells.extend([""] * (col - len(cells)))
+        cells[col - 1] = _cell_text(value)
+
+    # --- Reads ---
+
+    def row_values(self, row: int, **kwargs) -> List[str]:
+        self.client.request("read")
+        rows = self._read(row - 1, row, 0, self._width())
+        return rows[0] if rows else []
+
+    def col_values(self, col: int, **kwargs) -> List[str]:
+        self.client.request("read")
+        values = [row[0] if row else "" for row in self._read(0, len(self._values), col - 1, col)]
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def get_all_values(self, **kwargs) -> List[List[str]]:
+        self.client.request("read")
+        return fill_gaps(self._range(None))
+
+    def get_all_records(
+        self, head: int = 1, default_blank: Any = "", empty2zero: bool = False, **kwargs
+    ) -> List[Dict]:
+        self.client.request("read")
+        values = fill_gaps(self._range(None))
+        if len(values) < head:
+            return []
+        keys = values[head - 1]
+        rows = [numericise_all(row, empty2zero, default_blank) for row in values[head:]]
+        return to_records(keys, rows)
+
+    def get(self, range_name: Optional[str] = None, **kwargs) -> ValueRange:
+        self.client.request("read")
+        return ValueRange.from_json(
+            {"range": f"{self.title}!{range_name or ''}", "majorDimension": "ROWS", "values": self._range(range_name)}
+        )
+
+    def batch_get(self, ranges: Iterable[str], **kwargs) -> List[ValueRange]:
+        self.client.request("read")
+        return [
+            ValueRange.from_json(
+                {"range": f"{self.title}!{range_name}", "majorDimension": "ROWS", "values": self._range(range_name)}
+            )
+            for range_name in ranges
+        ]
+
+    # --- Writes ---
+
+    def update_cell(self, row: int, col: int, value: Any) -> Dict:
+        self.client.request("write")
+        with self._lock:
+            self._write(row, col, value)
+        return {"updatedCells": 1}
+
+    def update_cells(self, cell_list: List[gspread.Cell], **kwargs) -> Dict:
+        self.client.request("write")
+        with self._lock:
+            for cell in cell_list:
+                self._write(cell.row, cell.col, cell.value)
+        return {"updatedCells": len(cell_list)}
+
+    def batch_update(self, data: Iterable[Dict[str, Any]], **kwargs) -> Dict:
+        """Writes [{"range": "A2:B3", "values": [[...], [...]]}, ...] in one call."""
+        self.client.request("write")
+        updated = 0
+        with self._lock:
+            for entry in data:
+                grid = a1_range_to_grid_range(entry["range"].split("!")[-1])
+                start_row = grid.get("startRowIndex", 0) + 1
+                start_col = grid.get("startColumnIndex", 0) + 1
+                for row_offset, row_values in enumerate(entry["values"]):
+                    for col_offset, value in enumerate(row_values):
+                        self._write(start_row + row_offset, start_col + col_offset, value)
+                        updated += 1
+        return {"totalUpdatedCells": updated}
+
+
+def client() -> MemoryClient:
+    """Returns the client shared by all sources of this process, creating it from the settings."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = MemoryClient(
+                latency_seconds=settings.SHEETS_MEMORY_LATENCY_MS / 1000,
+                quota_error_rate=settings.SHEETS_MEMORY_QUOTA_ERROR_RATE,
+                requests_per_minute=settings.SHEETS_MEMORY_REQUESTS_PER_MINUTE,
+            )
+            if settings.SHEETS_MEMORY_FILE:
+                with open(settings.SHEETS_MEMORY_FILE, encoding="utf-8") as f:
+                    _client.load(json.load(f))
+                log.info(f"Loaded in-memory spreadsheets from {settings.SHEETS_MEMORY_FILE}.")
+        return _client
+
+
+def reset():
+    """Drops the shared client, so the next `client()` starts from the settings again."""
+    global _client
+    with _client_lock:
+        _client = None
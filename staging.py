@@ -0,0 +1,121 @@
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from logger_setup import log
+from config import settings
+
+# The staging file has two sections:
+#   "media":   content hash -> hosted public URL (shared by every upload path)
+#   "uploads": account/file (or source file and encoding profile)/caption -> open resumable upload session
+# Pre-created containers are recorded in the publish journal.
+_lock = threading.RLock()
+_state: Optional[Dict] = None
+
+
+def _load() -> Dict:
+    global _state
+    if _state is None:
+        try:
+            with open(settings.STAGING_FILE, "r") as f:
+                _state = json.load(f)
+        except FileNotFoundError:
+            _state = {}
+        except json.JSONDecodeError:
+            log.error(
+                f"Could not decode JSON from {settings.STAGING_FILE}. Starting fresh."
+            )
+            _state = {}
+        _state.setdefault("media", {})
+        _state.setdefault("uploads", {})
+    return _state
+
+
+def _save():
+    try:
+        with open(settings.STAGING_FILE, "w") as f:
+            json.dump(_state, f, indent=4)
+    except IOError as e:
+        log.error(f"Could not write staging data to file: {e}")
+
+
+def _is_fresh(timestamp: Optional[str], ttl_hours: float) -> bool:
+    if not timestamp:
+        return False
+    try:
+        created_at = datetime.fromisoformat(timestamp)
+    except ValueError:
+        return False
+    return datetime.now() - created_at < timedelta(hours=ttl_hours)
+
+
+def file_digest(path: str) -> str:
+    """Returns the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# --- Hosted media (content-hash cache) ---
+
+
+def get_hosted_url(media_key: str) -> Optional[str]:
+    """Returns the cached public URL for a media key, if it is still fresh."""
+    with _lock:
+        entry = _load()["media"].get(media_key)
+        if entry and _is_fresh(entry.get("hosted_at"), settings.MEDIA_CACHE_TTL_HOURS):
+            return entry.get("url")
+        return None
+
+
+def remember_hosted_url(media_key: str, url: str):
+    with _lock:
+        _load()["media"][media_key] = {
+            "url": url,
+            "hosted_at": datetime.now().isoformat(),
+        }
+        _save()
+
+
+def clear_hosted_media():
+    """Forgets every hosted URL, e.g. after the hosting repository was cleaned."""
+    with _lock:
+        _load()["media"] = {}
+        _save()
+
+
+# --- Resumable upload sessions ---
+
+
+def upload_session_key(user_id: str, media_type: str, digest: str, caption: str) -> str:
+    caption_digest = hashlib.sha256(caption.encode("utf-8")).hexdigest()[:16]
+    return f"{user_id}|{media_type}|{digest}|{caption_digest}"
+
+
+def get_upload_session(session_key: str) -> Optional[Dict]:
+    """Returns an unfinished resumable upload session, if its container has not expired."""
+    with _lock:
+        entry = _load()["uploads"].get(session_key)
+        if entry and _is_fresh(
+            entry.get("created_at"), settings.STAGING_CONTAINER_TTL_HOURS
+        ):
+            return entry
+        return None
+
+
+def save_upload_session(session_key: str, session: Dict):
+    with _lock:
+        _load()["uploads"][session_key] = {
+            **session,
+            "created_at": datetime.now().isoformat(),
+        }
+        _save()
+
+
+def discard_upload_session(session_key: str):
+    with _lock:
+        if _load()["uploads"].pop(session_key, None):
+            _save()
@@ -0,0 +1,152 @@
+import os
+import sys
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+
+# The modules live at the repository root and read their settings on import
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("APP_CLIENT_ID", "test")
+os.environ.setdefault("APP_CLIENT_SECRET", "test")
+
+
+@pytest.fixture(autouse=True)
+def work_dir(tmp_path, monkeypatch):
+    """
+    Runs every test in its own directory and drops the state the modules keep in memory,
+    so state files and databases start empty.
+    """
+    import publish_journal
+    import publish_lag
+    import staging
+
+    monkeypatch.chdir(tmp_path)
+    for module, name in [
+        (publish_journal, "_connection"),
+        (publish_lag, "_connection"),
+        (staging, "_state"),
+    ]:
+        monkeypatch.setattr(module, name, None)
+    yield tmp_path
+    for module in [publish_journal, publish_lag]:
+        if module._connection is not None:
+            module._connection.close()
+
+
+class FakeClock:
+    """
+    Stands in for time.time and time.monotonic; only moves when a test advances it.
+    `datetime` is a datetime class whose now() follows it, for patching into modules.
+    """
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+        started, started_at, clock = datetime.now(), now, self
+
+        class FakeDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return started + timedelta(seconds=clock.now - started_at)
+
+        self.datetime = FakeDatetime
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr("time.time", fake)
+    monkeypatch.setattr("time.monotonic", fake)
+    return fake
+
+
+@pytest.fixture
+def memory_sheet(monkeypatch):
+    """Returns a function that loads a worksheet into the in-memory Sheets backend."""
+    from config import settings
+    from sources import memory_sheets
+
+    monkeypatch.setattr(settings, "SHEETS_BACKEND", "memory")
+    monkeypatch.setattr(settings, "SHEETS_MEMORY_FILE", None)
+    monkeypatch.setattr(settings, "SHEETS_MEMORY_LATENCY_MS", 0)
+    monkeypatch.setattr(settings, "SHEETS_MEMORY_QUOTA_ERROR_RATE", 0)
+    monkeypatch.setattr(settings, "SHEETS_MEMORY_REQUESTS_PER_MINUTE", 0)
+    memory_sheets.reset()
+
+    def load(rows, sheet_name="Sheet", worksheet_name="Posts"):
+        memory_sheets.client().load({sheet_name: {worksheet_name: rows}})
+        return memory_sheets.client().spreadsheets[sheet_name].worksheets_by_title[worksheet_name]
+
+    yield load
+    memory_sheets.reset()
+
+
+class FakeDestination:
+    """
+    Stands in for a destination: posting records the post ID in the row's journal, as the
+    real destinations do once a post is live. `on_post(content)` runs before that.
+    """
+
+    def __init__(self, platform: str, succeeds: bool = True, on_post=None):
+        self.client = SimpleNamespace(platform=platform, account="alice", has_budget=lambda: True)
+        self.succeeds = succeeds
+        self.on_post = on_post
+        self.posted_rows = []
+
+    def _journal(self, content):
+        from publish_journal import PublishJournal
+
+        return PublishJournal("Sheet", "Posts", content, self.client.platform)
+
+    def post(self, content):
+        if self.on_post:
+            self.on_post(content)
+        self.posted_rows.append(content.get("row_number"))
+        if self.succeeds:
+            self._journal(content).record("published", "17890")
+        return self.succeeds
+
+    def published_at(self, content):
+        return self._journal(content).recorded_at("published")
+
+    def get_remaining_quota(self):
+        return None
+
+
+@pytest.fixture
+def fake_destination():
+    return FakeDestination
+
+
+@pytest.fixture
+def account(monkeypatch, work_dir):
+    """Stores tokens for the "Sheet"/"Posts" worksheet, so destinations can be created."""
+    from config import settings
+    import token_manager
+
+    monkeypatch.setattr(settings, "TOKEN_BACKEND", "json")
+    monkeypatch.setattr(settings, "TOKEN_FILE", str(work_dir / "token_storage.json"))
+    expiry_date = (datetime.now() + timedelta(days=60)).isoformat()
+    token_manager.save_tokens(
+        {
+            "Sheet": {
+                "Posts": {
+                    "instagram": {
+                        "access_token": "instagram-token",
+                        "user_id": "1784000111",
+                        "expiry_date": expiry_date,
+                    },
+                    "threads": {
+                        "access_token": "threads-token",
+                        "user_id": "2558000222",
+                        "expiry_date": expiry_date,
+                    },
+                }
+            }
+        }
+    )
@@ -0,0 +1,142 @@
+import json
+import os
+import pytest
+import requests
+import cassettes
+import publish_journal
+import staging
+from benchmarks.fake_github import FakeGitHubServer
+from benchmarks.fake_graph import FakeGraphServer, FakeGraphState
+from cassettes import CassetteMismatch
+from config import settings
+from destinations.instagram import InstagramDestination
+from destinations.threads import ThreadsDestination
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROWS = {
+    "instagram": {
+        "row_number": 2,
+        "Text": "Cassette test",
+        "Hashtags": "#one,#two",
+        "Local Image Path": os.path.join(REPO_ROOT, "test_image1.jpg"),
+    },
+    "threads": {"row_number": 3, "Text": "Cassette test on Threads"},
+}
+
+
+@pytest.fixture
+def fake_apis(monkeypatch, account):
+    """Points the destinations at the local stand-ins for the Graph, Threads and GitHub APIs."""
+    graph = FakeGraphServer(FakeGraphState(image_delay=0.1, seed=1)).start()
+    github = FakeGitHubServer().start()
+    monkeypatch.setattr(settings, "FACEBOOK_API_BASE_URL", graph.base_url)
+    monkeypatch.setattr(settings, "THREADS_API_BASE_URL", graph.base_url)
+    monkeypatch.setattr(settings, "GITHUB_API_BASE_URL", github.base_url)
+    monkeypatch.setattr(settings, "GITHUB_USERNAME", "alice")
+    monkeypatch.setattr(settings, "GITHUB_REPO_NAME", "media")
+    monkeypatch.setattr(settings, "GITHUB_TOKEN", "github-token")
+    # Keep the recording quick; replays skip the waiting anyway
+    monkeypatch.setattr(
+        settings,
+        "POLLING_OPTIONS",
+        {
+            "default": {**settings.POLLING_OPTIONS["default"], "image_initial_delay": 0.1},
+            "instagram": {"reply_delay": 0},
+            "threads": {"publish_delay": 0},
+        },
+    )
+    servers = [graph, github]
+    yield servers
+    for server in servers:
+        server.stop()
+
+
+def _post_all():
+    """Posts both rows and returns their post IDs, as recorded in the journal."""
+    destinations = {
+        "instagram": InstagramDestination("Sheet", "Posts"),
+        "threads": ThreadsDestination("Sheet", "Posts"),
+    }
+    post_ids = {}
+    for platform, destination in destinations.items():
+        assert destination.post(ROWS[platform])
+        post_ids[platform] = destination._journal(ROWS[platform]).get("published")
+    return post_ids
+
+
+def _forget_local_state(monkeypatch, directory):
+    """Starts over with an empty journal, hosted-media cache and quota cache."""
+    publish_journal._connection.close()
+    directory.mkdir()
+    monkeypatch.chdir(directory)
+    monkeypatch.setattr(publish_journal, "_connection", None)
+    monkeypatch.setattr(staging, "_state", None)
+
+
+def test_recorded_posts_replay_without_the_apis(fake_apis, monkeypatch, work_dir):
+    cassette_path = str(work_dir / "cassettes" / "posts.json")
+    with cassettes.cassette(cassette_path, "record") as recorded:
+        recorded_ids = _post_all()
+    assert all(recorded_ids.values())
+
+    # Nothing is listening any more: every request must be answered from the cassette
+    for server in fake_apis:
+        server.stop()
+    fake_apis.clear()
+    _forget_local_state(monkeypatch, work_dir / "replay")
+
+    with cassettes.cassette(cassette_path, "replay") as replayed:
+        assert _post_all() == recorded_ids
+    assert replayed.replayed >= len(recorded.interactions)
+
+    with open(cassette_path, encoding="utf-8") as f:
+        recording = f.read()
+    for secret in ["instagram-token", "threads-token", "github-token"]:
+        assert secret not in recording
+
+
+def _cassette_with(work_dir, url: str) -> str:
+    path = str(work_dir / "cassette.json")
+    interaction = {
+        "request": {"method": "GET", "url": url},
+        "response": {
+            "status": 200,
+            "headers": {"Content-Type": "application/json"},
+            "body": {"json": {"id": "1"}},
+        },
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"version": cassettes.CASSETTE_VERSION, "interactions": [interaction]}, f)
+    return path
+
+
+def test_replay_answers_matching_requests_without_secrets(work_dir):
+    path = _cassette_with(
+        work_dir, "https://graph.example.com/v1/me?fields=id&access_token=REDACTED"
+    )
+    with cassettes.cassette(path, "replay"):
+        response = requests.get(
+            "https://graph.example.com/v1/me", params={"fields": "id", "access_token": "secret"}
+        )
+    assert response.json() == {"id": "1"}
+
+
+@pytest.mark.parametrize(
+    "method, url",
+    [
+        ("GET", "https://graph.example.com/v1/me/media"),
+        ("POST", "https://graph.example.com/v1/me"),
+        ("GET", "https://api.example.com/v1/me"),
+    ],
+)
+def test_replay_fails_for_a_request_without_recording(work_dir, method, url):
+    path = _cassette_with(work_dir, "https://graph.example.com/v1/me")
+    with cassettes.cassette(path, "replay"):
+        with pytest.raises(CassetteMismatch):
+            requests.request(method, url)
+
+
+def test_replay_without_a_cassette_asks_for_a_recording(work_dir):
+    with pytest.raises(FileNotFoundError, match="Record it first"):
+        with cassettes.cassette(str(work_dir / "missing.json"), "replay"):
+            pass
@@ -0,0 +1,254 @@
+import os
+import time
+from collections import Counter
+import pytest
+import lease_keeper
+import main
+from config import settings
+from coordination import redis_store
+from coordination.coordinator import Coordinator
+from coordination.hash_ring import HashRing
+from coordination.redis_store import RedisCoordinationStore
+from coordination.sqlite_store import SQLiteCoordinationStore
+from sources.google_sheets import GoogleSheetsSource
+
+
+class FakeRedis:
+    """
+    The part of the redis-py client the Redis store uses, kept in a dict. Keys expire
+    against time.time, and the store's two Lua scripts run as their Python equivalent.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.expiry = {}
+        self.sorted_sets = {}
+
+    def _get(self, key):
+        if key in self.expiry and self.expiry[key] <= time.time():
+            del self.values[key], self.expiry[key]
+        return self.values.get(key)
+
+    def zadd(self, name, mapping):
+        self.sorted_sets.setdefault(name, {}).update(mapping)
+
+    def zrem(self, name, member):
+        self.sorted_sets.get(name, {}).pop(member, None)
+
+    def zremrangebyscore(self, name, minimum, maximum):
+        members = self.sorted_sets.get(name, {})
+        for member, score in list(members.items()):
+            if float(minimum) <= score <= float(maximum):
+                del members[member]
+
+    def zrange(self, name, start, end):
+        members = self.sorted_sets.get(name, {})
+        return sorted(members, key=members.get)
+
+    def eval(self, script, key_count, key, *args):
+        current = self._get(key)
+        if script == redis_store._CLAIM_SCRIPT:
+            owner, ttl_ms = args
+            if current is not None and current != owner:
+                return 0
+            self.values[key] = owner
+            self.expiry[key] = time.time() + int(ttl_ms) / 1000
+            return 1
+        if script == redis_store._RELEASE_SCRIPT:
+            if current != args[0]:
+                return 0
+            del self.values[key], self.expiry[key]
+            return 1
+        raise NotImplementedError(script)
+
+
+def _real_redis_client():
+    redis = pytest.importorskip("redis")
+    if not os.environ.get("REDIS_URL"):
+        pytest.skip("Set REDIS_URL to run the Redis store against a server")
+    client = redis.Redis.from_url(os.environ["REDIS_URL"], decode_responses=True)
+    for key in client.scan_iter("content-pipeline-test:*"):
+        client.delete(key)
+    return client
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def store(request, clock):
+    if request.param == "sqlite":
+        return SQLiteCoordinationStore("coordination.db")
+    return RedisCoordinationStore(client=FakeRedis())
+
+
+def test_claim_is_exclusive_until_it_expires(store, clock):
+    assert store.claim("row/2", "node-a", 60)
+    assert not store.claim("row/2", "node-b", 60)
+    clock.advance(59)
+    assert not store.claim("row/2", "node-b", 60)
+    clock.advance(2)
+    assert store.claim("row/2", "node-b", 60)
+    assert not store.claim("row/2", "node-a", 60)
+
+
+def test_owner_renews_its_claim(store, clock):
+    assert store.claim("row/2", "node-a", 60)
+    clock.advance(45)
+    assert store.claim("row/2", "node-a", 60)
+    clock.advance(45)
+    assert not store.claim("row/2", "node-b", 60)
+
+
+def test_only_the_owner_releases_a_claim(store, clock):
+    store.claim("row/2", "node-a", 60)
+    assert not store.release("row/2", "node-b")
+    assert store.release("row/2", "node-a")
+    assert store.claim("row/2", "node-b", 60)
+
+
+def test_nodes_drop_out_when_their_heartbeat_expires(store, clock):
+    store.heartbeat("node-a", 30)
+    store.heartbeat("node-b", 90)
+    assert store.live_nodes() == ["node-a", "node-b"]
+    clock.advance(60)
+    assert store.live_nodes() == ["node-b"]
+    store.remove_node("node-b")
+    assert store.live_nodes() == []
+
+
+def test_redis_store_against_a_server():
+    # Expiry runs on the server's clock here, so this one really waits
+    client = _real_redis_client()
+    store = RedisCoordinationStore(key_prefix="content-pipeline-test", client=client)
+    assert store.claim("row/2", "node-a", 1)
+    assert store.claim("row/2", "node-a", 1)
+    assert not store.claim("row/2", "node-b", 1)
+    time.sleep(1.1)
+    assert store.claim("row/2", "node-b", 1)
+    assert store.release("row/2", "node-b")
+
+
+def test_sqlite_store_drops_expired_claims(clock):
+    store = SQLiteCoordinationStore("coordination.db")
+    for row in range(100):
+        store.claim(f"row/{row}", "node-a", 60)
+    clock.advance(61)
+    store.claim("row/new", "node-a", 60)
+    count = store._connect().execute("SELECT COUNT(*) FROM claims").fetchone()[0]
+    assert count == 1
+
+
+def test_hash_ring_spreads_keys_evenly():
+    ring = HashRing(["node-a", "node-b", "node-c"], replicas=64)
+    counts = Counter(ring.node_for(f"Sheet/Worksheet {index}") for index in range(3000))
+    assert set(counts) == {"node-a", "node-b", "node-c"}
+    assert all(700 < count < 1300 for count in counts.values())
+
+
+def test_hash_ring_moves_only_the_keys_of_a_joining_or_leaving_node():
+    keys = [f"Sheet/Worksheet {index}" for index in range(3000)]
+    before = HashRing(["node-a", "node-b", "node-c"])
+    after = HashRing(["node-a", "node-b", "node-c", "node-d"])
+
+    moved = [key for key in keys if before.node_for(key) != after.node_for(key)]
+    assert all(after.node_for(key) == "node-d" for key in moved)
+    assert 0.15 < len(moved) / len(keys) < 0.35
+
+    without_b = HashRing(["node-a", "node-c"])
+    moved = [key for key in keys if before.node_for(key) != without_b.node_for(key)]
+    assert all(before.node_for(key) == "node-b" for key in moved)
+
+
+def test_empty_ring_has_no_owner():
+    assert HashRing([]).node_for("Sheet/Worksheet") is None
+
+
+def test_coordinators_split_worksheets_and_rows(clock):
+    store = SQLiteCoordinationStore("coordination.db")
+    node_a, node_b = Coordinator(store, "node-a"), Coordinator(store, "node-b")
+    store.heartbeat("node-a", 60)
+    store.heartbeat("node-b", 60)
+
+    worksheets = [f"Worksheet {index}" for index in range(20)]
+    owned_by_a = {name for name in worksheets if node_a.owns("Sheet", name)}
+    owned_by_b = {name for name in worksheets if node_b.owns("Sheet", name)}
+    assert owned_by_a and owned_by_b
+    assert owned_by_a | owned_by_b == set(worksheets)
+    assert not owned_by_a & owned_by_b
+
+    posts = [{"row_number": 2, "Text": "a"}, {"row_number": 3, "Text": "b"}]
+    assert node_a.claim_rows("Sheet", "Posts", posts) == posts
+    assert node_b.claim_rows("Sheet", "Posts", posts) == []
+    # Edited content is a different claim
+    assert node_b.claim_rows("Sheet", "Posts", [{"row_number": 2, "Text": "c"}])
+
+
+def test_node_id_is_kept_across_processes():
+    first = Coordinator(SQLiteCoordinationStore("coordination.db"))
+    second = Coordinator(SQLiteCoordinationStore("coordination.db"))
+    assert first.node_id == second.node_id
+    with open(settings.NODE_ID_FILE, encoding="utf-8") as f:
+        assert first.node_id.endswith(":" + f.read())
+
+
+def test_one_shot_run_stays_registered_until_the_next_run(clock, monkeypatch):
+    monkeypatch.setattr(main, "get_sheet_names", lambda: [])
+    monkeypatch.setattr(settings, "MAIN_SCRIPT_RUN_FREQUENCY_MINUTES", 5)
+    main.run_pipeline()
+    store = SQLiteCoordinationStore("coordination.db")
+    node_id = Coordinator(store).node_id
+    clock.advance(5 * 60 + settings.NODE_TTL_SECONDS - 1)
+    assert store.live_nodes() == [node_id]
+    clock.advance(2)
+    assert store.live_nodes() == []
+
+
+def test_loop_keeps_one_registration_across_runs(clock, monkeypatch):
+    monkeypatch.setattr(main, "get_sheet_names", lambda: [])
+    monkeypatch.setattr(main.metrics, "start_http_server", lambda: None)
+    store = SQLiteCoordinationStore("coordination.db")
+    monkeypatch.setattr(main, "create_store", lambda: store)
+    coordinators, live_nodes = [], []
+
+    def run_pipeline(coordinator):
+        coordinators.append(coordinator)
+        live_nodes.append(store.live_nodes())
+        if len(coordinators) == 3:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(main, "run_pipeline", run_pipeline)
+    monkeypatch.setattr(main.time, "sleep", lambda seconds: None)
+    with pytest.raises(KeyboardInterrupt):
+        main.run_forever()
+
+    assert len({id(coordinator) for coordinator in coordinators}) == 1
+    assert live_nodes == [[coordinators[0].node_id]] * 3
+    assert store.live_nodes() == []
+
+
+def test_lease_renewal_leaves_rows_taken_over_by_another_node(
+    memory_sheet, fake_destination, clock, monkeypatch
+):
+    monkeypatch.setattr(settings, "PUBLISH_LEASE_MINUTES", 1)
+    monkeypatch.setattr(main, "datetime", clock.datetime)
+    monkeypatch.setattr(lease_keeper, "datetime", clock.datetime)
+    headers = ["Date", "Time", "Text", "Post on Threads", "Status", "Lease Expiry"]
+    memory_sheet(
+        [headers]
+        + [["2024-05-01", "10:00", f"Post {row}", "TRUE", "Pending", ""] for row in [2, 3, 4]]
+    )
+    source = GoogleSheetsSource("Sheet", "Posts")
+    posts = source.get_data()
+    store = SQLiteCoordinationStore("coordination.db")
+    other_node = Coordinator(store, "node-b")
+
+    def slow_post(content):
+        if content["row_number"] == 2:
+            # The first post outlives the lease and another node claims row 3
+            clock.advance(70)
+            assert other_node.claim_rows("Sheet", "Posts", [posts[1]])
+
+    threads = fake_destination("threads", on_post=slow_post)
+    main.publish_posts(
+        source, posts, threads, fake_destination("instagram"), Coordinator(store, "node-a")
+    )
+
+    assert threads.posted_rows == [2, 4]
@@ -0,0 +1,78 @@
+import pytest
+from PIL import ExifTags, Image
+from config import settings
+from processors import image_processor
+
+
+@pytest.fixture
+def uploads(monkeypatch):
+    """Replaces the GitHub upload and keeps the bytes of every uploaded file."""
+    uploaded = []
+
+    def upload(path):
+        with open(path, "rb") as f:
+            uploaded.append(f.read())
+        return f"https://example.com/{len(uploaded)}.jpg"
+
+    monkeypatch.setattr(image_processor, "upload_to_github", upload)
+    return uploaded
+
+
+@pytest.fixture
+def camera_photo(work_dir):
+    """A small JPEG as a phone saves it: rotated, with camera and GPS tags and XMP."""
+    exif = Image.Exif()
+    exif[ExifTags.Base.Make] = "PhoneMaker"
+    exif[ExifTags.Base.Orientation] = 6
+    exif.get_ifd(ExifTags.IFD.GPSInfo)[ExifTags.GPS.GPSLatitude] = (52.0, 31.0, 12.0)
+    path = work_dir / "photo.jpg"
+    Image.effect_noise((400, 200), 64).convert("RGB").save(
+        path, quality=5, exif=exif.tobytes(), xmp=b"<x:xmpmeta>home</x:xmpmeta>"
+    )
+    return str(path)
+
+
+def _open(data, work_dir):
+    path = work_dir / "uploaded.jpg"
+    path.write_bytes(data)
+    return Image.open(path)
+
+
+def test_uploaded_image_has_no_metadata_even_when_it_is_not_smaller(
+    uploads, camera_photo, work_dir
+):
+    # The tiny original already fits and re-encoding it at a higher quality grows it
+    assert image_processor.process_and_upload_image(camera_photo) == "https://example.com/1.jpg"
+
+    (data,) = uploads
+    assert b"PhoneMaker" not in data and b"xmpmeta" not in data
+    with _open(data, work_dir) as image:
+        assert not image.getexif()
+        assert image.size == (200, 400)  # Rotated upright
+
+
+def test_originals_are_uploaded_without_metadata_when_optimization_is_off(
+    uploads, camera_photo, work_dir, monkeypatch
+):
+    monkeypatch.setattr(settings, "IMAGE_OPTIMIZATION_ENABLED", False)
+
+    assert image_processor.process_and_upload_image(camera_photo)
+
+    (data,) = uploads
+    assert b"PhoneMaker" not in data and b"xmpmeta" not in data
+    with _open(data, work_dir) as image:
+        assert dict(image.getexif()) == {ExifTags.Base.Orientation: 6}
+    # The image data itself is copied unchanged
+    with open(camera_photo, "rb") as f:
+        original = f.read()
+    assert data[data.index(b"\xff\xda") :] == original[original.index(b"\xff\xda") :]
+
+
+def test_image_that_cannot_be_processed_is_not_uploaded(uploads, work_dir, monkeypatch):
+    path = work_dir / "broken.jpg"
+    path.write_bytes(b"\xff\xd8not an image")
+
+    assert image_processor.process_and_upload_image(str(path)) is None
+    monkeypatch.setattr(settings, "IMAGE_OPTIMIZATION_ENABLED", False)
+    assert image_processor.process_and_upload_image(str(path)) is None
+    assert uploads == []
@@ -0,0 +1,150 @@
+import time
+from datetime import datetime, timedelta, timezone
+import pytest
+import lease_keeper
+import main
+from config import settings
+from coordination.coordinator import Coordinator
+from coordination.sqlite_store import SQLiteCoordinationStore
+from destinations.instagram import InstagramDestination
+from destinations.threads import ThreadsDestination
+from graph_client import parse_timestamp
+from publish_journal import PublishJournal
+from sources.google_sheets import GoogleSheetsSource
+
+HEADERS = ["Date", "Time", "Text", "Post on Threads", "Status", "Lease Expiry"]
+
+
+def _row(row_number, status="Pending", lease=""):
+    return ["2024-05-01", "10:00", f"Post {row_number}", "TRUE", status, lease]
+
+
+@pytest.fixture
+def lease_minutes(monkeypatch, clock):
+    monkeypatch.setattr(settings, "PUBLISH_LEASE_MINUTES", 1)
+    monkeypatch.setattr(main, "datetime", clock.datetime)
+    monkeypatch.setattr(lease_keeper, "datetime", clock.datetime)
+
+
+def _cells(source, row_number):
+    values = source.sheet.row_values(row_number)
+    return dict(zip(HEADERS, values + [""] * (len(HEADERS) - len(values))))
+
+
+def test_only_rows_with_an_expired_or_missing_lease_are_reclaimed(memory_sheet, clock):
+    now = clock.datetime.now()
+    memory_sheet(
+        [
+            HEADERS,
+            _row(2, "Publishing", (now - timedelta(minutes=1)).isoformat(timespec="seconds")),
+            _row(3, "Publishing", (now + timedelta(minutes=10)).isoformat(timespec="seconds")),
+            _row(4, "Publishing", ""),
+            _row(5, "Pending", (now - timedelta(minutes=1)).isoformat(timespec="seconds")),
+        ]
+    )
+    source = GoogleSheetsSource("Sheet", "Posts")
+    expired = main.find_expired_leases(source, source.get_data())
+    assert [post["row_number"] for post in expired] == [2, 4]
+
+
+def test_rows_cannot_be_reclaimed_without_a_lease_column(memory_sheet):
+    memory_sheet([HEADERS[:-1], _row(2, "Publishing")[:-1]])
+    source = GoogleSheetsSource("Sheet", "Posts")
+    assert main.find_expired_leases(source, source.get_data()) == []
+
+
+def test_another_node_reclaims_a_row_once_the_lease_expired(memory_sheet, clock, lease_minutes):
+    memory_sheet([HEADERS, _row(2)])
+    store = SQLiteCoordinationStore("coordination.db")
+    source = GoogleSheetsSource("Sheet", "Posts")
+    posts = source.get_data()
+
+    # node-a locks the row and dies without finishing it
+    assert Coordinator(store, "node-a").claim_rows("Sheet", "Posts", posts) == posts
+    expiry = clock.datetime.now() + timedelta(minutes=1)
+    source.update_status_batch([2], settings.STATUS_OPTIONS["publishing"], expiry)
+    node_b = Coordinator(store, "node-b")
+
+    clock.advance(30)
+    posts = source.get_data()
+    assert main.find_expired_leases(source, posts) == []
+    assert node_b.claim_rows("Sheet", "Posts", posts) == []
+
+    clock.advance(31)
+    expired = main.find_expired_leases(source, source.get_data())
+    assert [post["row_number"] for post in expired] == [2]
+    assert node_b.claim_rows("Sheet", "Posts", expired) == expired
+
+
+def test_lease_is_renewed_during_a_slow_post(
+    memory_sheet, fake_destination, clock, lease_minutes, monkeypatch
+):
+    monkeypatch.setattr(settings, "WORKER_HEARTBEAT_SECONDS", 0.01)
+    memory_sheet([HEADERS, _row(2), _row(3)])
+    source = GoogleSheetsSource("Sheet", "Posts")
+    first_lease = {}
+
+    def slow_post(content):
+        if content["row_number"] != 2:
+            return
+        first_lease.update(_cells(source, 2))
+        # The post takes longer than half of the lease; the keeper renews it meanwhile
+        clock.advance(45)
+        for _ in range(500):
+            if _cells(source, 2)["Lease Expiry"] != first_lease["Lease Expiry"]:
+                break
+            time.sleep(0.01)
+        else:
+            pytest.fail("The lease was not renewed during the post")
+
+    threads = fake_destination("threads", on_post=slow_post)
+    store = SQLiteCoordinationStore("coordination.db")
+    main.publish_posts(
+        source,
+        source.get_data(),
+        threads,
+        fake_destination("instagram"),
+        Coordinator(store, "node-a"),
+    )
+
+    assert threads.posted_rows == [2, 3]
+    assert first_lease["Status"] == settings.STATUS_OPTIONS["publishing"]
+    # The final status replaced the lease and no later renewal wrote it back
+    for row_number in [2, 3]:
+        cells = _cells(source, row_number)
+        assert cells["Status"] == settings.STATUS_OPTIONS["published"]
+        assert cells["Lease Expiry"] == ""
+    # The claim was renewed along with the lease
+    clock.advance(40)
+    assert Coordinator(store, "node-b").claim_rows("Sheet", "Posts", source.get_data()[:1]) == []
+
+
+@pytest.mark.parametrize("destination_class", [InstagramDestination, ThreadsDestination])
+def test_recovered_post_keeps_the_time_it_went_live(destination_class):
+    destination = destination_class.__new__(destination_class)
+    destination.sheet_name, destination.worksheet_name = "Sheet", "Posts"
+    destination.find_existing_post = lambda content: {
+        "id": "17890",
+        "timestamp": "2024-05-01T10:00:03+0000",
+    }
+    content = {"row_number": 2, "Text": "Hello"}
+
+    destination.recover(content)
+
+    assert destination._journal(content).get("published") == "17890"
+    assert destination.published_at(content) == parse_timestamp("2024-05-01T10:00:03+0000")
+
+
+def test_api_timestamps_become_local_time():
+    utc = datetime(2024, 5, 1, 10, 0, 3, tzinfo=timezone.utc)
+    assert parse_timestamp("2024-05-01T10:00:03+0000") == utc.astimezone().replace(tzinfo=None)
+    assert parse_timestamp("yesterday") is None
+    assert parse_timestamp(None) is None
+
+
+def test_journal_keeps_a_given_completion_time():
+    content = {"row_number": 2, "Text": "Hello"}
+    completed_at = datetime(2024, 5, 1, 10, 0, 3)
+    PublishJournal("Sheet", "Posts", content, "threads").record("published", "1", completed_at)
+    journal = PublishJournal("Sheet", "Posts", content, "threads")
+    assert journal.recorded_at("published") == completed_at
@@ -0,0 +1,51 @@
+import logging
+import pytest
+from logger_setup import SamplingFilter
+
+
+def _record(message, key="container-status:1", level=logging.INFO):
+    record = logging.LogRecord("test", level, __file__, 1, message, None, None)
+    if key is not None:
+        record.sample_key = key
+    return record
+
+
+@pytest.fixture
+def reported():
+    return []
+
+
+@pytest.fixture
+def sampling(clock, reported):
+    return SamplingFilter(30, reported.append)
+
+
+def test_repeated_messages_pass_once_per_interval(sampling, clock):
+    assert sampling.filter(_record("Waiting... (1)"))
+    clock.advance(10)
+    assert not sampling.filter(_record("Waiting... (2)"))
+    assert not sampling.filter(_record("Waiting... (3)"))
+    assert sampling.filter(_record("Other container", key="container-status:2"))
+    assert sampling.filter(_record("Warning", level=logging.WARNING))
+    clock.advance(25)
+
+    record = _record("Waiting... (4)")
+    assert sampling.filter(record)
+    assert record.getMessage() == "Waiting... (4) (2 similar message(s) suppressed)"
+
+
+def test_idle_keys_are_forgotten_and_their_last_suppressed_messages_reported(
+    sampling, clock, reported
+):
+    for container in range(100):
+        sampling.filter(_record("Waiting... (1)", key=f"container-status:{container}"))
+    clock.advance(5)
+    sampling.filter(_record("Waiting... (2)", key="container-status:7"))
+    sampling.filter(_record("Waiting... (3)", key="container-status:7"))
+    clock.advance(SamplingFilter.EXPIRY_INTERVALS * 30)
+
+    assert sampling.filter(_record("Unrelated message", key=None))
+    assert not sampling._last_emitted and not sampling._suppressed
+    assert [record.getMessage() for record in reported] == [
+        "Waiting... (3) (last of 2 similar message(s) suppressed)"
+    ]
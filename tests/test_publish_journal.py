@@ -0,0 +1,108 @@
+from types import SimpleNamespace
+from datetime import datetime, timedelta
+import pytest
+import main
+import publish_journal
+from config import settings
+from publish_journal import PublishJournal, content_fingerprint
+from sources.google_sheets import GoogleSheetsSource
+
+ROW = {
+    "row_number": 2,
+    "Date": "2024-05-01",
+    "Time": "10:00",
+    "Text": "Hello",
+    "Image URLs": "https://example.com/a.jpg",
+}
+
+
+def test_progress_survives_a_new_journal_for_the_same_row():
+    journal = PublishJournal("Sheet", "Posts", ROW, "instagram")
+    journal.record("media_hosted", ["https://cdn.example.com/a.jpg"])
+    journal.record("parent_container", "1789")
+
+    resumed = PublishJournal("Sheet", "Posts", dict(ROW), "instagram")
+    assert resumed.get("media_hosted") == ["https://cdn.example.com/a.jpg"]
+    assert resumed.get("parent_container") == "1789"
+    assert resumed.get("published") is None
+
+
+def test_steps_are_kept_per_platform_and_row():
+    PublishJournal("Sheet", "Posts", ROW, "instagram").record("published", "1")
+    assert PublishJournal("Sheet", "Posts", ROW, "threads").get("published") is None
+    other_row = {**ROW, "row_number": 3}
+    assert PublishJournal("Sheet", "Posts", other_row, "instagram").get("published") is None
+
+
+def test_old_steps_can_be_ignored(monkeypatch):
+    journal = PublishJournal("Sheet", "Posts", ROW, "instagram")
+    journal.record("child_containers", ["1", "2"])
+    later = datetime.now() + timedelta(hours=25)
+    monkeypatch.setattr(
+        publish_journal,
+        "datetime",
+        SimpleNamespace(now=lambda: later, fromisoformat=datetime.fromisoformat),
+    )
+    assert journal.get("child_containers", max_age_hours=24) is None
+    assert journal.get("child_containers") == ["1", "2"]
+
+
+@pytest.mark.parametrize(
+    "column, value",
+    [("Text", "Hello again"), ("Image URLs", "https://example.com/b.jpg"), ("Date", "2024-05-02"), ("Time", "11:30")],
+)
+def test_editing_or_rescheduling_the_row_discards_its_progress(column, value):
+    PublishJournal("Sheet", "Posts", ROW, "instagram").record("published", "1")
+    edited = {**ROW, column: value}
+
+    assert content_fingerprint(edited) != content_fingerprint(ROW)
+    journal = PublishJournal("Sheet", "Posts", edited, "instagram")
+    assert journal.get("published") is None
+    assert journal.recorded_at("published") is None
+
+
+def test_unrelated_columns_keep_the_fingerprint():
+    assert content_fingerprint({**ROW, "Status": "Publishing"}) == content_fingerprint(ROW)
+
+
+def test_clear_row_forgets_every_platform_of_the_row():
+    PublishJournal("Sheet", "Posts", ROW, "instagram").record("published", "1")
+    PublishJournal("Sheet", "Posts", ROW, "threads").record("published", "2")
+    PublishJournal("Sheet", "Posts", {**ROW, "row_number": 3}, "threads").record("published", "3")
+
+    publish_journal.clear_row("Sheet", "Posts", 2)
+
+    assert PublishJournal("Sheet", "Posts", ROW, "instagram").get("published") is None
+    assert PublishJournal("Sheet", "Posts", ROW, "threads").get("published") is None
+    assert PublishJournal("Sheet", "Posts", {**ROW, "row_number": 3}, "threads").get("published") == "3"
+
+
+def _publish(memory_sheet, fake_destination, instagram_succeeds=True):
+    headers = ["Date", "Time", "Text", "Image URLs", "Post on Instagram", "Post on Threads", "Status"]
+    memory_sheet([headers, ["2024-05-01", "10:00", "Hello", "https://example.com/a.jpg", "TRUE", "TRUE", "Publishing"]])
+    source = GoogleSheetsSource("Sheet", "Posts")
+    item = source.get_data()[0]
+    main.publish_post(
+        source,
+        item,
+        fake_destination("threads"),
+        fake_destination("instagram", instagram_succeeds),
+        coordinator=None,
+        locked_at=datetime.now(),
+    )
+    return source, item
+
+
+def test_published_row_starts_over_when_set_back_to_pending(memory_sheet, fake_destination):
+    source, item = _publish(memory_sheet, fake_destination)
+
+    assert source.sheet.row_values(2)[-1] == settings.STATUS_OPTIONS["published"]
+    assert PublishJournal("Sheet", "Posts", item, "instagram").get("published") is None
+    assert PublishJournal("Sheet", "Posts", item, "threads").get("published") is None
+
+
+def test_partly_published_row_keeps_its_progress(memory_sheet, fake_destination):
+    source, item = _publish(memory_sheet, fake_destination, instagram_succeeds=False)
+
+    assert source.sheet.row_values(2)[-1] == settings.STATUS_OPTIONS["failed"]
+    assert PublishJournal("Sheet", "Posts", item, "threads").get("published") == "17890"
@@ -0,0 +1,38 @@
+import json
+import multiprocessing
+import publishing_quota
+from config import settings
+
+
+def _publish(count):
+    for _ in range(count):
+        publishing_quota.record_publish("alice")
+
+
+def test_publishes_counted_by_several_processes_are_not_lost():
+    assert publishing_quota.get_remaining_quota("alice", lambda: (0, 1000)) == 1000
+
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_publish, args=(50,)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    with open(settings.PUBLISHING_QUOTA_FILE) as f:
+        assert json.load(f)["alice"]["published_since_fetch"] == 200
+    assert publishing_quota.get_remaining_quota("alice", lambda: None) == 800
+
+
+def test_quota_updated_by_another_process_is_read_again():
+    assert publishing_quota.get_remaining_quota("alice", lambda: (0, 10)) == 10
+
+    with open(settings.PUBLISHING_QUOTA_FILE) as f:
+        quotas = json.load(f)
+    quotas["alice"]["published_since_fetch"] = 4
+    with open(settings.PUBLISHING_QUOTA_FILE, "w") as f:
+        json.dump(quotas, f)
+
+    assert publishing_quota.get_remaining_quota("alice", lambda: None) == 6
+    publishing_quota.record_publish("alice")
+    assert publishing_quota.get_remaining_quota("alice", lambda: None) == 5
@@ -0,0 +1,106 @@
+import pytest
+import requests
+from config import settings
+from rate_limiter import RateLimitDeferred, RateLimiter, TokenBucket
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    monkeypatch.setattr(
+        settings,
+        "RATE_LIMIT_BUCKETS",
+        {"app": {"rate_per_minute": 600, "burst": 5}, "account": {"rate_per_minute": 60, "burst": 2}},
+    )
+    monkeypatch.setattr(settings, "RATE_LIMIT_MAX_WAIT_SECONDS", 5)
+    monkeypatch.setattr(settings, "RATE_LIMIT_TARGET_USAGE_PERCENT", 80)
+    return RateLimiter()
+
+
+def _response(status: int, body: str = "{}", headers=None) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response._content = body.encode("utf-8")
+    response.headers.update(headers or {})
+    return response
+
+
+def test_bucket_spends_burst_then_paces_at_rate(clock):
+    bucket = TokenBucket(rate_per_minute=60, burst=3)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve() == pytest.approx(1.0)
+    assert bucket.reserve() == pytest.approx(2.0)
+
+
+def test_bucket_refills_up_to_capacity(clock):
+    bucket = TokenBucket(rate_per_minute=120, burst=2)
+    bucket.reserve()
+    bucket.reserve()
+    clock.advance(0.25)
+    assert bucket.wait_time() == pytest.approx(0.25)
+    clock.advance(60)
+    assert bucket.wait_time() == 0.0
+    assert bucket.tokens == pytest.approx(2.0)
+
+
+def test_wait_time_does_not_take_a_token(clock):
+    bucket = TokenBucket(rate_per_minute=60, burst=1)
+    assert bucket.wait_time() == 0.0
+    assert bucket.wait_time() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.wait_time() == pytest.approx(1.0)
+
+
+def test_acquire_waits_for_the_slowest_bucket(limiter, clock, monkeypatch):
+    slept = []
+    monkeypatch.setattr("time.sleep", slept.append)
+    for _ in range(3):
+        limiter.acquire("graph", "alice")
+    assert slept == [pytest.approx(1.0)]
+
+
+def test_deferred_acquire_does_not_use_up_tokens(limiter, clock, monkeypatch):
+    monkeypatch.setattr("time.sleep", lambda seconds: None)
+    for _ in range(2):
+        limiter.acquire("graph", "alice")
+    app_tokens = limiter._bucket("app:graph").tokens
+    account_tokens = limiter._bucket("account:alice").tokens
+
+    monkeypatch.setattr(settings, "RATE_LIMIT_MAX_WAIT_SECONDS", 0)
+    with pytest.raises(RateLimitDeferred) as deferred:
+        limiter.acquire("graph", "alice")
+
+    assert deferred.value.scope == "account:alice"
+    assert limiter._bucket("app:graph").tokens == pytest.approx(app_tokens)
+    assert limiter._bucket("account:alice").tokens == pytest.approx(account_tokens)
+
+
+def test_blocked_scope_defers_without_using_tokens(limiter, clock):
+    limiter._block("account:alice", 60, "test")
+    with pytest.raises(RateLimitDeferred) as deferred:
+        limiter.acquire("graph", "alice")
+    assert deferred.value.scope == "account:alice"
+    assert deferred.value.retry_after_seconds == pytest.approx(60)
+    assert limiter._bucket("app:graph").tokens == pytest.approx(5)
+
+
+def test_usage_above_target_slows_the_bucket_down(limiter, clock):
+    limiter.record_response(
+        "graph", "alice", _response(200, headers={"X-App-Usage": '{"call_count": 90}'})
+    )
+    bucket = limiter._bucket("app:graph")
+    assert bucket.rate == pytest.approx(bucket.base_rate * 0.5)
+
+    limiter.record_response(
+        "graph", "alice", _response(200, headers={"X-App-Usage": '{"call_count": 10}'})
+    )
+    assert bucket.rate == pytest.approx(bucket.base_rate)
+
+
+def test_rate_limit_error_blocks_the_account(limiter, clock):
+    with pytest.raises(RateLimitDeferred) as deferred:
+        limiter.record_response(
+            "graph", "alice", _response(400, '{"error": {"code": 17}}', {"Retry-After": "120"})
+        )
+    assert deferred.value.scope == "account:alice"
+    assert limiter._blocked_for("account:alice") == pytest.approx(120)
+    assert limiter._blocked_for("app:graph") == 0.0
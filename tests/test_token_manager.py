@@ -0,0 +1,55 @@
+import json
+import multiprocessing
+import os
+import pytest
+import token_manager
+from config import settings
+
+
+@pytest.fixture
+def token_file(monkeypatch, work_dir):
+    monkeypatch.setattr(settings, "TOKEN_BACKEND", "json")
+    monkeypatch.setattr(settings, "TOKEN_FILE", str(work_dir / "token_storage.json"))
+    token_manager.save_tokens({})
+    return settings.TOKEN_FILE
+
+
+def _token(number):
+    return {"access_token": f"token-{number}", "user_id": str(number)}
+
+
+def _update_accounts(first, count):
+    for number in range(first, first + count):
+        token_manager.update_tokens({("Sheet", f"Worksheet {number}", "threads"): _token(number)})
+
+
+def test_updates_from_several_processes_are_all_kept(token_file):
+    context = multiprocessing.get_context("fork")
+    workers = [
+        context.Process(target=_update_accounts, args=(first, 20)) for first in (0, 20, 40)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert len(token_manager.get_worksheet_names("Sheet")) == 60
+    assert token_manager.get_token("Sheet", "Worksheet 45", "threads") == _token(45)
+
+
+def test_cache_never_takes_the_signature_of_a_file_written_by_another_process(
+    token_file, monkeypatch
+):
+    replace = os.replace
+
+    def replace_then_other_process_saves(source, destination):
+        replace(source, destination)
+        monkeypatch.setattr(os, "replace", replace)
+        with open(f"{token_file}.other", "w") as f:
+            json.dump({"Sheet": {"Posts": {"threads": _token(2)}}}, f)
+        replace(f"{token_file}.other", token_file)
+
+    monkeypatch.setattr(os, "replace", replace_then_other_process_saves)
+    token_manager.update_tokens({("Sheet", "Posts", "threads"): _token(1)})
+
+    assert token_manager.get_token("Sheet", "Posts", "threads") == _token(2)
@@ -0,0 +1,104 @@
+import json
+import multiprocessing
+import threading
+import time
+import pytest
+import requests
+import graph_client
+import refresh_token
+import token_manager
+from graph_client import GraphClient
+from rate_limiter import RateLimiter
+
+ME_URL = "https://graph.example.com/v1/me"
+
+
+def _response(status_code, body):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(body).encode("utf-8")
+    return response
+
+
+@pytest.fixture
+def refreshes(account, monkeypatch):
+    """Replaces the refresh call; every refresh is slow and appended to refreshes.log."""
+
+    def refresh_single_token(platform, token_data):
+        with open("refreshes.log", "a") as f:
+            f.write(f"{token_data['access_token']}\n")
+        time.sleep(0.2)  # Long enough for the other requests to fail meanwhile
+        return {
+            "access_token": f"{token_data['access_token']}-refreshed",
+            "user_id": token_data["user_id"],
+            "expiry_date": token_manager.calculate_expiry_date(3600),
+        }
+
+    monkeypatch.setattr(refresh_token, "refresh_single_token", refresh_single_token)
+
+    def read():
+        with open("refreshes.log") as f:
+            return f.read().splitlines()
+
+    return read
+
+
+@pytest.fixture
+def graph_api(monkeypatch):
+    """Rejects the original token with code 190 and records the token of every request."""
+    tokens = []
+    # Starts with full buckets, whatever earlier tests sent for the account
+    monkeypatch.setattr(graph_client, "rate_limiter", RateLimiter())
+
+    def request(method, url, **kwargs):
+        token = kwargs["params"]["access_token"]
+        tokens.append(token)
+        if token == "instagram-token":
+            return _response(400, {"error": {"code": 190, "message": "Session expired"}})
+        return _response(200, {"id": "1784000111"})
+
+    monkeypatch.setattr(graph_client.session, "request", request)
+    return tokens
+
+
+def test_concurrent_auth_failures_refresh_once_and_retry_with_the_new_token(
+    refreshes, graph_api
+):
+    responses = []
+
+    def call():
+        client = GraphClient("instagram", "1784000111", "instagram-token", "Sheet", "Posts")
+        responses.append(client.get(ME_URL, params={"access_token": client.access_token}))
+
+    threads = [threading.Thread(target=call) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert refreshes() == ["instagram-token"]
+    assert [response.status_code for response in responses] == [200] * 5
+    assert graph_api.count("instagram-token") == 5
+    assert graph_api.count("instagram-token-refreshed") == 5
+    saved = token_manager.get_token("Sheet", "Posts", "instagram")
+    assert saved["access_token"] == "instagram-token-refreshed"
+
+
+def _refresh_in_process(index):
+    token = refresh_token.refresh_account_token("Sheet", "Posts", "instagram", "instagram-token")
+    with open(f"result-{index}", "w") as f:
+        f.write(token or "")
+
+
+def test_processes_share_a_single_refresh(refreshes):
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_refresh_in_process, args=(index,)) for index in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert refreshes() == ["instagram-token"]
+    for index in range(3):
+        with open(f"result-{index}") as f:
+            assert f.read() == "instagram-token-refreshed"
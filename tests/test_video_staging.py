@@ -0,0 +1,207 @@
+import os
+import time
+from datetime import datetime, timedelta
+import pytest
+import main
+from config import settings
+from coordination.coordinator import Coordinator
+from coordination.sqlite_store import SQLiteCoordinationStore
+from destinations.instagram import InstagramDestination
+from processors import video_processor
+from processors.video_processor import discard_converted_video, prepare_local_video
+from sources.google_sheets import GoogleSheetsSource
+
+
+@pytest.fixture
+def conversions(monkeypatch):
+    """Replaces ffprobe/ffmpeg: every video is portrait (9:16) and conversions are recorded."""
+    converted = []
+
+    def convert(input_path, output_path, time_budget_seconds=None):
+        profile_name, _ = video_processor.select_encoding_profile(time_budget_seconds)
+        converted.append(profile_name)
+        with open(output_path, "wb") as f:
+            f.write(f"{input_path}:{profile_name}".encode("utf-8"))
+        return True
+
+    monkeypatch.setattr(
+        video_processor, "get_video_properties", lambda path: {"width": 1080, "height": 1920}
+    )
+    monkeypatch.setattr(video_processor, "convert_video_for_instagram", convert)
+    return converted
+
+
+@pytest.fixture
+def video(work_dir):
+    path = work_dir / "clip.mp4"
+    path.write_bytes(b"portrait video")
+    return str(path)
+
+
+def test_conversion_is_kept_and_reused_whatever_the_time_left(conversions, video):
+    path, profile_name = prepare_local_video(video, time_budget_seconds=2 * 3600)
+    assert profile_name == "compact"
+    assert os.path.dirname(path) == settings.CONVERTED_VIDEO_DIR
+    assert os.path.exists(path)
+
+    # Due now, which would pick the "fast" profile; the earlier conversion is used instead
+    assert prepare_local_video(video, time_budget_seconds=0) == (path, "compact")
+    assert conversions == ["compact"]
+
+    discard_converted_video(path)
+    assert not os.path.exists(path)
+    assert prepare_local_video(video, time_budget_seconds=0)[1] == "fast"
+
+
+def test_compliant_videos_are_never_deleted(conversions, video, monkeypatch):
+    monkeypatch.setattr(
+        video_processor, "get_video_properties", lambda path: {"width": 1080, "height": 1080}
+    )
+    assert prepare_local_video(video) == (video, None)
+    discard_converted_video(video)
+    assert os.path.exists(video)
+
+
+def test_expired_conversions_are_removed(conversions, video):
+    path, _ = prepare_local_video(video, time_budget_seconds=2 * 3600)
+    old = time.time() - (settings.STAGING_CONTAINER_TTL_HOURS + 1) * 3600
+    os.utime(path, (old, old))
+    assert prepare_local_video(video, time_budget_seconds=0)[1] == "fast"
+    assert not os.path.exists(path)
+
+
+class UploadRecorder:
+    """Stands in for the resumable upload; fails the first `failures` uploads."""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.uploads = []
+
+    def __call__(self, local_path, is_carousel_item=False, caption="", upload_key=None):
+        self.uploads.append(
+            {
+                "path": local_path,
+                "carousel_item": is_carousel_item,
+                "caption": caption,
+                "key": upload_key,
+            }
+        )
+        assert os.path.exists(local_path)
+        if self.failures:
+            self.failures -= 1
+            return None
+        return f"container-{len(self.uploads)}"
+
+
+@pytest.fixture
+def instagram(account, monkeypatch):
+    destination = InstagramDestination("Sheet", "Posts")
+    destination._upload_video_from_local_file = UploadRecorder()
+    monkeypatch.setattr(
+        destination, "_check_container_status", lambda container_id, *args: container_id
+    )
+    monkeypatch.setattr(
+        destination, "_upload_media_and_get_container_id", lambda url, is_video: f"item:{url}"
+    )
+    return destination
+
+
+def test_interrupted_carousel_upload_resumes_with_the_same_file_and_session(
+    instagram, conversions, video
+):
+    instagram._upload_video_from_local_file = UploadRecorder(failures=1)
+
+    assert instagram._upload_local_carousel_video(video, 2 * 3600) is None
+    assert instagram._upload_local_carousel_video(video, 0) == "container-2"
+
+    first, second = instagram._upload_video_from_local_file.uploads
+    assert first["key"] == second["key"]
+    assert first["key"].endswith(":compact")
+    assert first["path"] == second["path"]
+    assert conversions == ["compact"]
+    # Kept until the upload finished, then deleted
+    assert not os.path.exists(second["path"])
+
+
+def test_staging_starts_the_upload_of_a_single_local_video(instagram, video):
+    assert not settings.STAGING_PRECREATE_CONTAINERS and settings.INSTAGRAM_DIRECT_VIDEO_UPLOAD
+    content = {"row_number": 2, "Text": "Clip", settings.LOCAL_VIDEO_PATH_COLUMN_NAME: video}
+
+    assert instagram.stage(content)
+    assert instagram.stage(content)
+
+    uploads = instagram._upload_video_from_local_file.uploads
+    assert [upload["caption"] for upload in uploads] == ["Clip"]
+    assert instagram._journal(content).get("parent_container") == "container-1"
+
+
+def test_staging_uploads_local_carousel_videos_as_items(instagram, conversions, video):
+    content = {
+        "row_number": 2,
+        "Text": "Carousel",
+        settings.IMAGE_URLS_COLUMN_NAME: "https://example.com/a.jpg",
+        settings.LOCAL_VIDEO_PATH_COLUMN_NAME: video,
+    }
+
+    assert instagram.stage(content)
+
+    journal = instagram._journal(content)
+    assert journal.get("child_containers") == {
+        "0": "item:https://example.com/a.jpg",
+        "1": "container-1",
+    }
+    assert journal.get("parent_container") is None
+    assert instagram._upload_video_from_local_file.uploads[0]["carousel_item"]
+
+
+def test_staging_without_local_videos_only_hosts_media(instagram):
+    content = {
+        "row_number": 2,
+        "Text": "Image",
+        settings.IMAGE_URLS_COLUMN_NAME: "https://example.com/a.jpg",
+    }
+
+    assert instagram.stage(content)
+
+    assert instagram._journal(content).get("media_hosted") is None
+    assert instagram._upload_video_from_local_file.uploads == []
+
+
+def test_staging_waits_for_all_worksheets_and_skips_rows_claimed_elsewhere(
+    memory_sheet, fake_destination, monkeypatch
+):
+    headers = ["Date", "Time", "Text", "Post on Threads", "Status", "Lease Expiry"]
+    now = datetime.now()
+    due = (now - timedelta(hours=1)).strftime("%d.%m.%Y %H:%M")
+    soon = (now + timedelta(minutes=10)).strftime("%d.%m.%Y %H:%M")
+    memory_sheet(
+        [headers]
+        + [[soon, soon, f"Soon {row}", "TRUE", "Pending", ""] for row in [2, 3]],
+        worksheet_name="First",
+    )
+    memory_sheet([headers, [due, due, "Due", "TRUE", "Pending", ""]], worksheet_name="Second")
+    monkeypatch.setattr(main, "get_sheet_names", lambda: ["Sheet"])
+    monkeypatch.setattr(main, "get_worksheet_names", lambda sheet_name: ["First", "Second"])
+    # Another node already staged row 3
+    other_node = Coordinator(SQLiteCoordinationStore("coordination.db"), "node-b")
+    assert other_node.claim_rows(
+        "Sheet", "First", [GoogleSheetsSource("Sheet", "First").get_data()[1]]
+    )
+
+    events = []
+
+    class Destination(fake_destination):
+        def post(self, content):
+            events.append(("post", content["Text"]))
+            return super().post(content)
+
+        def stage(self, content):
+            events.append(("stage", content["Text"]))
+            return True
+
+    threads = Destination("threads")
+    monkeypatch.setattr(main, "ThreadsDestination", lambda **kwargs: threads)
+    monkeypatch.setattr(main, "InstagramDestination", lambda **kwargs: Destination("instagram"))
+    main.run_pipeline()
+
+    assert events == [("post", "Due"), ("stage", "Soon 2")]
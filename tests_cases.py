@@ -1,18 +1,53 @@
+"""
+Posts every test case below through the Instagram and Threads destinations.
+
+    python tests_cases.py                  # Replay the recorded cassettes, offline
+    python tests_cases.py --record         # Post for real and record new cassettes
+    python tests_cases.py --live           # Post for real without recording
+    python tests_cases.py --only test_threads_text_only
+
+Recording and live runs post with the account of --sheet/--worksheet (default: the first
+one in the token storage) and ask for confirmation after each test. Every test runs in its
+own process and working directory, so no journal or hosted-media cache carries over.
+"""
+
+import argparse
+import json
+import os
+import subprocess
 import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# Replays send no request, so they run without a .env; the settings still require these
+if __name__ == "__main__" and not {"--record", "--live"} & set(sys.argv):
+    os.environ.setdefault("APP_CLIENT_ID", "replay")
+    os.environ.setdefault("APP_CLIENT_SECRET", "replay")
+
+import cassettes
+import token_manager
+from config import settings
 from destinations.threads import ThreadsDestination
 from destinations.instagram import InstagramDestination
 
 # --- 1. CONFIGURATION: Verify these paths are correct ---
 # NOTE: These lists are now only used to populate the flat strings in test_cases below.
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
 images_list = [
-    "./test_image1.jpg",
-    "./test_image2.jpg",
+    os.path.join(TESTS_DIR, "test_image1.jpg"),
+    os.path.join(TESTS_DIR, "test_image2.jpg"),
 ]
 videos_list = [
-    "./test_video1.mp4",
-    "./test_video2.mp4",
+    os.path.join(TESTS_DIR, "test_video1.mp4"),
+    os.path.join(TESTS_DIR, "test_video2.mp4"),
 ]
 
+# One cassette per test, plus the (non-secret) ids of the account they were recorded with
+CASSETTE_DIR = os.path.join(TESTS_DIR, "cassettes")
+RECORDED_ACCOUNT_FILE = os.path.join(CASSETTE_DIR, "account.json")
+REPLAY_SHEET_NAME = "Replay"
+REPLAY_WORKSHEET_NAME = "Replay"
+
 # --- 2. DATA PREPARATION ---
 # Define column names for clarity
 TEXT_COLUMN_NAME = "Text"
@@ -88,6 +123,10 @@ test_cases = {
     },
 }
 
+# Rows read from a sheet carry their row number, which the publish journal is keyed by
+for row_number, content in enumerate(test_cases.values(), start=2):
+    content["row_number"] = row_number
+
 
 # --- 3. PARSER FUNCTION ---
 def parse_content(flat_content: dict) -> dict:
@@ -136,113 +175,229 @@ def parse_content(flat_content: dict) -> dict:
 
 
 # --- 4. TEST IMPLEMENTATION ---
-# Instantiate destinations once
-inst_dest = InstagramDestination()
-thr_dest = ThreadsDestination()
+# Created by setup_destinations() for the account the tests post with
+inst_dest = None
+thr_dest = None
+
+
+def setup_destinations(sheet_name: str, worksheet_name: str):
+    global inst_dest, thr_dest
+    inst_dest = InstagramDestination(sheet_name=sheet_name, worksheet_name=worksheet_name)
+    thr_dest = ThreadsDestination(sheet_name=sheet_name, worksheet_name=worksheet_name)
 
 
 # --- Instagram Tests ---
 def test_instagram_text_with_image():
     print("\n--- 📸 [Instagram] Testing: Text with Single Image ---")
     content = test_cases["ig_text_with_image"]
-    inst_dest.post(content)
+    return inst_dest.post(content)
 
 
 def test_instagram_text_with_video():
     print("\n--- 🎬 [Instagram] Testing: Text with Single Video ---")
     content = test_cases["ig_text_with_video"]
-    inst_dest.post(content)
+    return inst_dest.post(content)
 
 
 def test_instagram_image_only():
     print("\n--- 🖼️ [Instagram] Testing: Image Only ---")
     content = test_cases["ig_image_only"]
-    inst_dest.post(content)
+    return inst_dest.post(content)
 
 
 def test_instagram_two_images_carousel():
     print("\n--- 🖼️🖼️ [Instagram] Testing: Two-Image Carousel ---")
     content = test_cases["ig_two_images_carousel"]
-    inst_dest.post(content)
+    return inst_dest.post(content)
 
 
 def test_instagram_two_videos_carousel():
     print("\n--- 🖼️🎬 [Instagram] Testing: Two-Video Carousel ---")
     content = test_cases["ig_two_videos_carousel"]
-    inst_dest.post(content)
+    return inst_dest.post(content)
 
 
 def test_instagram_mixed_media_carousel():
     print("\n--- 🖼️🎬 [Instagram] Testing: Mixed-Media (Image + Video) Carousel ---")
     content = test_cases["ig_mixed_media_carousel"]
-    inst_dest.post(content)
+    return inst_dest.post(content)
 
 
 # --- Threads Tests ---
 def test_threads_text_only():
     print("\n--- ✍️ [Threads] Testing: Text Only ---")
     content = test_cases["threads_text_only"]
-    thr_dest.post(content)
+    return thr_dest.post(content)
 
 
 def test_threads_text_with_image():
     print("\n--- ✍️📸 [Threads] Testing: Text with Single Image ---")
     content = test_cases["threads_text_with_image"]
-    thr_dest.post(content)
+    return thr_dest.post(content)
 
 
 def test_threads_text_with_video():
     print("\n--- ✍️🎬 [Threads] Testing: Text with Single Video ---")
     content = test_cases["threads_text_with_video"]
-    thr_dest.post(content)
+    return thr_dest.post(content)
 
 
 def test_threads_two_images_carousel():
     print("\n--- 📸📸 [Threads] Testing: Two-Image Carousel ---")
     content = test_cases["threads_two_images_carousel"]
-    thr_dest.post(content)
+    return thr_dest.post(content)
 
 
 def test_threads_two_videos_carousel():
     print("\n--- 🎬🎬 [Threads] Testing: Two-Video Carousel ---")
     content = test_cases["threads_two_videos_carousel"]
-    thr_dest.post(content)
+    return thr_dest.post(content)
 
 
 def test_threads_mixed_media_carousel():
     print("\n--- 🖼️🎬 [Threads] Testing: Mixed-Media (Image + Video) Carousel ---")
-    content = test_cases["ig_mixed_media_carousel"]
-    thr_dest.post(content)
+    content = test_cases["threads_mixed_media_carousel"]
+    return thr_dest.post(content)
 
 
 # --- 5. TEST RUNNER ---
-def run_all_tests():
+all_tests = [
+    test_instagram_text_with_image,
+    test_instagram_text_with_video,
+    test_instagram_image_only,
+    test_instagram_two_images_carousel,
+    test_instagram_two_videos_carousel,  # Works when croped
+    test_instagram_mixed_media_carousel,  # Works when croped
+    test_threads_text_only,
+    test_threads_text_with_image,
+    test_threads_text_with_video,
+    test_threads_two_images_carousel,
+    test_threads_two_videos_carousel,
+    test_threads_mixed_media_carousel,
+]
+
+
+def missing_media(test_func) -> list:
+    """Returns the local media files of a test that do not exist."""
+    case_name = test_func.__name__.replace("test_instagram_", "ig_").replace("test_", "")
+    content = test_cases[case_name]
+    paths = []
+    for key in [LOCAL_IMAGE_PATH_COLUMN_NAME, LOCAL_VIDEO_PATH_COLUMN_NAME]:
+        paths.extend(path.strip() for path in content.get(key, "").split(",") if path.strip())
+    return [path for path in paths if not os.path.exists(path)]
+
+
+def cassette_path(test_func) -> str:
+    return os.path.join(CASSETTE_DIR, f"{test_func.__name__}.json")
+
+
+def save_recorded_account():
+    """Stores the ids that appear in the recorded URLs, so replays can use the same ones."""
+    os.makedirs(CASSETTE_DIR, exist_ok=True)
+    with open(RECORDED_ACCOUNT_FILE, "w") as f:
+        json.dump(
+            {
+                "instagram_user_id": inst_dest.user_id,
+                "threads_user_id": thr_dest.user_id,
+                "github_username": settings.GITHUB_USERNAME,
+                "github_repo_name": settings.GITHUB_REPO_NAME,
+            },
+            f,
+            indent=4,
+        )
+
+
+def use_recorded_account():
+    """Sets up a placeholder account with the ids the cassettes were recorded with."""
+    with open(RECORDED_ACCOUNT_FILE) as f:
+        account = json.load(f)
+    settings.GITHUB_USERNAME = account["github_username"]
+    settings.GITHUB_REPO_NAME = account["github_repo_name"]
+    settings.GITHUB_TOKEN = "replay"
+    settings.TOKEN_BACKEND = "json"
+    settings.TOKEN_FILE = os.path.abspath("token_storage.json")
+    expiry_date = (datetime.now() + timedelta(days=60)).isoformat()
+    token_manager.save_tokens(
+        {
+            REPLAY_SHEET_NAME: {
+                REPLAY_WORKSHEET_NAME: {
+                    platform: {
+                        "access_token": "replay",
+                        "user_id": account[f"{platform}_user_id"],
+                        "expiry_date": expiry_date,
+                    }
+                    for platform in ["instagram", "threads"]
+                }
+            }
+        }
+    )
+
+
+def run_child(args) -> bool:
+    """Runs one test in this process (started by run_test) inside the cassette."""
+    settings.TOKEN_FILE = os.path.abspath(settings.TOKEN_FILE)
+    settings.TOKEN_DB_FILE = os.path.abspath(settings.TOKEN_DB_FILE)
+    # A fresh journal, hosted-media cache and quota cache for every test
+    os.chdir(args.work_dir)
+    if args.mode == "replay":
+        use_recorded_account()
+        setup_destinations(REPLAY_SHEET_NAME, REPLAY_WORKSHEET_NAME)
+    else:
+        setup_destinations(args.sheet, args.worksheet)
+        if args.mode == "record":
+            save_recorded_account()
+    test_func = next(test for test in all_tests if test.__name__ == args.child)
+    with cassettes.cassette(cassette_path(test_func), args.mode):
+        return bool(test_func())
+
+
+def run_test(test_func, args) -> bool:
+    """Runs a test in a child process; replays only show its output when it fails."""
+    with tempfile.TemporaryDirectory(prefix="destination-test-") as work_dir:
+        command = [
+            sys.executable, os.path.abspath(__file__), "--child", test_func.__name__,
+            "--work-dir", work_dir, "--sheet", args.sheet, "--worksheet", args.worksheet,
+        ]
+        if args.mode != "replay":
+            command.append(f"--{args.mode}")
+        quiet = args.mode == "replay" and not args.verbose
+        completed = subprocess.run(command, capture_output=quiet, text=True)
+    if completed.returncode != 0 and quiet:
+        print(completed.stdout)
+        print(completed.stderr)
+    return completed.returncode == 0
+
+
+def run_all_tests(args):
     """
-    Runs a series of tests sequentially, asking for user confirmation after each.
+    Runs the tests one after another. Live and recording runs ask for confirmation after
+    each test, since only a look at the account shows whether the post came out right.
     """
-    all_tests = [
-        test_instagram_text_with_image,
-        test_instagram_text_with_video,
-        test_instagram_image_only,
-        test_instagram_two_images_carousel,
-        test_instagram_two_videos_carousel,  # Works when croped
-        test_instagram_mixed_media_carousel,  # Works when croped
-        test_threads_text_only,
-        test_threads_text_with_image,
-        test_threads_text_with_video,
-        test_threads_two_images_carousel,
-        test_threads_two_videos_carousel,
-        test_threads_mixed_media_carousel,
-    ]
-    print("🚀 Starting automated posting tests...")
-    for i, test_func in enumerate(all_tests, 1):
-        try:
-            test_func()
-            print(f"✅ Test [{i}/{len(all_tests)}] API call executed.")
-        except Exception as e:
-            print(f"❌ ERROR during '{test_func.__name__}': {e}")
+    tests = [test for test in all_tests if not args.only or test.__name__ in args.only]
+    print(f"🚀 Starting posting tests ({args.mode})...")
+    failed, ran = [], 0
+    for i, test_func in enumerate(tests, 1):
+        missing = missing_media(test_func)
+        if missing:
+            print(f"⏭️ Test [{i}/{len(tests)}] '{test_func.__name__}' skipped, missing {missing}.")
+            continue
+        if args.mode == "replay" and not os.path.exists(cassette_path(test_func)):
+            print(
+                f"⏭️ Test [{i}/{len(tests)}] '{test_func.__name__}' skipped, it has no cassette "
+                "yet. Record it with --record."
+            )
+            continue
+        if not run_test(test_func, args):
+            print(f"❌ ERROR during '{test_func.__name__}'.")
+            if args.mode == "replay":
+                failed.append(test_func.__name__)
+                continue
             print("Stopping tests due to error.")
-            break
+            return False
+        print(f"✅ Test [{i}/{len(tests)}] '{test_func.__name__}' API calls executed.")
+        ran += 1
+        if args.mode == "replay":
+            continue
 
         while True:
             confirm = input("   succeeded? (y/n): ").lower().strip()
@@ -252,10 +407,43 @@ def run_all_tests():
 
         if confirm == "n":
             print("🛑 Tests stopped by user.")
-            break
-    else:
-        print("\n🎉 All tests completed successfully!")
+            return False
+    if failed:
+        print(f"\n❌ {len(failed)} test(s) failed: {failed}")
+        return False
+    if not ran:
+        print("\n⚠️ No test ran.")
+        return True
+    print("\n🎉 All tests completed successfully!")
+    return True
+
+
+def default_account() -> tuple:
+    """Returns the first sheet and worksheet in the token storage."""
+    sheet_names = token_manager.get_sheet_names()
+    if not sheet_names:
+        return "", ""
+    worksheet_names = token_manager.get_worksheet_names(sheet_names[0])
+    return sheet_names[0], worksheet_names[0] if worksheet_names else ""
 
 
 if __name__ == "__main__":
-    run_all_tests()
+    arg_parser = argparse.ArgumentParser(description="Posts the destination test cases.")
+    mode_group = arg_parser.add_mutually_exclusive_group()
+    mode_group.add_argument("--record", dest="mode", action="store_const", const="record")
+    mode_group.add_argument("--live", dest="mode", action="store_const", const="live")
+    arg_parser.set_defaults(mode="replay")
+    arg_parser.add_argument("--sheet", help="Sheet of the account to post with.")
+    arg_parser.add_argument("--worksheet", help="Worksheet of the account to post with.")
+    arg_parser.add_argument("--only", nargs="+", help="Names of the tests to run.")
+    arg_parser.add_argument("--verbose", action="store_true", help="Show the output of replays.")
+    arg_parser.add_argument("--child", help=argparse.SUPPRESS)
+    arg_parser.add_argument("--work-dir", help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.child:
+        sys.exit(0 if run_child(args) else 1)
+    if args.mode != "replay" and not (args.sheet and args.worksheet):
+        args.sheet, args.worksheet = default_account()
+    args.sheet, args.worksheet = args.sheet or "", args.worksheet or ""
+    sys.exit(0 if run_all_tests(args) else 1)
@@ -0,0 +1,179 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from logger_setup import log
+from config import settings
+
+# SQLite token backend (TOKEN_BACKEND=sqlite). Every account token is its own row, so a
+# refresh only touches the tokens it renewed, and `expiry_date` is indexed so the
+# refresh job can select just the tokens that expire soon. WAL mode lets the pipeline
+# read tokens while the refresh job writes.
+_lock = threading.Lock()
+_connection: Optional[sqlite3.Connection] = None
+
+TokenKey = Tuple[str, str, str]  # (sheet_name, worksheet_name, platform)
+
+
+def _connect() -> sqlite3.Connection:
+    global _connection
+    if _connection is None:
+        needs_migration = not os.path.exists(settings.TOKEN_DB_FILE)
+        _connection = sqlite3.connect(
+            settings.TOKEN_DB_FILE, timeout=30, check_same_thread=False
+        )
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tokens (
+                sheet_name TEXT NOT NULL,
+                worksheet_name TEXT NOT NULL,
+                platform TEXT NOT NULL,
+                expiry_date TEXT,
+                data TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (sheet_name, worksheet_name, platform)
+            )
+            """
+        )
+        _connection.execute(
+            "CREATE INDEX IF NOT EXISTS tokens_by_expiry ON tokens (expiry_date)"
+        )
+        _connection.commit()
+        if needs_migration and os.path.exists(settings.TOKEN_FILE):
+            _migrate_from_json(_connection)
+    return _connection
+
+
+def _rows(all_tokens: Dict) -> List[tuple]:
+    now = datetime.now().isoformat()
+    return [
+        (
+            sheet_name,
+            worksheet_name,
+            platform,
+            token_data.get("expiry_date"),
+            json.dumps(token_data),
+            now,
+        )
+        for sheet_name, sheet_data in all_tokens.items()
+        for worksheet_name, worksheet_data in sheet_data.items()
+        for platform, token_data in worksheet_data.items()
+    ]
+
+
+def _migrate_from_json(connection: sqlite3.Connection) -> int:
+    try:
+        with open(settings.TOKEN_FILE, "r") as f:
+            all_tokens = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        log.error(f"Could not read {settings.TOKEN_FILE} for migration: {e}")
+        return 0
+    rows = _rows(all_tokens)
+    connection.executemany(
+        "INSERT OR REPLACE INTO tokens VALUES (?, ?, ?, ?, ?, ?)", rows
+    )
+    connection.commit()
+    log.info(
+        f"Migrated {len(rows)} token(s) from {settings.TOKEN_FILE} to {settings.TOKEN_DB_FILE}."
+    )
+    return len(rows)
+
+
+def migrate_from_json() -> int:
+    """Copies every token from the JSON token file into the database (overwriting)."""
+    with _lock:
+        return _migrate_from_json(_connect())
+
+
+def load_tokens() -> Dict:
+    """Returns all tokens in the nested sheet -> worksheet -> platform layout."""
+    with _lock:
+        rows = _connect().execute(
+            "SELECT sheet_name, worksheet_name, platform, data FROM tokens"
+        ).fetchall()
+    all_tokens: Dict = {}
+    for sheet_name, worksheet_name, platform, data in rows:
+        all_tokens.setdefault(sheet_name, {}).setdefault(worksheet_name, {})[
+            platform
+        ] = json.loads(data)
+    return all_tokens
+
+
+def get_token(sheet_name: str, worksheet_name: str, platform: str) -> Dict:
+    with _lock:
+        row = _connect().execute(
+            """
+            SELECT data FROM tokens
+            WHERE sheet_name = ? AND worksheet_name = ? AND platform = ?
+            """,
+            (sheet_name, worksheet_name, platform),
+        ).fetchone()
+    return json.loads(row[0]) if row else {}
+
+
+def get_sheet_names() -> List[str]:
+    with _lock:
+        rows = _connect().execute(
+            "SELECT DISTINCT sheet_name FROM tokens ORDER BY sheet_name"
+        ).fetchall()
+    return [row[0] for row in rows]
+
+
+def get_worksheet_names(sheet_name: Optional[str] = None) -> List[str]:
+    query = "SELECT DISTINCT sheet_name, worksheet_name FROM tokens"
+    params: tuple = ()
+    if sheet_name:
+        query += " WHERE sheet_name = ?"
+        params = (sheet_name,)
+    with _lock:
+        rows = _connect().execute(f"{query} ORDER BY sheet_name, worksheet_name", params)
+        rows = rows.fetchall()
+    return [row[1] for row in rows]
+
+
+def get_expiring_tokens(before: datetime) -> List[Tuple[TokenKey, Dict]]:
+    """Returns the tokens that expire before the given time (uses the expiry index)."""
+    with _lock:
+        rows = _connect().execute(
+            """
+            SELECT sheet_name, worksheet_name, platform, data FROM tokens
+            WHERE expiry_date IS NOT NULL AND expiry_date < ?
+            ORDER BY expiry_date
+            """,
+            (before.isoformat(),),
+        ).fetchall()
+    return [((row[0], row[1], row[2]), json.loads(row[3])) for row in rows]
+
+
+def update_tokens(updates: Dict[TokenKey, Dict]):
+    """Writes only the given tokens, in a single transaction."""
+    now = datetime.now().isoformat()
+    rows = [
+        (*key, token_data.get("expiry_date"), json.dumps(token_data), now)
+        for key, token_data in updates.items()
+    ]
+    with _lock:
+        connection = _connect()
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO tokens VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+
+
+def save_tokens(all_tokens: Dict):
+    """Replaces the stored tokens with `all_tokens`, in a single transaction."""
+    with _lock:
+        connection = _connect()
+        with connection:
+            connection.execute("DELETE FROM tokens")
+            connection.executemany(
+                "INSERT INTO tokens VALUES (?, ?, ?, ?, ?, ?)", _rows(all_tokens)
+            )
+
+
+if __name__ == "__main__":
+    # Re-run the migration, e.g. after editing the JSON file by hand
+    migrate_from_json()
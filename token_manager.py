@@ -1,34 +1,204 @@
+import copy
 import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 from logger_setup import log
 from config import settings
+from worker_lock import file_lock
+import token_db
+
+# With TOKEN_BACKEND=sqlite every function below delegates to token_db.
+# Parsed tokens are cached in memory and only re-read when the file's mtime, inode or
+# size changes (i.e. another process saved new tokens). Lookups by
+# (sheet, worksheet, platform) go through an index built once per load. Writes hold a
+# lock file next to the token file, so concurrent processes never lose each other's updates.
+_lock = threading.RLock()
+_cached_signature: Optional[Tuple[int, int, int]] = None
+_cached_tokens: Dict = {}
+_index: Dict[Tuple[str, str, str], Dict] = {}
+
+
+def _use_database() -> bool:
+    return settings.TOKEN_BACKEND.lower() == "sqlite"
+
+
+def _signature(stat: os.stat_result) -> Tuple[int, int, int]:
+    return (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+
+
+def _file_signature() -> Optional[Tuple[int, int, int]]:
+    try:
+        return _signature(os.stat(settings.TOKEN_FILE))
+    except FileNotFoundError:
+        return None
+
+
+@contextmanager
+def _write_lock():
+    """Serializes token file changes between the threads and processes that share it."""
+    with _lock, file_lock(f"{settings.TOKEN_FILE}.lock"):
+        yield
+
+
+def _set_cache(all_tokens: dict, signature: Optional[Tuple[int, int, int]]):
+    global _cached_signature, _cached_tokens, _index
+    _cached_signature = signature
+    _cached_tokens = all_tokens
+    _index = {
+        (sheet_name, worksheet_name, platform): token_data
+        for sheet_name, sheet_data in all_tokens.items()
+        for worksheet_name, worksheet_data in sheet_data.items()
+        for platform, token_data in worksheet_data.items()
+    }
+
+
+def _current_tokens() -> dict:
+    """Returns the cached tokens, re-reading the file only if it changed on disk."""
+    with _lock:
+        signature = _file_signature()
+        if signature is not None and signature == _cached_signature:
+            return _cached_tokens
+        all_tokens = {}
+        if signature is not None:
+            try:
+                with open(settings.TOKEN_FILE, "r") as f:
+                    all_tokens = json.load(f)
+            except FileNotFoundError:
+                signature = None
+            except json.JSONDecodeError:
+                log.error(
+                    f"Could not decode JSON from {settings.TOKEN_FILE}. Starting fresh."
+                )
+        _set_cache(all_tokens, signature)
+        return _cached_tokens
 
 
 def load_tokens() -> dict:
     """
     Loads the entire token storage dictionary from the JSON file.
     Returns an empty dictionary if the file doesn't exist.
+    The result is a copy, so callers may modify it and pass it to `save_tokens`.
     """
-    try:
-        with open(settings.TOKEN_FILE, "r") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
-    except json.JSONDecodeError:
-        log.error(f"Could not decode JSON from {settings.TOKEN_FILE}. Starting fresh.")
-        return {}
+    if _use_database():
+        return token_db.load_tokens()
+    return copy.deepcopy(_current_tokens())
+
+
+def get_token(sheet_name: str, worksheet_name: str, platform: str) -> dict:
+    """Returns the token data of one account, or an empty dictionary if there is none."""
+    if _use_database():
+        return token_db.get_token(sheet_name, worksheet_name, platform)
+    with _lock:
+        _current_tokens()
+        return dict(_index.get((sheet_name, worksheet_name, platform), {}))
+
+
+def get_sheet_names() -> List[str]:
+    if _use_database():
+        return token_db.get_sheet_names()
+    return list(_current_tokens().keys())
+
+
+def get_worksheet_names(sheet_name: Optional[str] = None) -> List[str]:
+    if _use_database():
+        return token_db.get_worksheet_names(sheet_name)
+    all_tokens = _current_tokens()
+    if sheet_name:
+        return list(all_tokens[sheet_name].keys())
+    return [
+        worksheet_name
+        for sheet_data in all_tokens.values()
+        for worksheet_name in sheet_data.keys()
+    ]
 
 
 def save_tokens(all_tokens: dict):
     """
     Saves the entire token storage dictionary to the JSON file.
+    The file is replaced atomically (temp file + fsync + rename), so a crash or a
+    concurrent writer can never leave a half-written file behind.
     """
+    if _use_database():
+        token_db.save_tokens(all_tokens)
+        log.info(f"Successfully saved tokens to {settings.TOKEN_DB_FILE}")
+        return
+    with _write_lock():
+        _write_tokens(all_tokens)
+
+
+def _write_tokens(all_tokens: dict):
+    """Replaces the token file. The caller holds `_write_lock()`."""
+    directory = os.path.dirname(os.path.abspath(settings.TOKEN_FILE))
+    temp_path = None
     try:
-        with open(settings.TOKEN_FILE, "w") as f:
+        with tempfile.NamedTemporaryFile(
+            "w", dir=directory, prefix=".tokens-", suffix=".tmp", delete=False
+        ) as f:
+            temp_path = f.name
             json.dump(all_tokens, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+            # The rename keeps inode and mtime, so this is the signature of the file we
+            # wrote, even if another process replaces it right after
+            signature = _signature(os.fstat(f.fileno()))
+        os.replace(temp_path, settings.TOKEN_FILE)
+        temp_path = None
+        if hasattr(os, "O_DIRECTORY"):
+            # Make the rename itself durable
+            dir_fd = os.open(directory, os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        _set_cache(copy.deepcopy(all_tokens), signature)
         log.info(f"Successfully saved tokens to {settings.TOKEN_FILE}")
     except IOError as e:
         log.error(f"Could not write tokens to file: {e}")
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def get_expiring_tokens(before: datetime) -> List[Tuple[token_db.TokenKey, Dict]]:
+    """
+    Returns ((sheet, worksheet, platform), token_data) for every token that expires
+    before the given time.
+    """
+    if _use_database():
+        return token_db.get_expiring_tokens(before)
+    with _lock:
+        _current_tokens()
+        expiring = []
+        for key, token_data in _index.items():
+            try:
+                expiry_date = datetime.fromisoformat(token_data.get("expiry_date", ""))
+            except (TypeError, ValueError):
+                continue
+            if expiry_date < before:
+                expiring.append((key, dict(token_data)))
+        return expiring
+
+
+def update_tokens(updates: Dict[token_db.TokenKey, Dict]):
+    """Stores new token data for the given (sheet, worksheet, platform) keys only."""
+    if not updates:
+        return
+    if _use_database():
+        token_db.update_tokens(updates)
+        log.info(f"Successfully saved {len(updates)} token(s) to {settings.TOKEN_DB_FILE}")
+        return
+    # The file is re-read under the lock, so tokens another process saved are kept
+    with _write_lock():
+        all_tokens = load_tokens()
+        for (sheet_name, worksheet_name, platform), token_data in updates.items():
+            all_tokens.setdefault(sheet_name, {}).setdefault(worksheet_name, {})[
+                platform
+            ] = token_data
+        _write_tokens(all_tokens)
 
 
 def calculate_expiry_date(expires_in_seconds: int) -> str:
@@ -65,8 +235,7 @@ def save_token(platform: str, token: str, expires_in: int, user_id: str):
     all_tokens[platform] = new_token_data
 
     # Save the entire updated structure back to the file
-    with open(settings.TOKEN_FILE, "w") as f:
-        json.dump(all_tokens, f, indent=4)
+    save_tokens(all_tokens)
 
     log.info(
         f"Successfully saved new {platform} token. It expires on: {expiry_date.strftime('%Y-%m-%d')}"
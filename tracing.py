@@ -0,0 +1,190 @@
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+from logger_setup import log
+from config import settings
+
+# Per-post trace spans. Every stage timed with `metrics.timed` opens a span nested in
+# the span around it, and every HTTP request is added as a leaf span, so each row's
+# journey (fetch, filter, lock, probe, transcode, host upload, child containers, polls,
+# parent container, publish, follow-up) can be followed in a trace viewer. Spans of
+# one post share a lane, so the posts of a run are shown one below the other.
+# Tracing is off unless TRACE_FORMAT is set; then nothing is recorded.
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_lock = threading.Lock()
+_finished: List["Span"] = []
+_ids = itertools.count(1)
+
+DEFAULT_LANE = "pipeline"
+
+
+class Span:
+    def __init__(
+        self,
+        name: str,
+        parent: Optional["Span"],
+        lane: Optional[str],
+        attributes: Dict,
+        start: Optional[float] = None,
+    ):
+        self.name = name
+        self.span_id = next(_ids)
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else self.span_id
+        self.lane = lane or (parent.lane if parent else DEFAULT_LANE)
+        self.thread = threading.current_thread().name
+        self.attributes = {
+            key: value for key, value in attributes.items() if value not in (None, "")
+        }
+        self.start = time.time() if start is None else start
+        self.duration = 0.0
+        self.status = "ok"
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "lane": self.lane,
+            "thread": self.thread,
+            "start": datetime.fromtimestamp(self.start).isoformat(),
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+def enabled() -> bool:
+    return bool(settings.TRACE_FORMAT)
+
+
+def _finish(span_: Span):
+    with _lock:
+        _finished.append(span_)
+
+
+@contextmanager
+def span(name: str, lane: Optional[str] = None, **attributes):
+    """
+    Records the block as a span, nested in the current span. `lane` starts a new lane
+    (e.g. one per post) for this span and everything nested in it.
+    """
+    if not enabled():
+        yield None
+        return
+    current = Span(name, _current_span.get(), lane, attributes)
+    token = _current_span.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException:
+        current.status = "error"
+        raise
+    finally:
+        current.duration = time.perf_counter() - started
+        _current_span.reset(token)
+        _finish(current)
+
+
+def add_span(name: str, seconds: float, **attributes):
+    """Records an operation that just finished and took `seconds`, e.g. an HTTP request."""
+    if not enabled():
+        return
+    finished = Span(
+        name, _current_span.get(), None, attributes, start=time.time() - seconds
+    )
+    finished.duration = seconds
+    _finish(finished)
+
+
+# --- Export ---
+
+
+def _chrome_trace(spans: List[Span]) -> Dict:
+    """Converts spans to the Chrome trace-event format (chrome://tracing, Perfetto)."""
+    pid = os.getpid()
+    lanes: Dict[str, int] = {}
+    events = [
+        {"ph": "M", "name": "process_name", "pid": pid, "args": {"name": "content pipeline"}}
+    ]
+    for span_ in sorted(spans, key=lambda s: s.start):
+        # Spans from worker threads can overlap, so they get a lane of their own
+        lane = span_.lane
+        if span_.thread != "MainThread":
+            lane = f"{lane} [{span_.thread}]"
+        if lane not in lanes:
+            lanes[lane] = len(lanes) + 1
+            events.append(
+                {
+                    "ph": "M",
+                    "name": "thread_name",
+                    "pid": pid,
+                    "tid": lanes[lane],
+                    "args": {"name": lane},
+                }
+            )
+            events.append(
+                {
+                    "ph": "M",
+                    "name": "thread_sort_index",
+                    "pid": pid,
+                    "tid": lanes[lane],
+                    "args": {"sort_index": lanes[lane]},
+                }
+            )
+        events.append(
+            {
+                "ph": "X",
+                "name": span_.name,
+                "cat": span_.status,
+                "pid": pid,
+                "tid": lanes[lane],
+                "ts": round(span_.start * 1_000_000),
+                "dur": round(span_.duration * 1_000_000),
+                "args": {
+                    **span_.attributes,
+                    "span_id": span_.span_id,
+                    "parent_id": span_.parent_id,
+                },
+            }
+        )
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def export(directory: Optional[str] = None) -> Optional[str]:
+    """
+    Writes the spans recorded since the last export to a new file in TRACE_DIR, as
+    JSON lines ("jsonl") or a Chrome trace-event file ("chrome"). Returns its path.
+    """
+    with _lock:
+        spans = list(_finished)
+        _finished.clear()
+    if not enabled() or not spans:
+        return None
+
+    trace_format = settings.TRACE_FORMAT.lower()
+    directory = directory or settings.TRACE_DIR
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    extension = "json" if trace_format == "chrome" else "jsonl"
+    path = os.path.join(directory, f"trace-{timestamp}-{os.getpid()}.{extension}")
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            if trace_format == "chrome":
+                json.dump(_chrome_trace(spans), f)
+            else:
+                for span_ in sorted(spans, key=lambda s: s.start):
+                    f.write(json.dumps(span_.to_dict(), ensure_ascii=False) + "\n")
+    except OSError as e:
+        log.error(f"Could not write the trace to {path}: {e}")
+        return None
+    log.info(f"Wrote {len(spans)} trace span(s) to {path}.")
+    return path
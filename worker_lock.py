@@ -0,0 +1,218 @@
+import json
+import os
+import re
+import socket
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from logger_setup import log
+from config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Every worksheet has its own lock file, so several processes on one host can split the
+# worksheets between them. The lock itself is an advisory OS lock, which the kernel
+# releases when the holder dies (even on SIGKILL or OOM), so a crash never blocks later
+# runs. A heartbeat file next to it shows which process holds the lock and whether it is
+# still making progress; a holder that stopped heartbeating is reported as hung.
+
+
+def _lock_path(sheet_name: str, worksheet_name: str) -> str:
+    name = re.sub(r"[^A-Za-z0-9_.-]+", "_", f"{sheet_name}__{worksheet_name}")
+    return os.path.join(settings.WORKER_LOCK_DIR, f"{name}.lock")
+
+
+def _try_lock(f) -> bool:
+    try:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(f):
+    try:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    except OSError as e:
+        log.warning(f"Could not release lock '{f.name}': {e}")
+
+
+@contextmanager
+def file_lock(path: str):
+    """
+    Holds an exclusive lock on the lock file `path` for the duration of the block, waiting
+    while another process holds it. Serializes the read-modify-write cycles of state files
+    that several processes share.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a+") as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            _unlock(f)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        pass  # The process exists but belongs to someone else (or we cannot tell)
+    return True
+
+
+def read_heartbeat(lock_path: str) -> Optional[Dict]:
+    try:
+        with open(f"{lock_path}.heartbeat", "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+class WorksheetLock:
+    """
+    A per-worksheet worker lock. `acquire()` never blocks: if another process holds the
+    worksheet, it returns False and the worksheet is left to that process.
+    """
+
+    def __init__(self, sheet_name: str, worksheet_name: str):
+        self.sheet_name = sheet_name
+        self.worksheet_name = worksheet_name
+        self.path = _lock_path(sheet_name, worksheet_name)
+        self.acquired_at: Optional[datetime] = None
+        self._file = None
+
+    def acquire(self) -> bool:
+        os.makedirs(settings.WORKER_LOCK_DIR, exist_ok=True)
+        f = open(self.path, "a+")
+        if not _try_lock(f):
+            f.close()
+            self._report_holder()
+            return False
+        self._file = f
+        self.acquired_at = datetime.now()
+        self.heartbeat()
+        heartbeat_thread.register(self)
+        return True
+
+    def release(self):
+        if not self._file:
+            return
+        heartbeat_thread.unregister(self)
+        try:
+            os.remove(f"{self.path}.heartbeat")
+        except OSError:
+            pass
+        _unlock(self._file)
+        self._file.close()
+        self._file = None
+
+    def heartbeat(self):
+        """Records that this process still holds the lock and is alive."""
+        if not self._file:
+            return
+        data = {
+            "pid": os.getpid(),
+            "host": socket.gethostname(),
+            "sheet": self.sheet_name,
+            "worksheet": self.worksheet_name,
+            "acquired_at": self.acquired_at.isoformat(),
+            "heartbeat_at": datetime.now().isoformat(),
+        }
+        temp_path = f"{self.path}.heartbeat.tmp"
+        try:
+            with open(temp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(temp_path, f"{self.path}.heartbeat")
+        except OSError as e:
+            log.warning(f"Could not write heartbeat for '{self.worksheet_name}': {e}")
+
+    def _report_holder(self):
+        holder = read_heartbeat(self.path)
+        if not holder:
+            log.info(
+                f"Worksheet '{self.worksheet_name}' is being processed by another worker. Skipping."
+            )
+            return
+        try:
+            last_beat = datetime.fromisoformat(holder.get("heartbeat_at", ""))
+        except ValueError:
+            last_beat = None
+        stale_after = timedelta(seconds=settings.WORKER_STALE_SECONDS)
+        if last_beat and datetime.now() - last_beat < stale_after:
+            log.info(
+                f"Worksheet '{self.worksheet_name}' is being processed by worker "
+                f"{holder.get('pid')}. Skipping."
+            )
+        elif holder.get("host") == socket.gethostname() and not _pid_alive(holder.get("pid", 0)):
+            # The lock is released by the OS, so another process must have taken it over
+            # without writing its heartbeat yet.
+            log.info(
+                f"Worksheet '{self.worksheet_name}' is being taken over by another worker. Skipping."
+            )
+        else:
+            log.error(
+                f"Worker {holder.get('pid')} on '{holder.get('host')}' holds worksheet "
+                f"'{self.worksheet_name}' but has not sent a heartbeat since {last_beat}. "
+                "It appears to be hung; stop it to let other workers take over."
+            )
+
+    def __enter__(self) -> bool:
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class _HeartbeatThread:
+    """Renews the heartbeat of every lock this process holds in the background."""
+
+    def __init__(self):
+        self._locks = set()
+        self._guard = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, lock: WorksheetLock):
+        with self._guard:
+            self._locks.add(lock)
+            if not self._thread or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="worker-heartbeat", daemon=True
+                )
+                self._thread.start()
+
+    def unregister(self, lock: WorksheetLock):
+        with self._guard:
+            self._locks.discard(lock)
+
+    def _run(self):
+        while not self._wakeup.wait(settings.WORKER_HEARTBEAT_SECONDS):
+            with self._guard:
+                locks = list(self._locks)
+            for lock in locks:
+                lock.heartbeat()
+
+
+heartbeat_thread = _HeartbeatThread()